@@ -0,0 +1,188 @@
+# 电脑玩家
+# 2人游戏使用迭代加深的alpha-beta搜索；4人游戏使用paranoid搜索（假设其他玩家联合对抗自己），
+# 同样用alpha-beta剪枝。每步有严格的时间预算，超时后返回上一轮完整搜索的最佳走法
+# 开局库中的局面直接使用预先计算的走法（见opening_book.py）
+# 2人游戏的残局先用一部分时间预算尝试精确求解（见endgame.py），求解成功时直接使用完美走法
+
+import time
+from bitboard import cell_index
+from endgame import EndgameSolver, is_endgame
+from opening_book import load_opening_book
+from pieces import PIECES, ORIENTATIONS
+from transposition import TRANSPOSITION_CACHE
+
+WIN_SCORE = 100000
+MOBILITY_WEIGHT = 0.5  # 每个可用锚点相当于多少格方块
+ENDGAME_TIME_SHARE = 0.5  # 残局精确求解最多使用的时间预算比例，失败时剩余时间用于普通搜索
+OPENING_BOOK = load_opening_book()  # 没有开局库文件时为None
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def get_remaining_squares(game, player_num):
+    """玩家剩余方块的总格数（与Game.determine_winner一致，越少越好）"""
+    return game.players[player_num].remaining_squares()
+
+
+def get_move_mask(move):
+    piece_id, orientation_index, board_x, board_y = move
+    return ORIENTATIONS[piece_id][orientation_index].mask << cell_index(board_x, board_y)
+
+
+def evaluate(game, player_num):
+    """
+    从player_num的角度评估局面：自己的剩余格数和可用锚点与对手平均值之差
+    游戏结束时按胜负给出极大/极小值
+    """
+    key = ('ai_eval', game.zobrist_hash, player_num)
+    cached = TRANSPOSITION_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    scores = {}
+    for other in game.players:
+        scores[other] = -get_remaining_squares(game, other)
+        if not game.game_over and other not in game.blocked_players:
+            scores[other] += MOBILITY_WEIGHT * popcount(game.bitboard.anchors[other])
+
+    own = scores[player_num]
+    opponents = [score for other, score in scores.items() if other != player_num]
+    best_opponent = max(opponents) if opponents else 0
+    value = own - sum(opponents) / len(opponents) if opponents else own
+
+    if game.game_over:
+        if own > best_opponent:
+            value += WIN_SCORE
+        elif own < best_opponent:
+            value -= WIN_SCORE
+
+    TRANSPOSITION_CACHE.put(key, value)
+    return value
+
+
+def order_moves(game, player_num, moves):
+    """走法排序：优先大方块，其次能占据对手锚点的放置"""
+    opponent_anchors = 0
+    for other, anchors in game.bitboard.anchors.items():
+        if other != player_num:
+            opponent_anchors |= anchors
+
+    def move_priority(move):
+        return PIECES[move[0]]['size'] * 4 + popcount(get_move_mask(move) & opponent_anchors)
+
+    return sorted(moves, key=move_priority, reverse=True)
+
+
+class Bot:
+    __slots__ = ('player_num', 'time_budget', 'max_depth', 'branch_limit', 'deadline', 'nodes')
+
+    def __init__(self, player_num, time_budget=1.0, max_depth=6, branch_limit=10):
+        self.player_num = player_num
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.branch_limit = branch_limit  # 每个节点最多展开的走法数
+        self.deadline = 0
+        self.nodes = 0
+
+    def check_time(self):
+        self.nodes += 1
+        if time.monotonic() >= self.deadline:
+            raise SearchTimeout()
+
+    def get_candidate_moves(self, game, player_num):
+        moves = order_moves(game, player_num, game.get_legal_moves(player_num))
+        return moves[:self.branch_limit]
+
+    def search(self, game, depth, alpha, beta):
+        """alpha-beta搜索，自己行动时取最大值，其他玩家行动时取最小值（paranoid）"""
+        self.check_time()
+        if depth == 0 or game.game_over:
+            return evaluate(game, self.player_num)
+
+        player_num = game.current_player
+        moves = self.get_candidate_moves(game, player_num)
+        if not moves:
+            return evaluate(game, self.player_num)
+
+        maximizing = player_num == self.player_num
+        best = -float('inf') if maximizing else float('inf')
+        for move in moves:
+            child = game.copy()
+            child.play_move(player_num, move)
+            value = self.search(child, depth - 1, alpha, beta)
+            if maximizing:
+                best = max(best, value)
+                alpha = max(alpha, value)
+            else:
+                best = min(best, value)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return best
+
+    def search_root(self, game, depth, moves):
+        """根节点搜索，返回最佳走法和对应的评估值"""
+        best_move = None
+        best_value = -float('inf')
+        alpha = -float('inf')
+        for move in moves:
+            child = game.copy()
+            child.play_move(self.player_num, move)
+            value = self.search(child, depth - 1, alpha, float('inf'))
+            if value > best_value:
+                best_move, best_value = move, value
+            alpha = max(alpha, value)
+        return best_move, best_value
+
+    def choose_quick_move(self, game, legal_moves=None):
+        """不搜索，直接返回排序后的第一步（计算资源不足时使用）"""
+        if legal_moves is None:
+            legal_moves = game.get_legal_moves(self.player_num)
+        moves = order_moves(game, self.player_num, legal_moves)
+        return moves[0] if moves else None
+
+    def choose_move(self, game):
+        """
+        在时间预算内选择一步走法，返回(piece_id, 朝向编号, x, y)，无子可下时返回None
+        """
+        self.deadline = time.monotonic() + self.time_budget
+        self.nodes = 0
+        if game.game_over or game.current_player != self.player_num:
+            return None
+
+        if OPENING_BOOK is not None:
+            entry = OPENING_BOOK.lookup(game)
+            # 哈希冲突或开局库与当前规则不一致时不使用
+            if entry is not None and entry.move in game.get_legal_moves(self.player_num):
+                return entry.move
+
+        if is_endgame(game):
+            solver = EndgameSolver(time_budget=self.time_budget * ENDGAME_TIME_SHARE)
+            result = solver.solve(game)
+            self.nodes += solver.nodes
+            if result is not None:
+                return result.move
+
+        moves = self.get_candidate_moves(game, self.player_num)
+        if not moves:
+            return None
+
+        # 即使第一轮搜索就超时，也返回排序后的第一步
+        best_move = moves[0]
+        try:
+            for depth in range(1, self.max_depth + 1):
+                move, _ = self.search_root(game, depth, moves)
+                if move is not None:
+                    best_move = move
+                    # 下一轮优先搜索上一轮的最佳走法，以便更早剪枝
+                    moves.remove(move)
+                    moves.insert(0, move)
+        except SearchTimeout:
+            pass
+        return best_move
@@ -0,0 +1,163 @@
+# 局面分析和走法提示
+# - 每个玩家的可达区域热力图：每个格子被多少个合法放置覆盖（0表示该玩家本回合已无法覆盖），以及行动能力（合法放置数、锚点数）
+#   直接从锚点平面和空闲平面计算：每个朝向用位运算一次得到所有合法原点（见movegen.get_origin_mask），
+#   再把原点掩码按方块的每个格子平移累加，不需要逐个方块、逐个位置扫描棋盘
+# - 候选走法排名：开局库中的局面先给出库中的走法，2人残局先尝试精确求解，
+#   其余候选走法用电脑玩家的搜索逐层加深打分，到达时间预算时使用最后一轮完整的结果
+# 分析在计算进程池中执行（见compute.py），结果按局面缓存在置换表中
+
+import time
+from ai import Bot, OPENING_BOOK, SearchTimeout, order_moves
+from bitboard import BOARD_STRIDE, iter_bits
+from endgame import EndgameSolver, is_endgame
+from movegen import get_origin_mask
+from pieces import ORIENTATIONS
+from transposition import TRANSPOSITION_CACHE
+
+DEFAULT_CANDIDATES = 5
+DEFAULT_TIME_BUDGET = 0.5
+MAX_CANDIDATES = 20
+
+
+def get_player_coverage(game, player_num):
+    """
+    返回(合法放置数, 热力图)，热力图为按行排列的二维列表，heatmap[y][x]为覆盖格子(x, y)的合法放置数
+    """
+    board_size = game.board_size
+    heat = [0] * (board_size * BOARD_STRIDE)
+    move_count = 0
+    bitboard = game.bitboard
+    anchors = bitboard.anchors[player_num]
+    if anchors and not game.game_over and player_num not in game.blocked_players:
+        free = ~(bitboard.occupied | bitboard.forbidden[player_num])
+        for piece_id in game.players[player_num].pieces:
+            for orientation in ORIENTATIONS[piece_id]:
+                origins = get_origin_mask(orientation, board_size, free, anchors)
+                if not origins:
+                    continue
+                move_count += bin(origins).count('1')
+                for dx, dy in orientation.coords:
+                    for index in iter_bits(origins << (dy * BOARD_STRIDE + dx)):
+                        heat[index] += 1
+    heatmap = [heat[y * BOARD_STRIDE:y * BOARD_STRIDE + board_size] for y in range(board_size)]
+    return move_count, heatmap
+
+
+def get_territory(game):
+    """所有玩家的行动能力和可达区域，按局面缓存"""
+    key = ('territory', game.zobrist_hash)
+    territory = TRANSPOSITION_CACHE.get(key)
+    if territory is None:
+        territory = {}
+        for player_num in game.players:
+            move_count, heatmap = get_player_coverage(game, player_num)
+            territory[str(player_num)] = {
+                'mobility': move_count,
+                'anchors': bin(game.bitboard.anchors[player_num]).count('1') if move_count else 0,
+                'reachable': sum(1 for row in heatmap for count in row if count),
+                'remaining': game.players[player_num].remaining_squares(),
+                'heatmap': heatmap
+            }
+        TRANSPOSITION_CACHE.put(key, territory)
+    return territory
+
+
+def format_candidate(move, score, source):
+    piece_id, orientation_index, board_x, board_y = move
+    orientation = ORIENTATIONS[piece_id][orientation_index]
+    return {
+        'piece_id': piece_id,
+        'orientation': orientation_index,
+        'rotation': orientation.rotation,
+        'flip': orientation.flip,
+        'position': [board_x, board_y],
+        'score': score,
+        'source': source
+    }
+
+
+def search_candidates(game, player_num, moves, deadline):
+    """
+    对候选走法逐层加深搜索，返回(最后一轮完整搜索的[(得分, 走法)]，完成的深度)
+    根节点不剪枝，每个候选走法的得分都是准确的；一层都没有完成时得分为None
+    """
+    bot = Bot(player_num)
+    bot.deadline = deadline
+    scored = [(None, move) for move in moves]
+    completed = 0
+    children = []
+    for move in moves:
+        child = game.copy()
+        child.play_move(player_num, move)
+        children.append(child)
+    try:
+        for depth in range(1, bot.max_depth + 1):
+            values = [bot.search(child, depth - 1, -float('inf'), float('inf')) for child in children]
+            scored = sorted(zip(values, moves), key=lambda item: (-item[0], item[1]))
+            completed = depth
+            if all(child.game_over for child in children):
+                break
+    except SearchTimeout:
+        pass
+    return scored, completed
+
+
+def rank_candidates(game, player_num, limit, deadline):
+    """返回({候选走法列表}, 完成的搜索深度, 残局的精确结果或None)"""
+    legal_moves = game.get_legal_moves(player_num)
+    if not legal_moves:
+        return [], 0, None
+
+    candidates = []
+    outcome = None
+    if OPENING_BOOK is not None:
+        entry = OPENING_BOOK.lookup(game)
+        if entry is not None and entry.move in legal_moves:
+            candidates.append(format_candidate(entry.move, entry.score, 'book'))
+
+    if not candidates and is_endgame(game):
+        result = EndgameSolver(time_budget=max(deadline - time.monotonic(), 0) / 2).solve(game)
+        if result is not None:
+            candidates.append(format_candidate(result.move, result.score, 'endgame'))
+            outcome = {'winner': result.winner, 'score': result.score, 'nodes': result.nodes}
+
+    known = {(c['piece_id'], c['orientation'], *c['position']) for c in candidates}
+    moves = [move for move in order_moves(game, player_num, legal_moves) if move not in known]
+    scored, depth = search_candidates(game, player_num, moves[:max(limit - len(candidates), 0)], deadline)
+    candidates.extend(format_candidate(move, score, 'search') for score, move in scored)
+    return candidates[:limit], depth, outcome
+
+
+def analyze_position(game, player_num=None, limit=DEFAULT_CANDIDATES, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    分析局面：所有玩家的行动能力和可达区域热力图，以及player_num（默认为当前玩家）的候选走法排名
+    只有轮到player_num行动时才有候选走法；同一局面、同一玩家的结果缓存在置换表中
+    """
+    if player_num is None:
+        player_num = game.current_player
+    limit = min(max(int(limit), 1), MAX_CANDIDATES)
+    key = ('analysis', game.zobrist_hash, player_num, limit)
+    cached = TRANSPOSITION_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    deadline = time.monotonic() + time_budget
+    analysis = {
+        'turn': game.turn,
+        'current_player': game.current_player,
+        'player_num': player_num,
+        'game_over': game.game_over,
+        'board_size': game.board_size,
+        'players': get_territory(game),
+        'candidates': [],
+        'depth': 0,
+        'outcome': None
+    }
+    if not game.game_over and player_num == game.current_player:
+        analysis['candidates'], analysis['depth'], analysis['outcome'] = rank_candidates(
+            game, player_num, limit, deadline
+        )
+    # 搜索一层都没有完成时（时间预算过小）不缓存，下次请求重新计算
+    if analysis['depth'] or not any(candidate['source'] == 'search' for candidate in analysis['candidates']):
+        TRANSPOSITION_CACHE.put(key, analysis)
+    return analysis
@@ -1,13 +1,35 @@
 import eventlet
 eventlet.monkey_patch()
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+import functools
 import uuid
 import json
+import logging
+import math
 import os
+import time
 from datetime import datetime
 from game_logic import Game, GameRoom
+from compute import (
+    ComputeError, create_executor, legal_moves_task, bot_move_task, analysis_task,
+    endgame_analysis_task
+)
+from analysis import DEFAULT_CANDIDATES, MAX_CANDIDATES
+import metrics
+from transposition import TRANSPOSITION_CACHE
+from room_store import create_room_store
+from room_archive import ARCHIVE_RETENTION, create_room_archive
+import room_gc
+import spectators
+import wire
+from pieces import ORIENTATIONS
+
+# 日志级别由SQUARE_LOG_LEVEL设置（DEBUG、INFO、WARNING等），默认INFO
+LOG_LEVEL = os.environ.get('SQUARE_LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('square')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -24,25 +46,482 @@ socketio_config = {
     'cors_credentials': False,
     'ping_timeout': 60,
     'ping_interval': 25,
-    'logger': True,  # 启用日志来调试连接问题
-    'engineio_logger': True,
+    # DEBUG级别时输出Socket.IO和Engine.IO的日志，用于调试连接问题
+    'logger': LOG_LEVEL == 'DEBUG',
+    'engineio_logger': LOG_LEVEL == 'DEBUG',
     'transports': ['polling', 'websocket']  # 明确指定支持的传输方式
 }
 
+# 多个worker时通过消息队列（如redis://localhost:6379/0）转发其他worker上连接的消息
+if os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+    socketio_config['message_queue'] = os.environ['SOCKETIO_MESSAGE_QUEUE']
+
 if has_ssl:
-    print("检测到SSL证书文件，将使用HTTPS模式")
+    logger.info("检测到SSL证书文件，将使用HTTPS模式")
     # 对于SSL连接，使用threading作为async_mode
     socketio_config['async_mode'] = 'threading'
     socketio = SocketIO(app, **socketio_config)
 else:
-    print("未检测到SSL证书文件，使用HTTP模式")
+    logger.info("未检测到SSL证书文件，使用HTTP模式")
     # 对于HTTP连接，使用eventlet作为async_mode
     socketio_config['async_mode'] = 'eventlet'
     socketio = SocketIO(app, **socketio_config)
 
-# 游戏房间管理
-rooms = {}
+# 游戏房间管理：房间保存在房间存储中，多个worker时共享（见room_store.py）
+rooms = create_room_store()
+# 空闲房间的休眠存储（见room_archive.py），为None时不休眠
+room_archive = create_room_archive()
+# 连接所属的房间，连接固定在一个worker上，因此只保存在当前进程中
 players = {}
+# 观战中的连接：socket_id -> {'room_id', 'name', 'wire_format', 'delay'}，与players一样只保存在当前进程中
+watchers = {}
+# 当前进程上的延迟观战组（见spectators.py）
+delayed_feeds = spectators.DelayedFeeds()
+# 每个连接可以选择的编码格式：'json'（默认）或 'binary'（见wire.py），保存在房间存储中
+WIRE_FORMATS = ('json', 'binary')
+# 电脑玩家每步的默认思考时间（秒）
+BOT_TIME_BUDGET = float(os.environ.get('SQUARE_BOT_TIME_BUDGET', 1.0))
+# 走法提示和局面分析的时间预算（秒），超出后使用已完成的搜索结果
+HINT_TIME_BUDGET = float(os.environ.get('SQUARE_HINT_TIME_BUDGET', 0.5))
+# 赛后残局分析的超时时间（秒）
+ENDGAME_ANALYSIS_TIMEOUT = 20.0
+# 走法生成和AI搜索在进程池中执行，不阻塞事件循环
+compute_executor = create_executor()
+# 当前进程中正在计算的合法放置：(房间ID, 回合, 玩家编号) -> 等待结果的Event
+legal_moves_pending = {}
+# 当前进程中的后台任务是否已启动（按进程号记录，fork之后需要重新启动）
+background_tasks_pid = None
+# 各类空闲房间的存活时间（见room_gc.py）
+ROOM_TTLS = room_gc.load_ttls()
+# 可选的采样分析器，SQUARE_PROFILER=1时才能通过/api/profiler启动
+PROFILER_ENABLED = os.environ.get('SQUARE_PROFILER') == '1'
+profiler = metrics.SamplingProfiler()
+
+SOCKET_EVENTS = metrics.counter('square_socket_events_total', '收到的Socket.IO事件数', ['event'])
+SOCKET_EVENT_ERRORS = metrics.counter('square_socket_event_errors_total', '处理时抛出异常的Socket.IO事件数', ['event'])
+SOCKET_EVENT_SECONDS = metrics.histogram('square_socket_event_seconds', 'Socket.IO事件的处理耗时（秒）', ['event'])
+ROOMS_EXPIRED = metrics.counter(
+    'square_rooms_expired_total', '因空闲而回收的房间数，按原因（empty、waiting、finished、archived）和处理方式分类', ['reason', 'action']
+)
+EMIT_SECONDS = metrics.histogram('square_emit_seconds', '构建并发送消息的耗时（秒）', ['event'])
+metrics.gauge('square_rooms', '当前进程可见的房间数', lambda: len(rooms))
+metrics.gauge('square_connected_players', '当前进程上已加入房间的连接数', lambda: len(players))
+metrics.gauge('square_spectators', '当前进程上观战中的连接数', lambda: len(watchers))
+metrics.gauge('square_delayed_spectator_groups', '当前进程上的延迟观战组数', lambda: len(delayed_feeds))
+metrics.gauge('square_compute_pending', '已提交但未完成的计算任务数', lambda: compute_executor.pending)
+metrics.gauge('square_transposition_entries', '置换表中的局面数', lambda: len(TRANSPOSITION_CACHE))
+
+def socket_event(event):
+    """注册Socket.IO事件处理函数，并统计事件数、耗时和异常"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args):
+            SOCKET_EVENTS.inc(event=event)
+            try:
+                with SOCKET_EVENT_SECONDS.time(event=event):
+                    return handler(*args)
+            except Exception:
+                SOCKET_EVENT_ERRORS.inc(event=event)
+                logger.exception("处理事件%s时出错", event)
+                raise
+        return socketio.on(event)(wrapper)
+    return decorator
+
+def emit_to_room(room, event, build_payload):
+    """
+    按每个连接选择的编码格式向房间内所有玩家和实时观战者发送消息
+    build_payload(binary)返回消息内容，每种格式只构建一次；每个观战组只发送一次，不随观战人数增加
+    """
+    payloads = {}
+    def get_payload(wire_format):
+        if wire_format not in payloads:
+            payloads[wire_format] = build_payload(wire_format == 'binary')
+        return payloads[wire_format]
+    
+    with EMIT_SECONDS.time(event=event):
+        for socket_id, player_data in list(room.players.items()):
+            if player_data['is_bot']:
+                continue
+            socketio.emit(event, get_payload(rooms.get_wire_format(socket_id)), to=socket_id)
+        for wire_format in room.get_live_spectator_formats():
+            socketio.emit(event, get_payload(wire_format), to=spectators.get_group_name(room.room_id, wire_format))
+
+def get_state_payload(room, game, binary):
+    """room中的完整游戏状态，game可以是从走法日志重建的局面（延迟观战）"""
+    if binary:
+        return wire.encode_game_state(game, room.get_room_info())
+    game_state = game.get_game_state()
+    game_state.update(room.get_room_info())
+    return game_state
+
+def get_game_over_payload(winner, final_scores):
+    return {
+        'winner': winner,
+        'final_scores': final_scores,
+        'message': f'游戏结束！{"平局" if winner == "tie" else f"玩家{winner}获胜！"}'
+    }
+
+def prepare_legal_moves(room, player_num):
+    """
+    在进程池中计算玩家本回合的合法放置并写入房间缓存，已缓存时直接返回
+    同一回合的计算已经在进行时（如回合开始时的后台推送）等待它的结果，而不是作为房间的第二个任务被拒绝
+    （与电脑玩家搜索、局面分析和残局分析使用不同的任务键，不会互相阻塞）
+    """
+    pending_key = (room.room_id, room.game.turn, player_num)
+
+    def compute():
+        pending = legal_moves_pending.get(pending_key)
+        if pending is not None:
+            return pending.wait()
+        pending = legal_moves_pending[pending_key] = eventlet.event.Event()
+        try:
+            moves = compute_executor.run(
+                legal_moves_task, room.game.to_compact(), player_num, key=f'{room.room_id}:legal'
+            )
+        except Exception as e:
+            pending.send_exception(e)
+            raise
+        else:
+            pending.send(moves)
+            return moves
+        finally:
+            del legal_moves_pending[pending_key]
+
+    return room.get_cached('legal_moves', player_num, compute)
+
+def prepare_analysis(room, player_num, limit=DEFAULT_CANDIDATES):
+    """
+    在进程池中分析当前局面并按回合缓存，同一房间同时只进行一个分析任务
+    （与走法计算、电脑玩家搜索和残局分析使用不同的任务键，不会互相阻塞）
+    """
+    limit = min(max(limit, 1), MAX_CANDIDATES)
+    return room.get_cached(('analysis', limit), player_num, lambda: compute_executor.run(
+        analysis_task, room.game.to_compact(), player_num, limit, HINT_TIME_BUDGET,
+        key=f'{room.room_id}:analysis', timeout=HINT_TIME_BUDGET + 2
+    ))
+
+def push_legal_moves(room_id):
+    """在后台计算当前玩家的所有合法放置，并推送给该玩家"""
+    room = rooms.get(room_id)
+    if room is None or room.game is None or room.game.game_over:
+        return
+    
+    turn = room.game.turn
+    player_num = room.game.current_player
+    socket_id = room.get_socket_id(player_num)
+    if socket_id is None:
+        return
+    
+    try:
+        prepare_legal_moves(room, player_num)
+    except ComputeError as e:
+        # 客户端没有收到推送时会自己请求
+        logger.warning("推送合法放置失败: %s", e)
+        return
+    
+    # 计算期间可能已经有新的放置：过期的结果不再推送，也不在事件循环中为新的回合重新计算位图
+    if room.game is None or room.game.turn != turn:
+        return
+    with EMIT_SECONDS.time(event='legal_moves'):
+        socketio.emit('legal_moves', room.get_legal_move_bitmaps(player_num), to=socket_id)
+
+def schedule_legal_moves_push(room_id):
+    """回合开始时安排后台推送，不占用当前请求的处理时间"""
+    socketio.start_background_task(push_legal_moves, room_id)
+
+def listen_room_tasks():
+    """执行其他worker转交给当前worker的房间任务"""
+    while True:
+        item = rooms.pop_task(1)
+        if item is None:
+            continue
+        room_id, task = item
+        if task == 'start_turn':
+            start_turn(room_id)
+
+def ensure_background_tasks():
+    """每个worker启动一次后台任务：回收空闲房间，共享房间存储时还有接收转交任务"""
+    global background_tasks_pid
+    if background_tasks_pid == os.getpid():
+        return
+    background_tasks_pid = os.getpid()
+    socketio.start_background_task(room_collector.run)
+    socketio.start_background_task(run_delayed_feeds)
+    if rooms.shared:
+        socketio.start_background_task(listen_room_tasks)
+
+def feed_delayed_group(group, now):
+    """把延迟观战组到期的走法在组内的局面副本上重放并发送，每步每组只构建和发送一次"""
+    room = rooms.get(group.room_id)
+    if room is None:
+        # 房间已关闭或休眠
+        socketio.emit('room_closed', {'message': '房间已关闭'}, to=group.name)
+        socketio.close_room(group.name)
+        for socket_id in group.members:
+            watchers.pop(socket_id, None)
+        delayed_feeds.drop(group)
+        return
+    if room.game is None or room.move_log is None:
+        return
+    
+    binary = group.wire_format == 'binary'
+    if group.game is None:
+        group.game = room.move_log.get_position(0)
+        group.sent = 0
+        socketio.emit('game_started', {
+            'game_state': get_state_payload(room, group.game, binary),
+            'message': '游戏开始！'
+        }, to=group.name)
+    
+    turn = min(spectators.get_delayed_turn(room.move_times, group.delay, now), len(room.move_log))
+    while group.sent < turn:
+        player_num, piece_id, orientation_index, board_x, board_y = room.move_log.get_record(group.sent)
+        group.game.play_move(player_num, (piece_id, orientation_index, board_x, board_y))
+        group.sent += 1
+        if binary:
+            delta = wire.encode_game_delta(group.game, {'room_id': room.room_id})
+        else:
+            delta = group.game.get_game_delta()
+            delta['room_id'] = room.room_id
+        socketio.emit('game_updated', {
+            'delta': delta,
+            'last_move': {'player_id': player_num, 'piece_id': piece_id, 'position': [board_x, board_y]}
+        }, to=group.name)
+        if group.game.game_over:
+            socketio.emit('game_over', get_game_over_payload(group.game.winner, group.game.get_scores()), to=group.name)
+
+def run_delayed_feeds():
+    """按固定间隔推进当前进程上的所有延迟观战组"""
+    while True:
+        socketio.sleep(spectators.FEED_INTERVAL)
+        now = time.time()
+        for group in delayed_feeds.values():
+            try:
+                feed_delayed_group(group, now)
+            except Exception:
+                logger.exception("推送延迟观战组%s时出错", group.name)
+
+def close_spectators(room, message):
+    """房间关闭时通知实时观战组并清空观战者（延迟观战组由后台任务发现房间不存在后关闭）"""
+    for wire_format in room.get_live_spectator_formats():
+        group_name = spectators.get_group_name(room.room_id, wire_format)
+        socketio.emit('room_closed', {'message': message}, to=group_name)
+        socketio.close_room(group_name)
+    for socket_id, watcher in list(watchers.items()):
+        if watcher['room_id'] == room.room_id and not watcher['delay']:
+            del watchers[socket_id]
+    room.spectators.clear()
+
+def expire_room(room, reason):
+    """回收空闲房间：进行中的对局休眠，其他房间删除（调用时需持有房间锁）"""
+    socketio.emit('room_closed', {'message': '房间长时间无活动，已关闭'}, room=room.room_id)
+    close_spectators(room, '房间长时间无活动，已关闭')
+    if room_archive is not None and room.status == 'playing':
+        hibernate_room(room)
+        action = 'hibernate'
+    else:
+        del rooms[room.room_id]
+        action = 'evict'
+    socketio.close_room(room.room_id)
+    for socket_id, player_data in list(players.items()):
+        if player_data['room_id'] == room.room_id:
+            del players[socket_id]
+    ROOMS_EXPIRED.inc(reason=reason, action=action)
+    logger.info("回收空闲房间%s（%s，%s）", room.room_id, reason, action)
+
+def check_room_expiry(room_id, now):
+    """检查房间是否到期，到期时回收，返回下一次检查的时间（房间已不存在时返回None）"""
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return None
+        deadline, reason = room_gc.get_expiry(room, ROOM_TTLS)
+        if deadline is None:
+            # 当前不会过期（如真人玩家都在的进行中对局），之后再检查
+            return now + room_gc.SWEEP_INTERVAL
+        if deadline > now:
+            return deadline
+        expire_room(room, reason)
+        return None
+
+def maintain_room_archive():
+    """删除超过保存期限的休眠房间，清理休眠存储中被覆盖的旧记录（本进程没有写入时跳过清理）"""
+    if room_archive is None:
+        return
+    if ARCHIVE_RETENTION > 0:
+        expired = room_archive.expire(time.time() - ARCHIVE_RETENTION)
+        if expired:
+            ROOMS_EXPIRED.inc(len(expired), reason='archived', action='evict')
+            logger.info("删除了%d个超过保存期限的休眠房间", len(expired))
+    if room_archive.appended:
+        removed = room_archive.compact()
+        if removed:
+            logger.info("休眠存储清理了%d条旧记录", removed)
+
+room_collector = room_gc.RoomCollector(
+    check_room_expiry, rooms.keys, sleep=socketio.sleep, on_sweep=maintain_room_archive
+)
+
+def start_turn(room_id):
+    """回合开始：电脑玩家在后台思考，真人玩家收到合法放置推送"""
+    # 后台任务只在房间的拥有者worker上执行
+    if not rooms.is_owner(room_id) and rooms.send_task(room_id, 'start_turn'):
+        return
+    
+    room = rooms.get(room_id)
+    if room is None:
+        return
+    
+    bot_id, bot = room.get_current_bot()
+    if bot is not None:
+        socketio.start_background_task(run_bot_turn, room_id)
+    else:
+        schedule_legal_moves_push(room_id)
+
+def start_game_if_ready(room):
+    """房间满员时开始游戏"""
+    if room.game is not None or not room.can_start_game():
+        return
+    
+    room.start_game()
+    emit_to_room(room, 'game_started', lambda binary: {
+        'game_state': room.get_game_state_binary() if binary else room.get_game_state(),
+        'message': '游戏开始！'
+    })
+    start_turn(room.room_id)
+
+def broadcast_move(room, player_id, piece_id, position):
+    """通知房间内所有玩家有新的放置，并开始下一回合或结束游戏"""
+    # 只发送增量，完整状态在加入或请求同步时发送
+    emit_to_room(room, 'game_updated', lambda binary: {
+        'delta': room.get_game_delta_binary() if binary else room.get_game_delta(),
+        'last_move': {
+            'player_id': player_id,
+            'piece_id': piece_id,
+            'position': position
+        }
+    })
+    
+    # 检查游戏是否结束
+    if room.is_game_over():
+        payload = get_game_over_payload(room.get_winner(), room.get_scores())
+        emit_to_room(room, 'game_over', lambda binary: payload)
+    else:
+        start_turn(room.room_id)
+
+def run_bot_turn(room_id):
+    """电脑玩家思考并放置方块，搜索在线程池中进行，不阻塞eventlet事件循环"""
+    room = rooms.get(room_id)
+    if room is None:
+        return
+    
+    bot_id, bot = room.get_current_bot()
+    if bot is None:
+        return
+    
+    turn = room.game.turn
+    try:
+        move = compute_executor.run(
+            bot_move_task, room.game.to_compact(), bot.player_num, bot.time_budget,
+            key=f'{room_id}:bot', timeout=bot.time_budget + 2
+        )
+    except ComputeError as e:
+        # 计算资源不足或进程池故障时不搜索，直接选择排序后的第一步
+        logger.warning("电脑玩家搜索失败: %s", e)
+        move = bot.choose_quick_move(room.game)
+    except Exception:
+        # 其他错误同样退回，否则房间会一直停在电脑玩家的回合
+        logger.exception("电脑玩家搜索出错")
+        move = bot.choose_quick_move(room.game)
+    if move is None:
+        return
+    
+    with rooms.lock(room_id):
+        # 思考期间房间可能已被删除或局面已变化
+        room = rooms.get(room_id)
+        if room is None or room.game is None or room.game.turn != turn:
+            return
+        
+        piece_id, orientation_index, board_x, board_y = move
+        orientation = ORIENTATIONS[piece_id][orientation_index]
+        result = room.place_piece(bot_id, piece_id, (board_x, board_y), orientation.rotation, orientation.flip)
+        if result['success']:
+            rooms.save(room)
+            broadcast_move(room, bot.player_num, piece_id, [board_x, board_y])
+        else:
+            logger.warning("电脑玩家放置失败: %s", result['message'])
+
+def add_bot_to_room(room, time_budget=None):
+    """向房间添加电脑玩家，返回(结果, 错误信息)"""
+    if room.game is not None:
+        return None, '游戏已开始'
+    
+    if time_budget is None:
+        time_budget = BOT_TIME_BUDGET
+    try:
+        time_budget = float(time_budget)
+    except (TypeError, ValueError):
+        return None, '无效的思考时间'
+    if not math.isfinite(time_budget):
+        return None, '无效的思考时间'
+    time_budget = min(max(time_budget, 0.1), 10.0)
+    
+    bot_id, player_num = room.add_bot(time_budget)
+    if bot_id is None:
+        return None, '房间已满'
+    
+    socketio.emit('player_joined', {
+        'player_name': room.players[bot_id]['player_name'],
+        'players_count': len(room.players),
+        'max_players': room.max_players,
+        'can_start': room.can_start_game()
+    }, room=room.room_id)
+    
+    start_game_if_ready(room)
+    return {'room_id': room.room_id, 'player_num': player_num, 'time_budget': time_budget}, None
+
+def load_room(room_id):
+    """获取房间，房间已休眠时从磁盘恢复，返回(房间, 是否刚恢复)"""
+    room = rooms.get(room_id)
+    if room is not None or room_archive is None:
+        return room, False
+    
+    room = room_archive.load(room_id)
+    if room is None:
+        return None, False
+    # 休眠前的连接都已断开，只保留电脑玩家，真人玩家重新加入时接替空出的位置
+    for socket_id, player_data in list(room.players.items()):
+        if not player_data['is_bot']:
+            room.remove_player(socket_id)
+    rooms[room_id] = room
+    room_archive.delete(room_id)
+    room_collector.schedule(room_id)
+    logger.info("房间%s已从休眠中恢复", room_id)
+    return room, True
+
+def hibernate_room(room):
+    """将房间写入休眠存储并从内存中移除（调用时需持有房间锁）"""
+    size = room_archive.save(room)
+    del rooms[room.room_id]
+    logger.info("房间%s已休眠（%d字节）", room.room_id, size)
+
+def hibernate_all_rooms():
+    """worker退出前休眠所有未结束的房间，重启后玩家重新加入时恢复（共享房间存储本身不随worker退出而丢失）"""
+    if room_archive is None or rooms.shared:
+        return
+    for room_id in rooms.keys():
+        with rooms.lock(room_id):
+            room = rooms.get(room_id)
+            if room is not None and room.status != 'finished':
+                hibernate_room(room)
+
+def restore_all_rooms():
+    """启动时恢复所有休眠的房间"""
+    if room_archive is None:
+        return
+    for room_id in room_archive.room_ids():
+        with rooms.lock(room_id):
+            load_room(room_id)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -60,6 +539,8 @@ def create_room():
     room_id = str(uuid.uuid4())[:8]
     room = GameRoom(room_id, max_players)
     rooms[room_id] = room
+    room_collector.schedule(room_id)
+    ensure_background_tasks()
     return jsonify({
         "room_id": room_id, 
         "max_players": max_players,
@@ -68,96 +549,378 @@ def create_room():
 
 @app.route('/api/room/<room_id>', methods=['GET'])
 def get_room(room_id):
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        hibernated = False
+        if room is None and room_archive is not None:
+            # 只读取快照，不恢复：玩家加入时才恢复，恢复时真人玩家的位置空出，只保留电脑玩家
+            room = room_archive.load(room_id)
+            hibernated = room is not None
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        return jsonify({
+            "room_id": room_id,
+            "players": len(room.bots) if hibernated else len(room.players),
+            "spectators": 0 if hibernated else len(room.spectators),
+            "max_players": room.max_players,
+            "status": room.status,
+            "current_player": room.current_player,
+            "hibernated": hibernated
+        })
+
+@app.route('/api/room/<room_id>/valid-positions', methods=['GET'])
+def get_room_valid_positions(room_id):
+    player_num = request.args.get('player', type=int)
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        if room.game is None:
+            return jsonify({"error": "游戏未开始"}), 400
+        if player_num not in room.game.players:
+            return jsonify({"error": "玩家不存在"}), 400
+    
+    # 计算在锁外进行，结果按回合缓存，计算期间有新的放置时返回的仍是请求时那一回合的结果
+    try:
+        prepare_legal_moves(room, player_num)
+    except ComputeError as e:
+        return jsonify({"error": f"服务器繁忙: {e}"}), 503
+    return jsonify(room.get_all_valid_positions(player_num))
+
+@app.route('/api/room/<room_id>/analysis', methods=['GET'])
+def get_room_analysis(room_id):
+    """局面分析：所有玩家的行动能力和可达区域热力图，轮到player（默认为当前玩家）时还有候选走法排名"""
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        if room.game is None:
+            return jsonify({"error": "游戏未开始"}), 400
+        player_num = request.args.get('player', room.game.current_player, type=int)
+        if player_num not in room.game.players:
+            return jsonify({"error": "玩家不存在"}), 400
+    
+    try:
+        analysis = prepare_analysis(room, player_num, request.args.get('limit', DEFAULT_CANDIDATES, type=int))
+    except ComputeError as e:
+        return jsonify({"error": f"服务器繁忙: {e}"}), 503
+    return jsonify(analysis)
+
+@app.route('/api/room/<room_id>/add-bot', methods=['POST'])
+def add_room_bot(room_id):
     if room_id not in rooms:
         return jsonify({"error": "房间不存在"}), 404
     
-    room = rooms[room_id]
-    return jsonify({
-        "room_id": room_id,
-        "players": len(room.players),
-        "max_players": room.max_players,
-        "status": room.status,
-        "current_player": room.current_player
-    })
+    data = request.get_json(silent=True) or {}
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        result, error = add_bot_to_room(room, data.get('time_budget'))
+        rooms.save(room)
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(result)
+
+@app.route('/api/room/<room_id>/moves', methods=['GET'])
+def export_room_moves(room_id):
+    """流式导出已结束对局的走法日志，format为ndjson（默认）或binary"""
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        if room.move_log is None or not room.is_game_over():
+            return jsonify({"error": "游戏未结束"}), 400
+        move_log = room.move_log
+        result = {'winner': room.get_winner(), 'final_scores': room.get_scores()}
+    
+    # 已结束对局的走法日志不会再变化，可以在锁外流式输出
+    if request.args.get('format') == 'binary':
+        return Response(move_log.export_binary(), mimetype='application/octet-stream')
+    return Response(move_log.export_ndjson({'room_id': room_id}, result), mimetype='application/x-ndjson')
 
-@socketio.on('connect')
-def on_connect():
-    print(f'客户端连接: {request.sid}')
+@app.route('/api/room/<room_id>/replay', methods=['GET'])
+def replay_room(room_id):
+    """重建执行前move步之后的局面（默认为当前局面）"""
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        if room.move_log is None:
+            return jsonify({"error": "游戏未开始"}), 400
+        
+        move_count = request.args.get('move', len(room.move_log), type=int)
+        try:
+            game = room.move_log.get_position(move_count)
+        except IndexError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(dict(game.get_game_state(), move=move_count, moves=len(room.move_log)))
 
-@socketio.on('disconnect')
+@app.route('/api/room/<room_id>/endgame', methods=['GET'])
+def analyze_room_endgame(room_id):
+    """已结束的2人对局的残局分析：每个残局局面的完美走法和实际走法损失的格数"""
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            return jsonify({"error": "房间不存在"}), 404
+        if room.move_log is None or not room.is_game_over():
+            return jsonify({"error": "游戏未结束"}), 400
+        if room.game.max_players != 2:
+            return jsonify({"error": "只支持2人游戏"}), 400
+        
+        compact = room.move_log.get_position(0).to_compact()
+        moves = list(room.move_log)
+        winner = room.get_winner()
+    
+    try:
+        analysis = compute_executor.run(
+            endgame_analysis_task, compact, moves, key=f'{room_id}:endgame', timeout=ENDGAME_ANALYSIS_TIMEOUT
+        )
+    except ComputeError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({'room_id': room_id, 'winner': winner, 'moves': analysis})
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus文本格式的运行指标"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/profiler', methods=['GET', 'POST'])
+def control_profiler():
+    """
+    POST {"action": "start" | "stop" | "reset", "interval": 秒} 控制采样分析器
+    GET 返回折叠栈格式的采样结果，limit参数限制输出的调用栈数
+    """
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "采样分析器未启用（设置SQUARE_PROFILER=1）"}), 403
+    
+    if request.method == 'GET':
+        return Response(profiler.render(request.args.get('limit', type=int)), mimetype='text/plain')
+    
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action == 'start':
+        profiler.start(data.get('interval'))
+    elif action == 'stop':
+        profiler.stop()
+    elif action == 'reset':
+        profiler.reset()
+    else:
+        return jsonify({"error": f"未知操作: {action}"}), 400
+    return jsonify(profiler.get_stats())
+
+@socket_event('connect')
+def on_connect(auth=None):
+    logger.debug("客户端连接: %s", request.sid)
+    ensure_background_tasks()
+
+@socket_event('disconnect')
 def on_disconnect():
-    print(f'客户端断开连接: {request.sid}')
+    logger.debug("客户端断开连接: %s", request.sid)
+    rooms.clear_wire_format(request.sid)
+    stop_watching(request.sid)
     # 清理玩家数据
     if request.sid in players:
         player_data = players[request.sid]
         room_id = player_data.get('room_id')
-        if room_id and room_id in rooms:
-            room = rooms[room_id]
-            room.remove_player(request.sid)
-            emit('player_left', {
-                'message': '有玩家离开了游戏',
-                'players_count': len(room.players),
-                'max_players': room.max_players
-            }, room=room_id)
-            
-            if len(room.players) == 0:
-                del rooms[room_id]
+        if room_id:
+            with rooms.lock(room_id):
+                room = rooms.get(room_id)
+                if room is not None:
+                    room.remove_player(request.sid)
+                    emit('player_left', {
+                        'message': '有玩家离开了游戏',
+                        'players_count': len(room.players),
+                        'max_players': room.max_players
+                    }, room=room_id)
+                    
+                    if room.get_human_count() == 0:
+                        close_spectators(room, '玩家都已离开，房间已关闭')
+                        # 进行中的游戏休眠到磁盘，玩家重新连接时恢复
+                        if room_archive is not None and room.status == 'playing':
+                            hibernate_room(room)
+                        else:
+                            del rooms[room_id]
+                    else:
+                        rooms.save(room)
         
         del players[request.sid]
 
-@socketio.on('join_room')
-def on_join_room(data):
-    room_id = data['room_id']
-    player_name = data.get('player_name', f'玩家{request.sid[:6]}')
-    
-    if room_id not in rooms:
-        emit('error', {'message': '房间不存在'})
+@socket_event('set_wire_format')
+def on_set_wire_format(data):
+    wire_format = (data or {}).get('format', 'json')
+    if wire_format not in WIRE_FORMATS:
+        emit('error', {'message': f'不支持的编码格式: {wire_format}'})
         return
     
-    room = rooms[room_id]
-    
-    if len(room.players) >= room.max_players:
-        emit('error', {'message': '房间已满'})
+    rooms.set_wire_format(request.sid, wire_format)
+    emit('wire_format', {'format': wire_format})
+    # 观战中切换格式时改为加入对应格式的观战组
+    watcher = watchers.get(request.sid)
+    if watcher is not None and watcher['wire_format'] != wire_format:
+        stop_watching(request.sid)
+        start_watching(request.sid, watcher['room_id'], watcher['name'], watcher['delay'])
+
+def start_watching(socket_id, room_id, name, delay):
+    """以观战者身份加入房间并发送当前（或延迟时刻的）完整状态"""
+    wire_format = rooms.get_wire_format(socket_id)
+    binary = wire_format == 'binary'
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            emit('error', {'message': '房间不存在'})
+            return
+        
+        room.add_spectator(socket_id, name, wire_format, delay)
+        rooms.save(room)
+        watchers[socket_id] = {'room_id': room_id, 'name': name, 'wire_format': wire_format, 'delay': delay}
+        emit('watching', {
+            'room_id': room_id,
+            'name': name,
+            'delay': delay,
+            'players_count': len(room.players),
+            'spectators_count': len(room.spectators),
+            'max_players': room.max_players
+        })
+        
+        if not delay:
+            join_room(spectators.get_group_name(room_id, wire_format))
+            game = room.game
+        else:
+            group, created = delayed_feeds.add(socket_id, room_id, wire_format, delay)
+            join_room(group.name)
+            if created and room.game is not None:
+                # 新建的组从走法日志重建延迟时刻的局面，之后由后台任务推进
+                group.sent = spectators.get_delayed_turn(room.move_times, delay, time.time())
+                group.game = room.move_log.get_position(group.sent)
+            game = group.game
+        if game is not None:
+            emit('game_started', {'game_state': get_state_payload(room, game, binary), 'message': '开始观战'})
+
+def stop_watching(socket_id):
+    """停止观战，不在观战时什么也不做"""
+    watcher = watchers.pop(socket_id, None)
+    if watcher is None:
         return
+    if watcher['delay']:
+        group = delayed_feeds.remove(socket_id)
+        if group is not None:
+            leave_room(group.name, sid=socket_id)
+    else:
+        leave_room(spectators.get_group_name(watcher['room_id'], watcher['wire_format']), sid=socket_id)
     
-    join_room(room_id)
-    player_id = room.add_player(request.sid, player_name)
-    
-    if player_id is None:
-        emit('error', {'message': '无法加入房间'})
+    room_id = watcher['room_id']
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is not None and room.remove_spectator(socket_id):
+            rooms.save(room)
+
+@socket_event('watch_room')
+def on_watch_room(data):
+    data = data or {}
+    room_id = data.get('room_id')
+    if request.sid in players:
+        emit('error', {'message': '已作为玩家加入房间，不能观战'})
+        return
+    try:
+        delay = spectators.normalize_delay(data.get('delay'))
+    except (TypeError, ValueError) as e:
+        emit('error', {'message': f'无效的观战延迟: {e}'})
         return
     
-    players[request.sid] = {
-        'room_id': room_id,
-        'player_id': player_id,
-        'player_name': player_name
-    }
+    stop_watching(request.sid)
+    start_watching(request.sid, room_id, data.get('name') or f'观众{request.sid[:6]}', delay)
+
+@socket_event('unwatch_room')
+def on_unwatch_room(data=None):
+    if request.sid not in watchers:
+        emit('error', {'message': '未在观战'})
+        return
     
-    emit('joined_room', {
-        'room_id': room_id,
-        'player_id': player_id,
-        'player_name': player_name,
-        'players_count': len(room.players),
-        'max_players': room.max_players
-    })
+    room_id = watchers[request.sid]['room_id']
+    stop_watching(request.sid)
+    emit('unwatched', {'room_id': room_id})
+
+@socket_event('join_room')
+def on_join_room(data):
+    room_id = data['room_id']
+    player_name = data.get('player_name', f'玩家{request.sid[:6]}')
+    stop_watching(request.sid)
     
-    # 通知房间内其他玩家
-    emit('player_joined', {
-        'player_name': player_name,
-        'players_count': len(room.players),
-        'max_players': room.max_players,
-        'can_start': room.can_start_game()
-    }, room=room_id, include_self=False)
+    with rooms.lock(room_id):
+        room, restored = load_room(room_id)
+        if room is None:
+            emit('error', {'message': '房间不存在'})
+            return
+        
+        if len(room.players) >= room.max_players:
+            emit('error', {'message': '房间已满'})
+            return
+        
+        join_room(room_id)
+        player_id = room.add_player(request.sid, player_name)
+        
+        if player_id is None:
+            emit('error', {'message': '无法加入房间'})
+            return
+        
+        players[request.sid] = {
+            'room_id': room_id,
+            'player_id': player_id,
+            'player_name': player_name
+        }
+        
+        emit('joined_room', {
+            'room_id': room_id,
+            'player_id': player_id,
+            'player_name': player_name,
+            'players_count': len(room.players),
+            'max_players': room.max_players
+        })
+        
+        # 通知房间内其他玩家
+        emit('player_joined', {
+            'player_name': player_name,
+            'players_count': len(room.players),
+            'max_players': room.max_players,
+            'can_start': room.can_start_game()
+        }, room=room_id, include_self=False)
+        
+        if room.game is None:
+            # 如果房间满了，开始游戏
+            start_game_if_ready(room)
+        else:
+            # 游戏进行中加入（断线重连）时发送完整状态
+            binary = rooms.get_wire_format(request.sid) == 'binary'
+            emit('game_started', {
+                'game_state': room.get_game_state_binary() if binary else room.get_game_state(),
+                'message': '已重新加入游戏'
+            })
+            if restored:
+                start_turn(room_id)
+            elif room.game.current_player == player_id:
+                schedule_legal_moves_push(room_id)
+        rooms.save(room)
+
+@socket_event('add_bot')
+def on_add_bot(data=None):
+    if request.sid not in players:
+        emit('error', {'message': '未加入房间'})
+        return
     
-    # 如果房间满了，开始游戏
-    if room.can_start_game():
-        room.start_game()
-        emit('game_started', {
-            'game_state': room.get_game_state(),
-            'message': '游戏开始！'
-        }, room=room_id)
+    room_id = players[request.sid]['room_id']
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            emit('error', {'message': '房间不存在'})
+            return
+        
+        result, error = add_bot_to_room(room, (data or {}).get('time_budget'))
+        rooms.save(room)
+    if error:
+        emit('error', {'message': error})
 
-@socketio.on('place_piece')
+@socket_event('place_piece')
 def on_place_piece(data):
     if request.sid not in players:
         emit('error', {'message': '未加入房间'})
@@ -167,53 +930,55 @@ def on_place_piece(data):
     room_id = player_data['room_id']
     player_id = player_data['player_id']
     
-    if room_id not in rooms:
-        emit('error', {'message': '房间不存在'})
-        return
-    
-    room = rooms[room_id]
-    
     try:
-        result = room.place_piece(
-            request.sid,  # 传递socket_id而不是player_id
-            data['piece_id'],
-            data['position'],
-            data.get('rotation', 0),
-            data.get('flip', False)
-        )
-        
-        if result['success']:
-            # 通知所有玩家棋盘状态更新
-            emit('game_updated', {
-                'game_state': room.get_game_state(),
-                'last_move': {
-                    'player_id': player_id,
-                    'piece_id': data['piece_id'],
-                    'position': data['position']
-                }
-            }, room=room_id)
+        with rooms.lock(room_id):
+            room = rooms.get(room_id)
+            if room is None:
+                emit('error', {'message': '房间不存在'})
+                return
             
-            # 检查游戏是否结束
-            if room.is_game_over():
-                winner = room.get_winner()
-                emit('game_over', {
-                    'winner': winner,
-                    'final_scores': room.get_scores(),
-                    'message': f'游戏结束！{"平局" if winner == "tie" else f"玩家{winner}获胜！"}'
-                }, room=room_id)
-        else:
-            emit('move_error', {'message': result['message']})
+            result = room.place_piece(
+                request.sid,  # 传递socket_id而不是player_id
+                data['piece_id'],
+                data['position'],
+                data.get('rotation', 0),
+                data.get('flip', False)
+            )
+            
+            if result['success']:
+                rooms.save(room)
+                # 通知所有玩家棋盘状态更新
+                broadcast_move(room, player_id, data['piece_id'], data['position'])
+            else:
+                emit('move_error', {'message': result['message']})
             
     except Exception as e:
         emit('error', {'message': f'放置方块时出错: {str(e)}'})
 
-@socketio.on('get_valid_positions')
+@socket_event('request_resync')
+def on_request_resync(data=None):
+    if request.sid not in players:
+        emit('error', {'message': '未加入房间'})
+        return
+    
+    room_id = players[request.sid]['room_id']
+    binary = rooms.get_wire_format(request.sid) == 'binary'
+    # 在房间锁内读取，不会读到其他请求修改了一半、尚未保存的房间
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            emit('error', {'message': '房间不存在'})
+            return
+        game_state = room.get_game_state_binary() if binary else room.get_game_state()
+    if game_state is not None:
+        emit('game_resync', {'game_state': game_state})
+
+@socket_event('get_valid_positions')
 def on_get_valid_positions(data):
-    print(f"收到get_valid_positions请求: {data}")
+    logger.debug("收到get_valid_positions请求: %s", data)
     
     if request.sid not in players:
-        print(f"错误：request.sid {request.sid} 不在players中")
-        print(f"当前players: {players}")
+        logger.debug("连接%s未加入房间", request.sid)
         emit('error', {'message': '未加入房间'})
         return
     
@@ -221,27 +986,21 @@ def on_get_valid_positions(data):
     room_id = player_data['room_id']
     player_id = player_data['player_id']
     
-    print(f"玩家数据: {player_data}")
-    print(f"房间ID: {room_id}, 玩家ID: {player_id}")
-    
-    if room_id not in rooms:
-        print(f"错误：房间 {room_id} 不存在")
-        print(f"当前rooms: {list(rooms.keys())}")
-        emit('error', {'message': '房间不存在'})
-        return
-    
-    room = rooms[room_id]
-    print(f"找到房间，状态: {room.status}")
-    
     try:
-        valid_positions = room.get_valid_positions(
-            request.sid,  # 传递socket_id而不是player_id
-            data['piece_id'],
-            data.get('rotation', 0),
-            data.get('flip', False)
-        )
+        with rooms.lock(room_id):
+            room = rooms.get(room_id)
+            if room is None:
+                logger.debug("房间%s不存在", room_id)
+                emit('error', {'message': '房间不存在'})
+                return
+            valid_positions = room.get_valid_positions(
+                request.sid,  # 传递socket_id而不是player_id
+                data['piece_id'],
+                data.get('rotation', 0),
+                data.get('flip', False)
+            )
         
-        print(f"计算出的有效位置: {valid_positions}")
+        logger.debug("玩家%s的方块%s有%d个有效位置", player_id, data['piece_id'], len(valid_positions))
         
         emit('valid_positions', {
             'piece_id': data['piece_id'],
@@ -249,20 +1008,93 @@ def on_get_valid_positions(data):
         })
         
     except Exception as e:
-        print(f"获取有效位置时出错: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("获取有效位置时出错")
         emit('error', {'message': f'获取有效位置时出错: {str(e)}'})
 
+@socket_event('get_all_valid_positions')
+def on_get_all_valid_positions(data=None):
+    if request.sid not in players:
+        emit('error', {'message': '未加入房间'})
+        return
+    
+    room_id = players[request.sid]['room_id']
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            emit('error', {'message': '房间不存在'})
+            return
+        player_num = room.get_player_num(request.sid)
+        if room.game is None or player_num is None:
+            emit('error', {'message': '游戏未开始'})
+            return
+    
+    # 计算在锁外进行，结果带有回合号，客户端据此丢弃过期的结果
+    try:
+        prepare_legal_moves(room, player_num)
+        emit('all_valid_positions', room.get_all_valid_positions(player_num))
+    except ComputeError as e:
+        emit('error', {'message': f'服务器繁忙: {e}'})
+    except Exception as e:
+        emit('error', {'message': f'获取有效位置时出错: {str(e)}'})
+
+def emit_analysis(event, data, own_player):
+    """request_hint和analyze_position的公共部分，own_player为True时只分析请求者自己"""
+    if request.sid not in players:
+        emit('error', {'message': '未加入房间'})
+        return
+    
+    room_id = players[request.sid]['room_id']
+    data = data or {}
+    with rooms.lock(room_id):
+        room = rooms.get(room_id)
+        if room is None:
+            emit('error', {'message': '房间不存在'})
+            return
+        if room.game is None:
+            emit('error', {'message': '游戏未开始'})
+            return
+        
+        if own_player:
+            player_num = room.get_player_num(request.sid)
+        else:
+            player_num = data.get('player_num', room.game.current_player)
+        if player_num not in room.game.players:
+            emit('error', {'message': '玩家不存在'})
+            return
+    
+    try:
+        limit = int(data.get('limit', DEFAULT_CANDIDATES))
+        emit(event, prepare_analysis(room, player_num, limit))
+    except ComputeError as e:
+        emit('error', {'message': f'服务器繁忙: {e}'})
+    except (TypeError, ValueError):
+        emit('error', {'message': '参数不正确'})
+
+@socket_event('request_hint')
+def on_request_hint(data=None):
+    """为请求者本人给出候选走法（不是自己的回合时只有热力图）"""
+    emit_analysis('hint', data, own_player=True)
+
+@socket_event('analyze_position')
+def on_analyze_position(data=None):
+    """分析当前局面，player_num默认为当前行动的玩家"""
+    emit_analysis('position_analysis', data, own_player=False)
+
+if os.environ.get('SQUARE_ARCHIVE_RELOAD') == '1':
+    restore_all_rooms()
+
 if __name__ == '__main__':
     # 开发环境直接运行
-    if has_ssl:
-        print("使用HTTPS模式启动服务器...")
-        socketio.run(app, debug=True, host='0.0.0.0', port=25678, 
-                    ssl_context=(cert_file, key_file))
-    else:
-        print("证书文件不存在，使用HTTP模式启动服务器...")
-        socketio.run(app, debug=True, host='0.0.0.0', port=25678)
+    try:
+        if has_ssl:
+            logger.info("使用HTTPS模式启动服务器...")
+            socketio.run(app, debug=True, host='0.0.0.0', port=25678, 
+                        ssl_context=(cert_file, key_file))
+        else:
+            logger.info("证书文件不存在，使用HTTP模式启动服务器...")
+            socketio.run(app, debug=True, host='0.0.0.0', port=25678)
+    finally:
+        compute_executor.shutdown()
 else:
     # 生产环境，gunicorn会直接使用socketio对象
     # 为gunicorn提供正确的WSGI应用对象
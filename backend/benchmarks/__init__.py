@@ -0,0 +1,5 @@
+# 性能基准测试
+# 在backend目录下运行：python -m benchmarks --help
+# - engine：游戏引擎各函数在固定种子生成的开局/中局/残局局面上的耗时（2人14x14、4人20x20）
+# - e2e：通过Flask-SocketIO测试客户端测量每步放置的端到端延迟
+# 结果写入JSON，可以与保存的基准结果比较，发现性能回退
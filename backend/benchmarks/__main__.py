@@ -0,0 +1,74 @@
+# 命令行入口：python -m benchmarks [--suite engine e2e] [--baseline benchmarks/baseline.json]
+
+import argparse
+import json
+import platform
+import sys
+import time
+from benchmarks import compare, engine
+from game_logic import MOVE_GENERATOR
+from benchmarks.positions import DEFAULT_SEED, generate_positions
+
+SUITES = ('engine', 'e2e')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='游戏引擎和Socket服务的性能基准测试')
+    parser.add_argument('--suite', nargs='+', choices=SUITES, default=list(SUITES), help='要运行的测试组')
+    parser.add_argument('--repeat', type=int, default=20, help='每项微基准测试的测量轮数')
+    parser.add_argument('--games', type=int, default=3, help='端到端测试每种棋盘下的对局数')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='生成局面和选择走法的随机种子')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果文件')
+    parser.add_argument('--baseline', help='与之比较的基准结果文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='最小耗时变慢超过该比例时视为回退')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {}
+
+    if 'engine' in args.suite:
+        print('生成局面...')
+        positions = generate_positions(args.seed)
+        print(f'运行引擎微基准测试（{len(positions)}个局面）...')
+        results.update(engine.run(positions, args.repeat, args.seed))
+
+    if 'e2e' in args.suite:
+        try:
+            from benchmarks import e2e
+            print('运行端到端测试...')
+            results.update(e2e.run(args.seed, args.games))
+        except ImportError as e:
+            print(f'跳过端到端测试，缺少依赖: {e}')
+
+    data = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'movegen': MOVE_GENERATOR.name,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {args.output}（{len(results)}项）')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        rows = compare.compare(results, baseline, args.tolerance)
+        print(compare.format_comparison(rows))
+        regressions = [row for row in rows if row[4] == 'slower']
+        if regressions:
+            print(f'{len(regressions)}项性能回退')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
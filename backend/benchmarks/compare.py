@@ -0,0 +1,27 @@
+# 与基准结果比较：按最小耗时计算比值（受机器负载的影响最小），超过容差的视为性能回退
+
+
+def compare(results, baseline, tolerance=0.25):
+    """返回[(名称, 基准耗时, 当前耗时, 比值, 状态)]，只比较两边都有的项"""
+    rows = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        base = baseline[name]['min_us']
+        current = results[name]['min_us']
+        ratio = current / base if base else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'slower'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, base, current, ratio, status))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'名称':<56}{'基准(us)':>12}{'当前(us)':>12}{'比值':>8}  状态"]
+    for name, base, current, ratio, status in rows:
+        lines.append(f"{name:<58}{base:>12.1f}{current:>12.1f}{ratio:>8.2f}  {status}")
+    return '\n'.join(lines)
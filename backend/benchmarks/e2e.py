@@ -0,0 +1,83 @@
+# 端到端基准测试：通过Flask-SocketIO测试客户端调用app.py中的事件处理函数
+# 每个座位一个测试客户端，轮流放置随机合法走法，测量事件从发送到处理完毕（包括向房间内所有客户端发送）的耗时
+
+import os
+import random
+import time
+from pieces import ORIENTATIONS
+from benchmarks.engine import summarize
+
+
+def load_app():
+    """导入app.py：计算在当前进程内进行，不写休眠存储"""
+    os.environ.setdefault('SQUARE_COMPUTE_WORKERS', '0')
+    os.environ.setdefault('SQUARE_ARCHIVE_PATH', '')
+    import app
+    return app
+
+
+def timed_emit(client, event, data=None):
+    start = time.perf_counter()
+    if data is None:
+        client.emit(event)
+    else:
+        client.emit(event, data)
+    return time.perf_counter() - start
+
+
+def play_game(app_module, flask_client, max_players, rng, samples):
+    """创建房间并下完一局，把每个事件的耗时加入samples"""
+    response = flask_client.post('/api/create-room', json={'max_players': max_players})
+    room_id = response.get_json()['room_id']
+
+    clients = {}
+    for seat in range(max_players):
+        client = app_module.socketio.test_client(app_module.app, flask_test_client=flask_client)
+        client.emit('join_room', {'room_id': room_id, 'player_name': f'bench-{seat + 1}'})
+        for message in client.get_received():
+            if message['name'] == 'joined_room':
+                clients[message['args'][0]['player_id']] = client
+
+    room = app_module.rooms[room_id]
+    try:
+        while room.game is not None and not room.game.game_over:
+            player_num = room.game.current_player
+            client = clients[player_num]
+            samples['get_all_valid_positions'].append(timed_emit(client, 'get_all_valid_positions'))
+
+            moves = room.get_legal_moves(player_num)
+            if not moves:
+                break
+            piece_id, orientation_index, board_x, board_y = rng.choice(moves)
+            orientation = ORIENTATIONS[piece_id][orientation_index]
+            samples['place_piece'].append(timed_emit(client, 'place_piece', {
+                'piece_id': piece_id,
+                'position': [board_x, board_y],
+                'rotation': orientation.rotation,
+                'flip': orientation.flip
+            }))
+            samples['request_resync'].append(timed_emit(client, 'request_resync'))
+
+            # 让回合开始时的后台推送在计时之外完成
+            app_module.socketio.sleep(0)
+            for other in clients.values():
+                other.get_received()
+    finally:
+        for client in clients.values():
+            client.disconnect()
+
+
+def run(seed=0, games=3):
+    """返回 {'e2e.<事件>.<棋盘>': 统计}"""
+    app_module = load_app()
+    flask_client = app_module.app.test_client()
+    results = {}
+    for board_name, max_players in (('2p', 2), ('4p', 4)):
+        rng = random.Random(seed)
+        samples = {'place_piece': [], 'get_all_valid_positions': [], 'request_resync': []}
+        for _ in range(games):
+            play_game(app_module, flask_client, max_players, rng, samples)
+        for event, event_samples in samples.items():
+            if event_samples:
+                results[f'e2e.{event}.{board_name}'] = summarize(event_samples, 1)
+    return results
@@ -0,0 +1,102 @@
+# 游戏引擎的微基准测试
+# 会使用置换表的函数每次测量前清空置换表和玩家的已知合法放置，测量的是完整计算的耗时
+
+import random
+import statistics
+import time
+from pieces import PIECES, ROTATIONS, get_transformed_piece
+from transposition import TRANSPOSITION_CACHE
+
+
+def summarize(samples, number):
+    """samples为每轮测量的单次平均耗时（秒），转换为微秒统计"""
+    return {
+        'min_us': min(samples) * 1e6,
+        'median_us': statistics.median(samples) * 1e6,
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'number': number,
+        'repeat': len(samples)
+    }
+
+
+def measure(fn, number=1, repeat=5, setup=None, batch=1):
+    """
+    每轮先执行setup()，再连续执行number次fn()
+    fn内部循环调用被测函数时，batch为每次fn()中的调用次数，结果按单次调用计算
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / (number * batch))
+    return summarize(samples, number * batch)
+
+
+def cold_copy(game):
+    """复制局面并清空缓存，使下一次调用需要完整计算"""
+    TRANSPOSITION_CACHE.clear()
+    clone = game.copy()
+    clone.mobility_witness = {}
+    return clone
+
+
+def sample_placements(game, player_num, rng, count=200):
+    """随机抽取方块、朝向和位置，合法和不合法的放置都有"""
+    pieces = game.players[player_num]['pieces']
+    samples = []
+    for _ in range(count):
+        piece_id = rng.choice(pieces)
+        coords = get_transformed_piece(piece_id, rng.choice(ROTATIONS), rng.random() < 0.5)
+        samples.append((coords, rng.randrange(game.board_size), rng.randrange(game.board_size)))
+    return samples
+
+
+def bench_position(game, repeat=5, seed=0):
+    """在一个局面上测量各引擎函数，返回 {函数名: 统计}"""
+    rng = random.Random(seed)
+    player_num = game.current_player
+    pieces = game.players[player_num]['pieces']
+    results = {}
+
+    if pieces:
+        placements = sample_placements(game, player_num, rng)
+
+        def validate_all():
+            for coords, board_x, board_y in placements:
+                game.is_valid_position(coords, board_x, board_y, player_num)
+        results['is_valid_position'] = measure(validate_all, repeat=repeat, batch=len(placements))
+
+        piece_id = max(pieces, key=lambda piece: (PIECES[piece]['size'], piece))  # 最大的方块
+        results['get_valid_positions'] = measure(
+            lambda: game.get_valid_positions(player_num, piece_id), repeat=repeat
+        )
+
+    state = {}
+
+    def reset():
+        state['game'] = cold_copy(game)
+
+    results['get_legal_moves'] = measure(
+        lambda: state['game'].get_legal_moves(player_num), repeat=repeat, setup=reset
+    )
+    results['can_player_place_any_piece'] = measure(
+        lambda: state['game'].can_player_place_any_piece(player_num), repeat=repeat, setup=reset
+    )
+    results['check_game_over'] = measure(
+        lambda: state['game'].check_game_over(), repeat=repeat, setup=reset
+    )
+    results['get_game_state'] = measure(game.get_game_state, number=20, repeat=repeat)
+    return results
+
+
+def run(positions, repeat=5, seed=0):
+    """对所有局面运行微基准测试，返回 {'engine.<函数>.<局面>': 统计}"""
+    results = {}
+    for position_name, game in positions.items():
+        for function_name, stats in bench_position(game, repeat, seed).items():
+            results[f'engine.{function_name}.{position_name}'] = stats
+    TRANSPOSITION_CACHE.clear()
+    return results
@@ -0,0 +1,427 @@
+# 负载测试：通过真实的Socket.IO连接模拟大量玩家
+# 用asyncio同时运行成百上千个客户端：通过/api/create-room创建房间，join_room加入，
+# 轮到自己时请求有效位置（get_all_valid_positions或旧的get_valid_positions）并用place_piece放置随机合法走法
+# 房间数逐级增加，每一级报告放置延迟、广播扇出时间和服务器进程的CPU/RSS
+#
+# 需要额外安装：pip install "python-socketio[asyncio_client]"（psutil可选，没有时从/proc读取）
+# 先启动服务器，再在backend目录下运行：
+#   python -m benchmarks.loadtest --url http://localhost:25678 --rooms 10 50 100 --server-pid <pid>
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pieces import ORIENTATIONS
+
+try:
+    import aiohttp
+    import socketio
+except ImportError:  # 只有运行负载测试时才需要
+    aiohttp = socketio = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize_ms(values):
+    """秒转换为毫秒的p50/p99/最大值"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 0.5) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': max(values) * 1000,
+        'mean_ms': statistics.fmean(values) * 1000
+    }
+
+
+class ProcessSampler:
+    """
+    服务器进程的CPU时间和RSS（gunicorn时传入所有worker的pid）
+    只统计指定的进程，计算进程池的子进程不计入（单核机器上CPU占用低时可能是子进程占满了CPU）
+    """
+
+    def __init__(self, pids):
+        self.pids = pids
+
+    def read_cpu_seconds(self, pid):
+        if psutil is not None:
+            times = psutil.Process(pid).cpu_times()
+            return times.user + times.system
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    def read_rss_bytes(self, pid):
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def sample(self):
+        if not self.pids:
+            return None
+        return {
+            'time': time.monotonic(),
+            'cpu': sum(self.read_cpu_seconds(pid) for pid in self.pids),
+            'rss': sum(self.read_rss_bytes(pid) for pid in self.pids)
+        }
+
+    @staticmethod
+    def usage(start, end):
+        if start is None or end is None:
+            return {}
+        wall = end['time'] - start['time']
+        return {
+            'cpu_percent': (end['cpu'] - start['cpu']) / wall * 100 if wall > 0 else 0,
+            'rss_mb': end['rss'] / 1024 / 1024
+        }
+
+
+class RequestFailed(Exception):
+    """请求返回错误（如服务器繁忙）或超时"""
+
+
+class Stats:
+    def __init__(self):
+        self.move_latency = []  # place_piece发送到自己收到game_updated
+        self.fanout = []  # place_piece发送到房间内最后一个客户端收到game_updated
+        self.valid_positions_latency = []
+        self.connect_latency = []
+        self.moves = 0
+        self.errors = 0
+        self.retries = 0
+        self.finished_rooms = 0
+
+
+class RoomRun:
+    """一个房间内所有模拟玩家共享的状态"""
+
+    def __init__(self, room_id, max_players, stats):
+        self.room_id = room_id
+        self.max_players = max_players
+        self.stats = stats
+        self.players = []
+        self.pending_moves = {}  # 放置后的回合号 -> [发送时间, 已收到的客户端数]
+        self.done = asyncio.Event()
+
+    def record_sent(self, turn, sent_at):
+        self.pending_moves[turn] = [sent_at, 0]
+
+    def record_received(self, turn, is_mover, received_at):
+        pending = self.pending_moves.get(turn)
+        if pending is None:
+            return
+        sent_at = pending[0]
+        pending[1] += 1
+        if is_mover:
+            self.stats.move_latency.append(received_at - sent_at)
+            self.stats.moves += 1
+        if pending[1] == len(self.players):
+            self.stats.fanout.append(received_at - sent_at)
+            del self.pending_moves[turn]
+
+    def finish(self):
+        if not self.done.is_set():
+            self.stats.finished_rooms += 1
+            self.done.set()
+
+
+class SimulatedPlayer:
+    def __init__(self, args, room, name, rng):
+        self.args = args
+        self.room = room
+        self.name = name
+        self.rng = rng
+        self.player_num = None
+        self.pieces = []
+        self.turn = 0
+        self.current_player = None
+        self.response = None  # 等待有效位置响应的Future
+        self.playing = False
+        self.sio = socketio.AsyncClient(reconnection=False)
+        for event, handler in (
+            ('joined_room', self.on_joined_room),
+            ('game_started', self.on_game_started),
+            ('game_updated', self.on_game_updated),
+            ('game_over', self.on_game_over),
+            ('all_valid_positions', self.on_valid_positions),
+            ('valid_positions', self.on_valid_positions),
+            ('move_error', self.on_error),
+            ('error', self.on_error)
+        ):
+            self.sio.on(event, handler)
+
+    async def start(self):
+        start = time.perf_counter()
+        await self.sio.connect(self.args.url, transports=['websocket'])
+        self.room.stats.connect_latency.append(time.perf_counter() - start)
+        await self.sio.emit('join_room', {'room_id': self.room.room_id, 'player_name': self.name})
+
+    async def stop(self):
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+    async def on_joined_room(self, data):
+        self.player_num = data['player_id']
+
+    async def on_game_started(self, data):
+        state = data['game_state']
+        self.turn = state['turn']
+        self.current_player = state['current_player']
+        self.pieces = list(state['players'][str(self.player_num)]['pieces'])
+        self.schedule_turn()
+
+    async def on_game_updated(self, data):
+        received_at = time.perf_counter()
+        delta = data['delta']
+        is_mover = int(delta['player']) == self.player_num
+        self.room.record_received(delta['turn'], is_mover, received_at)
+        if is_mover and delta['placed_piece']['piece_id'] in self.pieces:
+            self.pieces.remove(delta['placed_piece']['piece_id'])
+        self.turn = delta['turn']
+        self.current_player = delta['current_player']
+        if delta['game_over']:
+            self.room.finish()
+        else:
+            self.schedule_turn()
+
+    async def on_game_over(self, data):
+        self.room.finish()
+
+    async def on_valid_positions(self, data):
+        if self.response is not None and not self.response.done():
+            self.response.set_result(data)
+
+    async def on_error(self, data):
+        self.room.stats.errors += 1
+        if self.response is not None and not self.response.done():
+            self.response.set_result(None)
+
+    def schedule_turn(self):
+        if self.current_player == self.player_num and not self.playing and not self.room.done.is_set():
+            self.playing = True
+            asyncio.get_running_loop().create_task(self.play_turn())
+
+    async def request(self, event, data=None):
+        """发送请求并等待对应的响应事件，出错或超时抛出RequestFailed"""
+        self.response = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        await self.sio.emit(event, data)
+        try:
+            result = await asyncio.wait_for(self.response, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.room.stats.errors += 1
+            raise RequestFailed(f'{event}超时')
+        if result is None:
+            raise RequestFailed(f'{event}出错')
+        self.room.stats.valid_positions_latency.append(time.perf_counter() - start)
+        return result
+
+    async def choose_move_all(self):
+        """一次请求所有方块、所有朝向的有效位置"""
+        response = await self.request('get_all_valid_positions')
+        candidates = []
+        for piece_id, orientations in response['pieces'].items():
+            for orientation_index, flat in enumerate(orientations):
+                for offset in range(0, len(flat), 2):
+                    candidates.append((piece_id, orientation_index, flat[offset], flat[offset + 1]))
+        if not candidates:
+            return None
+        piece_id, orientation_index, board_x, board_y = self.rng.choice(candidates)
+        orientation = ORIENTATIONS[piece_id][orientation_index]
+        return piece_id, orientation.rotation, orientation.flip, board_x, board_y
+
+    async def choose_move_legacy(self):
+        """
+        旧接口：按随机顺序逐个方块、逐个朝向请求有效位置，直到找到可以放置的位置
+        （所有朝向都要尝试，只剩少数走法时只试一个朝向会找不到，房间停在这一回合）
+        """
+        for piece_id in self.rng.sample(self.pieces, len(self.pieces)):
+            orientations = ORIENTATIONS[piece_id]
+            for orientation in self.rng.sample(orientations, len(orientations)):
+                result = await self.request('get_valid_positions', {
+                    'piece_id': piece_id, 'rotation': orientation.rotation, 'flip': orientation.flip
+                })
+                if result['positions']:
+                    board_x, board_y = self.rng.choice(result['positions'])
+                    return piece_id, orientation.rotation, orientation.flip, board_x, board_y
+        return None
+
+    async def choose_move(self):
+        """
+        选择本回合的走法，请求失败（如服务器繁忙）时等待后重试，
+        否则这个房间会停在这一回合直到本级结束，测得的吞吐量偏低
+        """
+        for attempt in range(self.args.retries + 1):
+            if attempt:
+                self.room.stats.retries += 1
+                await asyncio.sleep(self.args.retry_delay * attempt)
+                if self.current_player != self.player_num or self.room.done.is_set():
+                    return None
+            try:
+                if self.args.valid_positions == 'legacy':
+                    return await self.choose_move_legacy()
+                return await self.choose_move_all()
+            except RequestFailed:
+                pass
+        return None
+
+    async def play_turn(self):
+        try:
+            if self.args.think_time:
+                await asyncio.sleep(self.rng.uniform(0, self.args.think_time))
+            move = await self.choose_move()
+            if move is None or self.current_player != self.player_num:
+                return
+            piece_id, rotation, flip, board_x, board_y = move
+            self.room.record_sent(self.turn + 1, time.perf_counter())
+            await self.sio.emit('place_piece', {
+                'piece_id': piece_id,
+                'position': [board_x, board_y],
+                'rotation': rotation,
+                'flip': flip
+            })
+        finally:
+            self.playing = False
+
+
+async def create_room(session, args):
+    async with session.post(f'{args.url}/api/create-room', json={'max_players': args.max_players}) as response:
+        data = await response.json()
+    return data['room_id']
+
+
+async def run_step(args, room_count, sampler, rng):
+    """创建room_count个房间并同时对局，返回这一级的统计结果"""
+    stats = Stats()
+    async with aiohttp.ClientSession() as session:
+        room_ids = await asyncio.gather(*(create_room(session, args) for _ in range(room_count)))
+
+    rooms = []
+    players = []
+    for room_id in room_ids:
+        room = RoomRun(room_id, args.max_players, stats)
+        for seat in range(args.max_players):
+            player = SimulatedPlayer(args, room, f'load-{seat + 1}', random.Random(rng.random()))
+            room.players.append(player)
+            players.append(player)
+        rooms.append(room)
+
+    start_sample = sampler.sample()
+    started = time.perf_counter()
+    connecting = asyncio.Semaphore(args.connect_concurrency)
+
+    async def start_player(player):
+        async with connecting:
+            try:
+                await player.start()
+            except Exception as e:
+                stats.errors += 1
+                print(f'连接失败: {e}', file=sys.stderr)
+
+    await asyncio.gather(*(start_player(player) for player in players))
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(room.done.wait() for room in rooms)), args.duration
+        )
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    end_sample = sampler.sample()
+
+    await asyncio.gather(*(player.stop() for player in players), return_exceptions=True)
+    return {
+        'rooms': room_count,
+        'clients': len(players),
+        'elapsed_s': elapsed,
+        'moves': stats.moves,
+        'moves_per_s': stats.moves / elapsed if elapsed > 0 else 0,
+        'finished_rooms': stats.finished_rooms,
+        'errors': stats.errors,
+        'retries': stats.retries,
+        'move_latency': summarize_ms(stats.move_latency),
+        'fanout': summarize_ms(stats.fanout),
+        'valid_positions_latency': summarize_ms(stats.valid_positions_latency),
+        'connect_latency': summarize_ms(stats.connect_latency),
+        'server': ProcessSampler.usage(start_sample, end_sample)
+    }
+
+
+def format_step(result):
+    move = result['move_latency']
+    fanout = result['fanout']
+    server = result['server']
+    line = (f"房间{result['rooms']:>5} 客户端{result['clients']:>6} 放置{result['moves']:>6} "
+            f"({result['moves_per_s']:.1f}/s) 错误{result['errors']} 重试{result['retries']}")
+    if move['count']:
+        line += f" 延迟p50 {move['p50_ms']:.1f}ms p99 {move['p99_ms']:.1f}ms"
+    if fanout['count']:
+        line += f" 扇出p50 {fanout['p50_ms']:.1f}ms p99 {fanout['p99_ms']:.1f}ms"
+    if server:
+        line += f" CPU {server['cpu_percent']:.0f}% RSS {server['rss_mb']:.0f}MB"
+    return line
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadtest', description='Socket.IO负载测试')
+    parser.add_argument('--url', default='http://localhost:25678', help='服务器地址')
+    parser.add_argument('--rooms', type=int, nargs='+', default=[10, 50, 100, 250, 500], help='逐级增加的房间数')
+    parser.add_argument('--max-players', type=int, choices=(2, 4), default=2, help='每个房间的玩家数')
+    parser.add_argument('--duration', type=float, default=60.0, help='每一级最长运行时间（秒）')
+    parser.add_argument('--think-time', type=float, default=0.0, help='每步之前随机等待的最长时间（秒）')
+    parser.add_argument('--timeout', type=float, default=10.0, help='等待有效位置响应的超时时间（秒）')
+    parser.add_argument('--valid-positions', choices=('all', 'legacy'), default='all',
+                        help='all使用get_all_valid_positions，legacy逐个方块使用get_valid_positions')
+    parser.add_argument('--retries', type=int, default=5, help='请求失败（如服务器繁忙）时每回合最多重试的次数')
+    parser.add_argument('--retry-delay', type=float, default=0.1, help='第n次重试前等待n倍的该时间（秒）')
+    parser.add_argument('--connect-concurrency', type=int, default=100, help='同时建立的连接数')
+    parser.add_argument('--server-pid', type=int, action='append', default=[],
+                        help='服务器进程pid，用于统计CPU和RSS（可以多次指定）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='loadtest_results.json', help='结果文件')
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    sampler = ProcessSampler(args.server_pid)
+    rng = random.Random(args.seed)
+    results = []
+    for room_count in args.rooms:
+        result = await run_step(args, room_count, sampler, rng)
+        print(format_step(result))
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    if socketio is None or aiohttp is None:
+        print('缺少依赖，请先安装：pip install "python-socketio[asyncio_client]"', file=sys.stderr)
+        return 1
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'args': vars(args), 'steps': results}, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# 基准测试使用的局面：用固定种子的随机对局生成，同一个种子每次得到相同的局面
+
+import random
+from game_logic import Game
+
+DEFAULT_SEED = 20240601
+
+# 各阶段在整局中的位置（已完成的放置数占整局放置数的比例）
+PHASES = {
+    'opening': 0.15,
+    'midgame': 0.5,
+    'endgame': 0.9
+}
+
+BOARDS = {
+    '2p': 2,
+    '4p': 4
+}
+
+
+def new_game(max_players):
+    game = Game(max_players)
+    for player_num in range(1, max_players + 1):
+        game.add_player(f'bench-{player_num}', player_num)
+    return game
+
+
+def play_random_game(max_players, seed):
+    """用固定种子下完一整局随机对局，返回每次放置之后的局面列表（第0项为开局）"""
+    rng = random.Random(seed)
+    game = new_game(max_players)
+    positions = [game.copy()]
+    while not game.game_over:
+        player_num = game.current_player
+        # 排序后再选择，局面与走法生成引擎的枚举顺序无关
+        moves = sorted(game.get_legal_moves(player_num))
+        if not moves:
+            break
+        result = game.play_move(player_num, rng.choice(moves))
+        if not result['success']:
+            raise RuntimeError(f"随机对局放置失败: {result['message']}")
+        positions.append(game.copy())
+    return positions
+
+
+def generate_positions(seed=DEFAULT_SEED):
+    """返回 {'2p-opening': Game, ...}，每种棋盘各开局、中局、残局一个局面"""
+    positions = {}
+    for board_name, max_players in BOARDS.items():
+        history = play_random_game(max_players, seed)
+        last = len(history) - 1
+        for phase, fraction in PHASES.items():
+            # 残局取最后一个还未结束的局面附近，保证当前玩家还有走法可测
+            index = min(int(last * fraction), max(last - 1, 0))
+            positions[f'{board_name}-{phase}'] = history[index]
+    return positions
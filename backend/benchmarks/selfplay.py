@@ -0,0 +1,275 @@
+# 自对弈和对抗赛：用进程池在所有CPU核上不经过服务器直接用Game下完整对局
+# 用于调整电脑玩家的参数，以及用远超线上的对局量对游戏引擎做长时间测试
+# 每局一行NDJSON（走法、每步耗时、最终get_scores、获胜者），最后一行为汇总（各玩家胜率、每秒对局数）
+#
+# 在backend目录下运行：
+#   python -m benchmarks.selfplay --games 1000 --players random greedy
+#   python -m benchmarks.selfplay --games 200 --max-players 4 --players search:0.2 greedy greedy greedy --output games.ndjson
+#
+# 玩家：random（随机合法走法）、greedy（走法排序后的第一步）、search[:思考秒数]（Bot的迭代加深搜索）
+# 对局i的种子为--seed + i，随机玩家的选择只取决于种子；搜索玩家受时间预算影响，结果不能完全复现
+# 座位默认每局轮换，避免先手优势影响胜率
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from ai import Bot
+from game_logic import MOVE_GENERATOR
+from benchmarks.positions import new_game
+import zobrist
+
+PLAYER_TYPES = ('random', 'greedy', 'search')
+DEFAULT_SEARCH_BUDGET = 0.1
+
+
+class RandomPlayer:
+    def __init__(self, player_num, rng):
+        self.player_num = player_num
+        self.rng = rng
+
+    def choose_move(self, game):
+        # 排序后再选择，结果与走法生成引擎的枚举顺序无关
+        moves = sorted(game.get_legal_moves(self.player_num))
+        return self.rng.choice(moves) if moves else None
+
+
+class GreedyPlayer:
+    def __init__(self, player_num, rng):
+        self.bot = Bot(player_num)
+        self.player_num = player_num
+
+    def choose_move(self, game):
+        # 与计算资源不足时电脑玩家的快速走法相同
+        return self.bot.choose_quick_move(game, sorted(game.get_legal_moves(self.player_num)))
+
+
+class SearchPlayer:
+    def __init__(self, player_num, rng, time_budget=DEFAULT_SEARCH_BUDGET):
+        self.bot = Bot(player_num, time_budget=time_budget)
+
+    def choose_move(self, game):
+        return self.bot.choose_move(game)
+
+
+def parse_player(spec):
+    """'search:0.2' -> ('search', 0.2)，其他玩家没有参数"""
+    name, _, argument = spec.partition(':')
+    if name not in PLAYER_TYPES:
+        raise argparse.ArgumentTypeError(f"未知的玩家类型: {name}")
+    if name == 'search':
+        return spec, name, float(argument) if argument else DEFAULT_SEARCH_BUDGET
+    if argument:
+        raise argparse.ArgumentTypeError(f"{name}玩家没有参数")
+    return spec, name, None
+
+
+def create_player(name, argument, player_num, rng):
+    if name == 'random':
+        return RandomPlayer(player_num, rng)
+    if name == 'greedy':
+        return GreedyPlayer(player_num, rng)
+    return SearchPlayer(player_num, rng, argument)
+
+
+def get_seating(specs, max_players, index, rotate):
+    """对局index中每个座位（player_num）的玩家，玩家数不足时循环使用"""
+    seating = [specs[seat % len(specs)] for seat in range(max_players)]
+    if rotate:
+        shift = index % max_players
+        seating = seating[shift:] + seating[:shift]
+    return {player_num: spec for player_num, spec in enumerate(seating, 1)}
+
+
+def play_game(index, seed, max_players, seating, record_moves=True):
+    """下完一局，返回结果记录；放置失败或局面校验不通过时记录error"""
+    rng = random.Random(seed)
+    game = new_game(max_players)
+    players = {
+        player_num: create_player(name, argument, player_num, random.Random(rng.random()))
+        for player_num, (label, name, argument) in seating.items()
+    }
+    moves = []
+    think_time = defaultdict(float)
+    move_count = defaultdict(int)
+    error = None
+    start = time.perf_counter()
+    while not game.game_over:
+        player_num = game.current_player
+        move_start = time.perf_counter()
+        move = players[player_num].choose_move(game)
+        elapsed = time.perf_counter() - move_start
+        if move is None:
+            error = f"玩家{player_num}没有合法走法但游戏未结束"
+            break
+        result = game.play_move(player_num, move)
+        if not result['success']:
+            error = f"玩家{player_num}的走法{move}放置失败: {result['message']}"
+            break
+        think_time[player_num] += elapsed
+        move_count[player_num] += 1
+        if record_moves:
+            moves.append([player_num, *move, round(elapsed * 1000, 3)])
+
+    if error is None and game.zobrist_hash != zobrist.compute_hash(game):
+        error = "增量更新的Zobrist哈希与重新计算的不一致"
+
+    labels = {player_num: label for player_num, (label, _, _) in seating.items()}
+    winner = game.winner
+    record = {
+        'type': 'game',
+        'index': index,
+        'seed': seed,
+        'max_players': max_players,
+        'players': {str(player_num): label for player_num, label in labels.items()},
+        'turns': game.turn,
+        'scores': game.get_scores(),
+        'winner': winner,
+        'winner_label': labels.get(winner) if winner not in (None, 'tie') else winner,
+        'seconds': round(time.perf_counter() - start, 6),
+        'timing': {  # 每个座位的走法数和平均每步耗时
+            str(player_num): {
+                'moves': move_count[player_num],
+                'mean_ms': round(think_time[player_num] * 1000 / move_count[player_num], 3)
+            }
+            for player_num in move_count
+        }
+    }
+    if record_moves:
+        record['moves'] = moves  # [player_num, piece_id, 朝向编号, x, y, 耗时毫秒]
+    if error is not None:
+        record['error'] = error
+    return record
+
+
+class Summary:
+    """按玩家（而不是座位）汇总胜率、剩余格数和每步耗时"""
+
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.errors = 0
+        self.ties = 0
+        self.stats = defaultdict(lambda: {'games': 0, 'wins': 0, 'remaining': 0, 'think_ms': 0.0, 'moves': 0})
+        self.start = time.perf_counter()
+
+    def add(self, record):
+        self.games += 1
+        self.moves += record['turns']
+        if 'error' in record:
+            self.errors += 1
+        if record['winner'] == 'tie':
+            self.ties += 1
+        for seat, label in record['players'].items():
+            stats = self.stats[label]
+            stats['games'] += 1
+            stats['remaining'] += record['scores'][seat]
+            if record['winner'] == int(seat):
+                stats['wins'] += 1
+            timing = record['timing'].get(seat)
+            if timing is not None:
+                stats['think_ms'] += timing['mean_ms'] * timing['moves']
+                stats['moves'] += timing['moves']
+
+    def to_record(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            'type': 'summary',
+            'games': self.games,
+            'errors': self.errors,
+            'ties': self.ties,
+            'seconds': round(elapsed, 3),
+            'games_per_second': round(self.games / elapsed, 3) if elapsed else None,
+            'moves_per_second': round(self.moves / elapsed, 1) if elapsed else None,
+            'movegen': MOVE_GENERATOR.name,
+            'players': {
+                label: {
+                    'games': stats['games'],
+                    'wins': stats['wins'],
+                    'win_rate': round(stats['wins'] / stats['games'], 4),
+                    'mean_remaining': round(stats['remaining'] / stats['games'], 2),
+                    'mean_think_ms': round(stats['think_ms'] / stats['moves'], 3) if stats['moves'] else None
+                }
+                for label, stats in sorted(self.stats.items())
+            }
+        }
+
+
+def format_summary(summary):
+    lines = [
+        f"{summary['games']}局，{summary['seconds']}秒，{summary['games_per_second']}局/秒，"
+        f"{summary['moves_per_second']}步/秒，平局{summary['ties']}，错误{summary['errors']}",
+        f"{'玩家':<16}{'对局':>8}{'胜':>8}{'胜率':>10}{'平均剩余格数':>14}{'每步毫秒':>10}"
+    ]
+    for label, stats in summary['players'].items():
+        think = '-' if stats['mean_think_ms'] is None else f"{stats['mean_think_ms']:.3f}"
+        lines.append(
+            f"{label:<16}{stats['games']:>8}{stats['wins']:>8}{stats['win_rate']:>10.2%}"
+            f"{stats['mean_remaining']:>14.2f}{think:>10}"
+        )
+    return '\n'.join(lines)
+
+
+def iter_results(args, seatings):
+    """按完成顺序返回对局结果，--workers 1时在当前进程中依次执行"""
+    jobs = (
+        (args.seed + index, index, seatings[index]) for index in range(args.games)
+    )
+    if args.workers == 1:
+        for seed, index, seating in jobs:
+            yield play_game(index, seed, args.max_players, seating, not args.no_moves)
+        return
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        pending = set()
+        for seed, index, seating in jobs:
+            # 只保持有限数量的任务在队列中，大量对局时不会一次提交全部
+            if len(pending) >= args.workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(play_game, index, seed, args.max_players, seating, not args.no_moves))
+        for future in wait(pending).done:
+            yield future.result()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.selfplay', description='自对弈和对抗赛')
+    parser.add_argument('--games', type=int, default=100, help='对局数')
+    parser.add_argument('--max-players', type=int, choices=(2, 4), default=2)
+    parser.add_argument('--players', type=parse_player, nargs='+', default=[parse_player('random')],
+                        help='各座位的玩家：random、greedy或search[:思考秒数]，不足时循环使用')
+    parser.add_argument('--no-rotate', action='store_true', help='不轮换座位')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数，1时不使用进程池')
+    parser.add_argument('--seed', type=int, default=0, help='第一局的种子，之后每局加1')
+    parser.add_argument('--no-moves', action='store_true', help='结果中不包含每步走法')
+    parser.add_argument('--output', default='-', help='NDJSON结果文件，默认输出到标准输出')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    seatings = [
+        get_seating(args.players, args.max_players, index, not args.no_rotate) for index in range(args.games)
+    ]
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    summary = Summary()
+    try:
+        for record in iter_results(args, seatings):
+            summary.add(record)
+            output.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        result = summary.to_record()
+        output.write(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(format_summary(result), file=sys.stderr)
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
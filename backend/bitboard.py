@@ -0,0 +1,175 @@
+# 位棋盘实现
+# 每个格子对应一个整数中的一位，位索引为 y * BOARD_STRIDE + x
+# 行宽固定为BOARD_STRIDE，这样方块掩码与棋盘大小无关，只需平移即可放到任意位置
+
+from functools import lru_cache
+
+BOARD_STRIDE = 32  # 固定行宽（大于最大棋盘20，右侧多余的列始终为空）
+
+EDGE_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL_OFFSETS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def cell_index(x, y):
+    """格子坐标转换为位索引"""
+    return y * BOARD_STRIDE + x
+
+
+def cell_position(index):
+    """位索引转换为格子坐标(x, y)"""
+    return index % BOARD_STRIDE, index // BOARD_STRIDE
+
+
+def coords_mask(coords):
+    """将相对坐标列表转换为以(0,0)为原点的掩码"""
+    mask = 0
+    for dx, dy in coords:
+        mask |= 1 << cell_index(dx, dy)
+    return mask
+
+
+def iter_bits(mask):
+    """依次返回掩码中每个置位的索引"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@lru_cache(maxsize=None)
+def get_neighbor_tables(board_size):
+    """
+    预计算每个格子的边相邻掩码、角相邻掩码以及整个棋盘的掩码
+    """
+    size = board_size * BOARD_STRIDE
+    edge_masks = [0] * size
+    diagonal_masks = [0] * size
+    board_mask = 0
+
+    for y in range(board_size):
+        for x in range(board_size):
+            index = cell_index(x, y)
+            board_mask |= 1 << index
+            for dx, dy in EDGE_OFFSETS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < board_size and 0 <= ny < board_size:
+                    edge_masks[index] |= 1 << cell_index(nx, ny)
+            for dx, dy in DIAGONAL_OFFSETS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < board_size and 0 <= ny < board_size:
+                    diagonal_masks[index] |= 1 << cell_index(nx, ny)
+
+    return tuple(edge_masks), tuple(diagonal_masks), board_mask
+
+
+class BitBoard:
+    __slots__ = (
+        'board_size', 'max_players', 'edge_masks', 'diagonal_masks', 'board_mask',
+        'occupied', 'occupancy', 'forbidden', 'corners', 'anchors'
+    )
+
+    def __init__(self, board_size, max_players=2, start_cells=None):
+        self.board_size = board_size
+        self.max_players = max_players
+        self.edge_masks, self.diagonal_masks, self.board_mask = get_neighbor_tables(board_size)
+        self.occupied = 0  # 所有玩家占用的格子
+        self.occupancy = {player_num: 0 for player_num in range(1, max_players + 1)}
+        self.forbidden = {player_num: 0 for player_num in range(1, max_players + 1)}  # 与自己方块边相邻的格子
+        self.corners = {player_num: 0 for player_num in range(1, max_players + 1)}  # 与自己方块角相邻的格子
+        # 锚点：新方块必须覆盖其中之一的空格子（第一步为起始角落，之后为可用的角相邻格子）
+        self.anchors = {}
+        start_cells = start_cells or {}
+        for player_num in range(1, max_players + 1):
+            if player_num in start_cells:
+                self.anchors[player_num] = 1 << cell_index(*start_cells[player_num])
+            else:
+                self.anchors[player_num] = self.board_mask  # 没有起始角落限制
+
+    def copy(self):
+        """复制位棋盘（相邻掩码表是共享的只读数据）"""
+        clone = BitBoard.__new__(BitBoard)
+        clone.board_size = self.board_size
+        clone.max_players = self.max_players
+        clone.edge_masks = self.edge_masks
+        clone.diagonal_masks = self.diagonal_masks
+        clone.board_mask = self.board_mask
+        clone.occupied = self.occupied
+        clone.occupancy = dict(self.occupancy)
+        clone.forbidden = dict(self.forbidden)
+        clone.corners = dict(self.corners)
+        clone.anchors = dict(self.anchors)
+        return clone
+
+    @classmethod
+    def from_occupancy(cls, board_size, max_players, occupancy, start_cells=None):
+        """根据每个玩家占用的格子重建位棋盘（相邻掩码和锚点全部重新计算）"""
+        bitboard = cls(board_size, max_players, start_cells)
+        for player_num, mask in occupancy.items():
+            edge = 0
+            diagonal = 0
+            for index in iter_bits(mask):
+                edge |= bitboard.edge_masks[index]
+                diagonal |= bitboard.diagonal_masks[index]
+            bitboard.occupied |= mask
+            bitboard.occupancy[player_num] = mask
+            bitboard.forbidden[player_num] = edge
+            bitboard.corners[player_num] = diagonal
+
+        for player_num, mask in bitboard.occupancy.items():
+            if mask:
+                anchors = bitboard.corners[player_num]
+            else:
+                anchors = bitboard.anchors[player_num]
+            bitboard.anchors[player_num] = anchors & ~(bitboard.occupied | bitboard.forbidden[player_num])
+        return bitboard
+
+    def piece_mask(self, piece_coords, board_x, board_y):
+        """计算方块放在指定位置时的掩码，超出棋盘时返回None"""
+        mask = 0
+        for dx, dy in piece_coords:
+            x, y = board_x + dx, board_y + dy
+            if x < 0 or x >= self.board_size or y < 0 or y >= self.board_size:
+                return None
+            mask |= 1 << cell_index(x, y)
+        return mask
+
+    def place(self, mask, player_num):
+        """将掩码中的格子标记为玩家所有，并增量更新相邻掩码和锚点"""
+        edge = 0
+        diagonal = 0
+        for index in iter_bits(mask):
+            edge |= self.edge_masks[index]
+            diagonal |= self.diagonal_masks[index]
+
+        first_move = not self.occupancy[player_num]
+        self.occupied |= mask
+        self.occupancy[player_num] |= mask
+        self.forbidden[player_num] |= edge
+        self.corners[player_num] |= diagonal
+
+        # 被占用的格子不再是任何玩家的锚点
+        for other in self.anchors:
+            self.anchors[other] &= ~mask
+
+        # 放置者的锚点：加入新的角相邻格子，去掉边相邻和已占用的格子
+        anchors = 0 if first_move else self.anchors[player_num]
+        self.anchors[player_num] = (anchors | diagonal) & ~(self.occupied | self.forbidden[player_num])
+
+    def get_cell(self, x, y):
+        """获取格子所属玩家，空格返回0"""
+        bit = 1 << cell_index(x, y)
+        if not self.occupied & bit:
+            return 0
+        for player_num, mask in self.occupancy.items():
+            if mask & bit:
+                return player_num
+        return 0
+
+    def to_matrix(self):
+        """转换为列表嵌套列表形式的棋盘（board[y][x]）"""
+        board = [[0] * self.board_size for _ in range(self.board_size)]
+        for player_num, mask in self.occupancy.items():
+            for index in iter_bits(mask):
+                x, y = cell_position(index)
+                board[y][x] = player_num
+        return board
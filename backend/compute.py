@@ -0,0 +1,200 @@
+# 计算任务执行器
+# 走法生成、局面分析和AI搜索都是纯Python的CPU密集计算，在eventlet单线程中运行会阻塞所有房间
+# 这里把它们发送到进程池中执行，局面以Game.to_compact()的紧凑元组传递
+# - 进程池使用标准的concurrent.futures（子进程用spawn启动，不继承monkey_patch），
+#   eventlet环境下进程池的管理线程和等待结果用的锁都是绿色版本，等待时让出事件循环，不会阻塞其他房间
+#   （不能用tpool在原生线程中等待：Future内部的锁属于事件循环所在的线程）
+# - 游戏结束判断使用增量维护的行动能力（见Game.check_game_over），开销很小，仍在放置时同步执行
+# - 同时进行的任务数有上限，超出时立即拒绝（ComputeBusy），同一个任务键同一时间只允许一个任务
+#   （调用方按房间和任务类型组成任务键，如'<房间ID>:bot'，同一房间的不同类型任务不会互相拒绝）
+# - 每个任务都有超时时间，超时后放弃结果（ComputeTimeout）
+# - 任务本身出错或进程池故障时抛出ComputeFailed，调用方只需处理ComputeError
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from ai import Bot
+from analysis import analyze_position
+from endgame import analyze_endgame
+from game_logic import Game
+import metrics
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_SECONDS = metrics.histogram(
+    'square_compute_seconds', '计算任务从提交到得到结果的耗时（秒）', ['task']
+)
+COMPUTE_TASKS = metrics.counter(
+    'square_compute_tasks_total', '计算任务数，按结果分类（ok、busy、timeout、error）', ['task', 'outcome']
+)
+
+
+class ComputeError(Exception):
+    pass
+
+
+class ComputeBusy(ComputeError):
+    pass
+
+
+class ComputeTimeout(ComputeError):
+    pass
+
+
+class ComputeFailed(ComputeError):
+    pass
+
+
+# 在子进程中执行的任务，参数和返回值都只包含基本类型
+
+def legal_moves_task(compact, player_num):
+    """计算玩家的所有合法放置"""
+    return Game.from_compact(compact).get_legal_moves(player_num)
+
+
+def bot_move_task(compact, player_num, time_budget):
+    """电脑玩家搜索一步走法"""
+    return Bot(player_num, time_budget=time_budget).choose_move(Game.from_compact(compact))
+
+
+def analysis_task(compact, player_num, limit, time_budget):
+    """局面分析和候选走法排名"""
+    return analyze_position(Game.from_compact(compact), player_num, limit, time_budget)
+
+
+def endgame_analysis_task(compact, moves):
+    """从开局局面依次执行moves，对残局中的每一步做精确分析"""
+    return analyze_endgame(Game.from_compact(compact), moves)
+
+
+class ComputeExecutor:
+    def __init__(self, max_workers=None, max_pending=32, default_timeout=5.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.default_timeout = default_timeout
+        self.pool = None
+        self.pending = 0
+        self.pending_keys = set()
+        self.lock = threading.Lock()
+        self.pool_lock = threading.Lock()
+
+    def get_pool(self):
+        """按需创建进程池，子进程使用spawn启动，不继承eventlet的状态"""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self.pool
+
+    def reset_pool(self, wait=False):
+        """子进程异常退出后丢弃进程池，下次使用时重新创建"""
+        with self.pool_lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def acquire(self, key):
+        with self.lock:
+            if self.pending >= self.max_pending:
+                raise ComputeBusy("计算任务过多")
+            if key is not None and key in self.pending_keys:
+                raise ComputeBusy("该房间已有同类计算任务在进行")
+            self.pending += 1
+            if key is not None:
+                self.pending_keys.add(key)
+
+    def release(self, key):
+        with self.lock:
+            self.pending -= 1
+            self.pending_keys.discard(key)
+
+    def run(self, fn, *args, key=None, timeout=None):
+        """
+        在进程池中执行fn(*args)并等待结果
+        key用于限制同一个房间的同类任务同时只有一个；超时抛出ComputeTimeout，任务过多抛出ComputeBusy，
+        任务出错或进程池故障抛出ComputeFailed
+        """
+        if timeout is None:
+            timeout = self.default_timeout
+
+        with self.track(fn):
+            self.acquire(key)
+            try:
+                return self.execute(fn, args, timeout)
+            except ComputeError:
+                raise
+            except Exception as e:
+                logger.exception("计算任务%s出错", fn.__name__)
+                raise ComputeFailed(f"计算任务出错: {e}") from e
+            finally:
+                self.release(key)
+
+    def execute(self, fn, args, timeout):
+        try:
+            future = self.get_pool().submit(fn, *args)
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise ComputeTimeout(f"计算超时（{timeout}秒）")
+        except BrokenProcessPool:
+            # 子进程异常退出，之后的任务使用新的进程池
+            self.reset_pool()
+            raise
+
+    @staticmethod
+    @contextmanager
+    def track(fn):
+        """统计任务的耗时和结果"""
+        task = fn.__name__
+        start = time.perf_counter()
+        try:
+            yield
+        except ComputeBusy:
+            COMPUTE_TASKS.inc(task=task, outcome='busy')
+            raise
+        except ComputeTimeout:
+            COMPUTE_TASKS.inc(task=task, outcome='timeout')
+            raise
+        except Exception:
+            COMPUTE_TASKS.inc(task=task, outcome='error')
+            raise
+        COMPUTE_SECONDS.observe(time.perf_counter() - start, task=task)
+        COMPUTE_TASKS.inc(task=task, outcome='ok')
+
+    def get_stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending
+        }
+
+    def shutdown(self):
+        """
+        进程退出前关闭进程池并等待管理线程结束
+        eventlet环境下管理线程是绿色线程，留到解释器退出时再回收会一直等待
+        """
+        self.reset_pool(wait=True)
+
+
+class InlineExecutor(ComputeExecutor):
+    """不使用进程池，直接在当前线程执行（SQUARE_COMPUTE_WORKERS=0时使用）"""
+
+    def execute(self, fn, args, timeout):
+        return fn(*args)
+
+
+def create_executor():
+    """根据环境变量创建执行器"""
+    workers = int(os.environ.get('SQUARE_COMPUTE_WORKERS', os.cpu_count() or 1))
+    max_pending = int(os.environ.get('SQUARE_COMPUTE_MAX_PENDING', 32))
+    timeout = float(os.environ.get('SQUARE_COMPUTE_TIMEOUT', 5.0))
+    if workers <= 0:
+        return InlineExecutor(1, max_pending, timeout)
+    return ComputeExecutor(workers, max_pending, timeout)
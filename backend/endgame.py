@@ -0,0 +1,191 @@
+# 2人游戏的残局精确求解
+# 双方剩余的合法放置很少时，用negamax（带alpha-beta剪枝）搜索到游戏结束，得到完美对局下的结果
+# 局面的值为对手剩余格数减去行动方剩余格数（与Game.determine_winner的判定一致，正数为行动方获胜），
+# 按差值而不是只按胜负搜索，求出的走法在必胜时赢得最多、必败时输得最少
+# 无法行动的玩家会被跳过，同一玩家可能连续行动，因此只在行动方改变时取反
+# 搜索结果（值、边界类型、最佳走法）按Zobrist哈希存入置换表，电脑玩家、提示和赛后分析都可以复用
+
+import os
+import time
+from collections import namedtuple
+from pieces import PIECES
+from transposition import TRANSPOSITION_CACHE
+
+# 双方合法放置数之和不超过该值时启用精确求解
+ENDGAME_MOVE_THRESHOLD = int(os.environ.get('SQUARE_ENDGAME_MOVES', 24))
+# 每次求解最多搜索的节点数，超出时放弃（不返回未证明的结果）
+ENDGAME_MAX_NODES = int(os.environ.get('SQUARE_ENDGAME_NODES', 20000))
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# move为行动方的最佳走法，score为完美对局下行动方领先的格数，winner为最终获胜者（player_num或"tie"）
+EndgameResult = namedtuple('EndgameResult', ['move', 'score', 'winner', 'player_num', 'nodes'])
+
+
+class EndgameAborted(Exception):
+    """超出节点数或时间限制"""
+    pass
+
+
+def count_legal_moves(game):
+    """双方合法放置数之和，游戏结束时为0"""
+    if game.game_over:
+        return 0
+    return sum(
+        len(game.get_legal_moves(player_num))
+        for player_num in game.players if player_num not in game.blocked_players
+    )
+
+
+def is_endgame(game, threshold=None):
+    """是否可以使用精确求解：2人游戏、未结束，且双方合法放置数之和不超过阈值"""
+    if threshold is None:
+        threshold = ENDGAME_MOVE_THRESHOLD
+    if game.max_players != 2 or game.game_over or threshold <= 0:
+        return False
+    return count_legal_moves(game) <= threshold
+
+
+def get_margin(game, player_num):
+    """player_num领先的格数：对手剩余格数减去自己的剩余格数"""
+    own = game.players[player_num].remaining_squares()
+    other = sum(
+        player.remaining_squares() for other_num, player in game.players.items() if other_num != player_num
+    )
+    return other - own
+
+
+def order_moves(moves, best_move=None):
+    """大方块优先（剩余格数减少得最多），置换表中记录的最佳走法排在最前"""
+    ordered = sorted(moves, key=lambda move: PIECES[move[0]]['size'], reverse=True)
+    if best_move is not None and best_move in moves:
+        ordered.remove(best_move)
+        ordered.insert(0, best_move)
+    return ordered
+
+
+class EndgameSolver:
+    __slots__ = ('max_nodes', 'deadline', 'nodes')
+
+    def __init__(self, max_nodes=None, time_budget=None):
+        self.max_nodes = ENDGAME_MAX_NODES if max_nodes is None else max_nodes
+        self.deadline = None if time_budget is None else time.monotonic() + time_budget
+        self.nodes = 0
+
+    def check_limits(self):
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise EndgameAborted()
+        # 每256个节点检查一次时间
+        if self.deadline is not None and not self.nodes & 0xFF and time.monotonic() >= self.deadline:
+            raise EndgameAborted()
+
+    def negamax(self, game, alpha, beta):
+        """返回(行动方的值, 最佳走法)"""
+        self.check_limits()
+        player_num = game.current_player
+        if game.game_over:
+            return get_margin(game, player_num), None
+
+        key = ('endgame', game.zobrist_hash)
+        entry = TRANSPOSITION_CACHE.get(key)
+        best_move = None
+        if entry is not None:
+            value, bound, best_move = entry
+            if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                return value, best_move
+
+        moves = game.get_legal_moves(player_num)
+        if not moves:
+            return get_margin(game, player_num), None
+
+        original_alpha = alpha
+        best_value = -float('inf')
+        for move in order_moves(moves, best_move):
+            child = game.copy()
+            child.play_move(player_num, move)
+            if child.current_player == player_num:
+                # 对手无法行动，继续由自己行动（游戏结束时同样从自己的角度计分）
+                value, _ = self.negamax(child, alpha, beta)
+            else:
+                value, _ = self.negamax(child, -beta, -alpha)
+                value = -value
+            if value > best_value:
+                best_value, best_move = value, move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= original_alpha:
+            bound = UPPER
+        elif best_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        TRANSPOSITION_CACHE.put(key, (best_value, bound, best_move))
+        return best_value, best_move
+
+    def solve(self, game):
+        """
+        求解当前局面，返回EndgameResult；游戏已结束、不是2人游戏或超出限制时返回None
+        """
+        self.nodes = 0
+        if game.game_over or game.max_players != 2:
+            return None
+        player_num = game.current_player
+        try:
+            score, move = self.negamax(game, -float('inf'), float('inf'))
+        except EndgameAborted:
+            return None
+        if score == 0:
+            winner = 'tie'
+        elif score > 0:
+            winner = player_num
+        else:
+            winner = next(other for other in game.players if other != player_num)
+        return EndgameResult(move, score, winner, player_num, self.nodes)
+
+
+def solve_endgame(game, threshold=None, max_nodes=None, time_budget=None):
+    """局面满足is_endgame时精确求解，否则或求解失败时返回None"""
+    if not is_endgame(game, threshold):
+        return None
+    return EndgameSolver(max_nodes, time_budget).solve(game)
+
+
+def analyze_endgame(game, moves, threshold=None, max_nodes=None):
+    """
+    赛后分析：从局面game开始依次执行moves中的(player_num, piece_id, 朝向编号, x, y)，
+    对每个满足is_endgame的局面求解，比较实际走法与完美走法的结果
+    返回列表，每项为该步的序号、行动玩家、实际走法、最佳走法、最佳结果和实际走法的结果（行动方领先的格数），
+    loss为实际走法比最佳走法少领先的格数；求解失败的局面不包含在结果中
+    """
+    game = game.copy()
+    analysis = []
+    for index, (player_num, *move) in enumerate(moves):
+        move = tuple(move)
+        if player_num == game.current_player and is_endgame(game, threshold):
+            best = EndgameSolver(max_nodes).solve(game)
+            child = game.copy()
+            child.play_move(player_num, move)
+            if child.game_over:
+                played = EndgameResult(None, get_margin(child, player_num), None, player_num, 0)
+            else:
+                played = EndgameSolver(max_nodes).solve(child)
+                if played is not None and played.player_num != player_num:
+                    played = played._replace(score=-played.score)
+            if best is not None and played is not None:
+                analysis.append({
+                    'move': index + 1,
+                    'player_num': player_num,
+                    'played': list(move),
+                    'best': list(best.move),
+                    'best_score': best.score,
+                    'played_score': played.score,
+                    'loss': best.score - played.score,
+                    'winner': best.winner
+                })
+        result = game.play_move(player_num, move)
+        if not result['success']:
+            raise ValueError(f"第{index + 1}步无法执行: {result['message']}")
+    return analysis
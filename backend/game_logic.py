@@ -1,89 +1,209 @@
-from pieces import PIECES, get_transformed_piece, get_player_pieces
+from pieces import PIECES, PIECE_IDS, PIECE_INDEX, ORIENTATIONS, get_orientation
+from bitboard import BitBoard, cell_index, cell_position, iter_bits
+from functools import lru_cache
+from types import MappingProxyType
+import wire
+import zobrist
+import uuid
+from ai import Bot
+from move_log import MoveLog
+from movegen import create_move_generator
+from transposition import TRANSPOSITION_CACHE
+from metrics import ENGINE_SECONDS
 import copy
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ALL_PIECES_MASK = (1 << len(PIECE_IDS)) - 1
+PIECE_SIZES = tuple(PIECES[piece_id]['size'] for piece_id in PIECE_IDS)
+MOVE_RECORD = wire.MOVE_RECORD  # 方块编号、变换（旋转和翻转）、x、y，与二进制编码格式相同
+# 走法生成引擎，启动时由SQUARE_MOVEGEN选择（见movegen.py）
+MOVE_GENERATOR = create_move_generator()
+
+
+@lru_cache(maxsize=None)
+def get_start_corners(board_size, max_players):
+    """获取每个玩家的起始角落（所有同类对局共享同一个只读字典）"""
+    last = board_size - 1
+    if max_players == 2:
+        # 2人游戏：玩家1从左上角，玩家2从右下角
+        return MappingProxyType({1: (0, 0), 2: (last, last)})
+    # 4人游戏：玩家分别从四个角开始
+    return MappingProxyType({
+        1: (0, 0),  # 左上角
+        2: (last, 0),  # 右上角
+        3: (last, last),  # 右下角
+        4: (0, last)   # 左下角
+    })
+
+
+class PlayerState:
+    """
+    玩家在对局中的状态：剩余方块为位掩码（第i位对应PIECE_IDS[i]），已放置的方块为定长记录
+    仍然可以按player_data['pieces']的方式读取，'pieces'和'placed_pieces'是按需生成的列表
+    """
+    __slots__ = ('id', 'remaining', 'moves', 'first_move')
+    
+    KEYS = ('id', 'pieces', 'placed_pieces', 'score', 'first_move')
+    
+    def __init__(self, player_id, remaining=ALL_PIECES_MASK, moves=b'', first_move=True):
+        self.id = player_id
+        self.remaining = remaining
+        self.moves = bytearray(moves)  # MOVE_RECORD依次排列
+        self.first_move = first_move
+    
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in ('id', 'first_move'):
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def copy(self):
+        return PlayerState(self.id, self.remaining, self.moves, self.first_move)
+    
+    @property
+    def pieces(self):
+        """剩余方块的列表，顺序与PIECE_IDS相同"""
+        return [PIECE_IDS[index] for index in iter_bits(self.remaining)]
+    
+    @property
+    def placed_pieces(self):
+        return [decode_placed_piece(record) for record in MOVE_RECORD.iter_unpack(self.moves)]
+    
+    @property
+    def score(self):
+        return len(self.moves) // MOVE_RECORD.size
+    
+    def has_piece(self, piece_id):
+        index = PIECE_INDEX.get(piece_id)
+        return index is not None and bool(self.remaining >> index & 1)
+    
+    def remaining_squares(self):
+        """剩余方块的总格数"""
+        return sum(PIECE_SIZES[index] for index in iter_bits(self.remaining))
+    
+    def place(self, piece_id, rotation, flip, board_x, board_y):
+        """记录一次放置，返回放置记录"""
+        record = (PIECE_INDEX[piece_id], wire.encode_transform(rotation, flip), board_x, board_y)
+        self.remaining &= ~(1 << record[0])
+        self.moves += MOVE_RECORD.pack(*record)
+        self.first_move = False
+        return decode_placed_piece(record)
+
+
+@lru_cache(maxsize=None)
+def decode_transform_record(piece_index, transform):
+    """(方块编号, 变换) -> (piece_id, rotation, flip, 朝向坐标)"""
+    piece_id = PIECE_IDS[piece_index]
+    rotation, flip = wire.decode_transform(transform)
+    return piece_id, rotation, flip, get_orientation(piece_id, rotation, flip).coords
+
+
+def decode_placed_piece(record):
+    """定长记录转换为放置记录字典"""
+    piece_index, transform, board_x, board_y = record
+    piece_id, rotation, flip, coords = decode_transform_record(piece_index, transform)
+    return {
+        'piece_id': piece_id,
+        'position': (board_x, board_y),
+        'rotation': rotation,
+        'flip': flip,
+        'coords': list(coords)
+    }
+
 
 class Game:
+    __slots__ = (
+        'max_players', 'board_size', 'players', 'current_player', 'turn', 'last_move', 'game_over',
+        'winner', 'start_corners', 'bitboard', 'mobility_witness', 'blocked_players', 'zobrist_hash'
+    )
+    
     def __init__(self, max_players=2):
         self.max_players = max_players
         self.board_size = 20 if max_players == 4 else 14
-        self.board = [[0 for _ in range(self.board_size)] for _ in range(self.board_size)]
-        self.players = {}
+        self.players = {}  # player_num -> PlayerState
         self.current_player = 1
+        self.turn = 0  # 已完成的放置次数，同时作为状态版本号
+        self.last_move = None  # 最近一次放置(player_num, 放置记录)，用于生成增量更新
         self.game_over = False
         self.winner = None
+        self.start_corners = self.get_start_corners()
+        self.bitboard = BitBoard(self.board_size, max_players, self.start_corners)
+        # 行动能力缓存：每个玩家记住一个已知的合法放置(piece_id, 掩码)，
+        # 只有当它被新放置的方块影响时才重新搜索；无法行动的玩家永远无法再行动
+        self.mobility_witness = {}
+        self.blocked_players = set()
+        # 局面的Zobrist哈希（棋盘 + 剩余方块 + 当前行动玩家），每次放置时增量更新
+        self.zobrist_hash = zobrist.BOARD_KEYS[self.board_size] ^ zobrist.hash_side(self.current_player)
+        
+    @property
+    def board(self):
+        """列表嵌套列表形式的棋盘，仅用于输出"""
+        return self.bitboard.to_matrix()
+    
+    def get_start_corners(self):
+        """获取每个玩家的起始角落"""
+        return get_start_corners(self.board_size, self.max_players)
         
     def add_player(self, player_id, player_num):
         """添加玩家"""
-        self.players[player_num] = {
-            'id': player_id,
-            'pieces': get_player_pieces().copy(),
-            'placed_pieces': [],
-            'score': 0,
-            'first_move': True
-        }
+        if player_num in self.players:
+            for piece_id in self.players[player_num].pieces:
+                self.zobrist_hash ^= zobrist.hash_piece(player_num, piece_id)
+        self.players[player_num] = PlayerState(player_id)
+        for piece_id in PIECE_IDS:
+            self.zobrist_hash ^= zobrist.hash_piece(player_num, piece_id)
     
     def is_valid_position(self, piece_coords, board_x, board_y, player_num):
         """检查方块是否可以放置在指定位置"""
-        placed_positions = []
+        mask = self.bitboard.piece_mask(piece_coords, board_x, board_y)
+        if mask is None:
+            return False, "超出棋盘边界"
+        return self.is_valid_mask(mask, player_num)
+    
+    def get_placement_mask(self, orientation, board_x, board_y):
+        """计算朝向放在指定位置时的掩码，超出棋盘时返回None"""
+        if board_x < 0 or board_y < 0:
+            return None
+        if board_x + orientation.width > self.board_size or board_y + orientation.height > self.board_size:
+            return None
+        return orientation.mask << cell_index(board_x, board_y)
+    
+    def is_valid_mask(self, mask, player_num):
+        """检查已平移到棋盘位置的方块掩码是否可以放置"""
+        bitboard = self.bitboard
         
-        # 检查每个方块格子是否在棋盘内且为空
-        for dx, dy in piece_coords:
-            x, y = board_x + dx, board_y + dy
-            if x < 0 or x >= self.board_size or y < 0 or y >= self.board_size:
-                return False, "超出棋盘边界"
-            if self.board[y][x] != 0:
-                return False, "位置已被占用"
-            placed_positions.append((x, y))
+        # 检查每个方块格子是否为空
+        if mask & bitboard.occupied:
+            return False, "位置已被占用"
         
         # 检查边对边接触（不允许）
-        for x, y in placed_positions:
-            # 检查四个相邻位置
-            for nx, ny in [(x-1, y), (x+1, y), (x, y-1), (x, y+1)]:
-                if 0 <= nx < self.board_size and 0 <= ny < self.board_size:
-                    if self.board[ny][nx] == player_num:
-                        return False, "不能与自己的方块边对边接触"
+        if mask & bitboard.forbidden[player_num]:
+            return False, "不能与自己的方块边对边接触"
         
         # 对于第一次放置的特殊规则
-        if self.players[player_num]['first_move']:
-            # 根据玩家数量和玩家编号确定起始位置
-            if self.max_players == 2:
-                # 2人游戏：玩家1从左上角，玩家2从右下角
-                if player_num == 1:
-                    if (0, 0) not in placed_positions:
+        if self.players[player_num].first_move:
+            required_corner = self.start_corners.get(player_num)
+            if required_corner and not mask & (1 << cell_index(*required_corner)):
+                if self.max_players == 2:
+                    if player_num == 1:
                         return False, "第一个方块必须包含左上角位置(0,0)"
-                elif player_num == 2:
-                    if (self.board_size-1, self.board_size-1) not in placed_positions:
-                        return False, "第一个方块必须包含右下角位置"
-            else:
-                # 4人游戏：玩家分别从四个角开始
-                corner_positions = {
-                    1: (0, 0),  # 左上角
-                    2: (self.board_size-1, 0),  # 右上角
-                    3: (self.board_size-1, self.board_size-1),  # 右下角
-                    4: (0, self.board_size-1)   # 左下角
-                }
-                required_corner = corner_positions.get(player_num)
-                if required_corner and required_corner not in placed_positions:
-                    return False, f"第一个方块必须包含角落位置{required_corner}"
-        else:
+                    return False, "第一个方块必须包含右下角位置"
+                return False, f"第一个方块必须包含角落位置{required_corner}"
+        elif not mask & bitboard.corners[player_num]:
             # 非第一次放置：必须与自己的方块角对角接触
-            corner_touch = False
-            for x, y in placed_positions:
-                # 检查四个对角位置
-                for nx, ny in [(x-1, y-1), (x-1, y+1), (x+1, y-1), (x+1, y+1)]:
-                    if 0 <= nx < self.board_size and 0 <= ny < self.board_size:
-                        if self.board[ny][nx] == player_num:
-                            corner_touch = True
-                            break
-                if corner_touch:
-                    break
-            
-            if not corner_touch:
-                return False, "必须与自己的方块角对角接触"
+            return False, "必须与自己的方块角对角接触"
         
         return True, "可以放置"
     
-    def place_piece(self, player_num, piece_id, board_x, board_y, rotation=0, flip=False):
-        """在棋盘上放置方块"""
+    def place_piece(self, player_num, piece_id, board_x, board_y, rotation=0, flip=False, check_game_over=True):
+        """在棋盘上放置方块，check_game_over为False时由调用方检查游戏是否结束（见GameRoom.place_piece）"""
         if self.game_over:
             return {"success": False, "message": "游戏已结束"}
         
@@ -93,72 +213,177 @@ class Game:
         if player_num not in self.players:
             return {"success": False, "message": "玩家不存在"}
         
-        if piece_id not in self.players[player_num]['pieces']:
+        if not self.players[player_num].has_piece(piece_id):
             return {"success": False, "message": "方块已使用或不存在"}
         
-        # 获取变换后的方块坐标
-        piece_coords = get_transformed_piece(piece_id, rotation, flip)
-        if piece_coords is None:
+        # 获取变换后的方块朝向
+        orientation = get_orientation(piece_id, rotation, flip)
+        if orientation is None:
             return {"success": False, "message": "无效的方块"}
         
         # 检查是否可以放置
-        valid, message = self.is_valid_position(piece_coords, board_x, board_y, player_num)
+        mask = self.get_placement_mask(orientation, board_x, board_y)
+        if mask is None:
+            return {"success": False, "message": "超出棋盘边界"}
+        valid, message = self.is_valid_mask(mask, player_num)
         if not valid:
             return {"success": False, "message": message}
         
         # 放置方块
-        for dx, dy in piece_coords:
-            x, y = board_x + dx, board_y + dy
-            self.board[y][x] = player_num
+        self.bitboard.place(mask, player_num)
+        self.zobrist_hash ^= zobrist.hash_cells(mask, player_num) ^ zobrist.hash_piece(player_num, piece_id)
         
         # 更新玩家状态
-        self.players[player_num]['pieces'].remove(piece_id)
-        self.players[player_num]['placed_pieces'].append({
-            'piece_id': piece_id,
-            'position': (board_x, board_y),
-            'rotation': rotation,
-            'flip': flip,
-            'coords': piece_coords
-        })
-        self.players[player_num]['first_move'] = False
+        placed_piece = self.players[player_num].place(piece_id, rotation, flip, board_x, board_y)
+        self.last_move = (player_num, placed_piece)
+        self.turn += 1
         
         # 切换到下一个玩家
         self.switch_player()
         
         # 检查游戏是否结束
-        self.check_game_over()
+        if check_game_over:
+            self.check_game_over()
         
         return {"success": True, "message": "方块放置成功"}
     
+    def play_move(self, player_num, move):
+        """执行由走法生成器返回的(piece_id, 朝向编号, x, y)"""
+        piece_id, orientation_index, board_x, board_y = move
+        orientation = ORIENTATIONS[piece_id][orientation_index]
+        return self.place_piece(player_num, piece_id, board_x, board_y, orientation.rotation, orientation.flip)
+    
+    def copy(self):
+        """复制游戏局面，用于搜索"""
+        clone = Game.__new__(Game)
+        for name in Game.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.bitboard = self.bitboard.copy()
+        clone.players = {player_num: player.copy() for player_num, player in self.players.items()}
+        clone.mobility_witness = dict(self.mobility_witness)
+        clone.blocked_players = set(self.blocked_players)
+        return clone
+    
+    def to_compact(self):
+        """
+        将局面序列化为只包含整数和字符串的紧凑元组，可以跨进程传递或持久化
+        (max_players, current_player, turn, game_over, winner, 无法行动的玩家, 每个玩家的占用掩码,
+         每个玩家的(player_num, id, 剩余方块掩码, first_move, 放置记录))
+        """
+        players = [
+            (player_num, player.id, player.remaining, player.first_move, tuple(MOVE_RECORD.iter_unpack(player.moves)))
+            for player_num, player in self.players.items()
+        ]
+        
+        return (
+            self.max_players, self.current_player, self.turn, self.game_over,
+            wire.encode_winner(self.winner), tuple(sorted(self.blocked_players)),
+            tuple(sorted(self.bitboard.occupancy.items())), tuple(players)
+        )
+    
+    @classmethod
+    def from_compact(cls, data):
+        """从to_compact的结果重建局面"""
+        (max_players, current_player, turn, game_over, winner,
+         blocked_players, occupancy, players) = data
+        game = cls(max_players)
+        for player_num, player_id, remaining, first_move, moves in players:
+            game.players[player_num] = PlayerState(
+                player_id, remaining, b''.join(MOVE_RECORD.pack(*move) for move in moves), first_move
+            )
+        
+        game.bitboard = BitBoard.from_occupancy(game.board_size, max_players, dict(occupancy), game.start_corners)
+        game.current_player = current_player
+        game.turn = turn
+        game.game_over = game_over
+        game.winner = wire.decode_winner(winner)
+        game.blocked_players = set(blocked_players)
+        game.zobrist_hash = zobrist.compute_hash(game)
+        return game
+    
     def switch_player(self):
         """切换当前玩家"""
         # 循环到下一个玩家
         current_index = self.current_player - 1
         next_index = (current_index + 1) % self.max_players
+        self.zobrist_hash ^= zobrist.hash_side(self.current_player) ^ zobrist.hash_side(next_index + 1)
         self.current_player = next_index + 1
     
+    def get_move_context(self, player_num):
+        """获取玩家的锚点格子列表和不可覆盖的格子掩码"""
+        bitboard = self.bitboard
+        anchor_cells = [cell_position(index) for index in iter_bits(bitboard.anchors[player_num])]
+        blocked = bitboard.occupied | bitboard.forbidden[player_num]
+        return anchor_cells, blocked
+    
+    def iter_orientation_moves(self, orientation, anchor_cells, blocked):
+        """枚举覆盖锚点的朝向放置位置，返回合法的原点(x, y)"""
+        size_x = self.board_size - orientation.width
+        size_y = self.board_size - orientation.height
+        tried = set()
+        for anchor_x, anchor_y in anchor_cells:
+            for dx, dy in orientation.coords:
+                board_x, board_y = anchor_x - dx, anchor_y - dy
+                if board_x < 0 or board_y < 0 or board_x > size_x or board_y > size_y:
+                    continue
+                if (board_x, board_y) in tried:
+                    continue
+                tried.add((board_x, board_y))
+                if not (orientation.mask << cell_index(board_x, board_y)) & blocked:
+                    yield board_x, board_y
+    
+    def iter_legal_moves(self, player_num, piece_ids=None):
+        """
+        枚举玩家的所有合法放置，返回(piece_id, 朝向编号, x, y)
+        按方块、朝向的顺序枚举，同一朝向内原点的顺序取决于走法生成引擎
+        """
+        if player_num not in self.players:
+            return
+        
+        if piece_ids is None:
+            piece_ids = self.players[player_num].pieces
+        yield from MOVE_GENERATOR.iter_moves(self, player_num, piece_ids)
+    
+    def get_legal_moves(self, player_num):
+        """获取玩家所有合法放置的列表[(piece_id, 朝向编号, x, y)]，按局面缓存在置换表中"""
+        key = ('legal_moves', self.zobrist_hash, player_num)
+        legal_moves = TRANSPOSITION_CACHE.get(key)
+        if legal_moves is None:
+            legal_moves = tuple(self.iter_legal_moves(player_num))
+            TRANSPOSITION_CACHE.put(key, legal_moves)
+        return list(legal_moves)
+    
     def can_player_place_any_piece(self, player_num):
         """检查玩家是否还能放置任何方块"""
-        if player_num not in self.players:
+        if player_num not in self.players or player_num in self.blocked_players:
             return False
         
-        remaining_pieces = self.players[player_num]['pieces']
-        
-        for piece_id in remaining_pieces:
-            # 尝试所有可能的变换
-            for rotation in [0, 90, 180, 270]:
-                for flip in [False, True]:
-                    piece_coords = get_transformed_piece(piece_id, rotation, flip)
-                    if piece_coords is None:
-                        continue
-                    
-                    # 尝试棋盘上的每个位置
-                    for board_x in range(self.board_size):
-                        for board_y in range(self.board_size):
-                            valid, _ = self.is_valid_position(piece_coords, board_x, board_y, player_num)
-                            if valid:
-                                return True
-        
+        # 已知的合法放置仍然有效：方块未使用，且没有格子被占用或与自己边相邻
+        witness = self.mobility_witness.get(player_num)
+        if witness is not None:
+            piece_id, mask = witness
+            bitboard = self.bitboard
+            if self.players[player_num].has_piece(piece_id) and \
+                    not mask & (bitboard.occupied | bitboard.forbidden[player_num]):
+                return True
+        
+        # 同一局面已经判断过时直接使用置换表中的结论，否则从锚点搜索一个合法放置
+        key = ('mobility', self.zobrist_hash, player_num)
+        witness = TRANSPOSITION_CACHE.get(key)
+        if witness is None:
+            witness = False
+            for piece_id, orientation_index, board_x, board_y in self.iter_legal_moves(player_num):
+                mask = ORIENTATIONS[piece_id][orientation_index].mask << cell_index(board_x, board_y)
+                witness = (piece_id, mask)
+                break
+            TRANSPOSITION_CACHE.put(key, witness)
+        if witness:
+            self.mobility_witness[player_num] = witness
+            return True
+        
+        # 棋盘只会越来越满，无法行动的玩家之后也不可能再行动
+        self.mobility_witness.pop(player_num, None)
+        self.blocked_players.add(player_num)
         return False
     
     def check_game_over(self):
@@ -198,9 +423,8 @@ class Game:
         """确定获胜者"""
         # 计算每个玩家剩余的方块数
         player_scores = {}
-        for player_num, player_data in self.players.items():
-            remaining = sum(PIECES[piece_id]['size'] for piece_id in player_data['pieces'])
-            player_scores[player_num] = remaining
+        for player_num, player in self.players.items():
+            player_scores[player_num] = player.remaining_squares()
         
         # 找出剩余方块数最少的玩家
         min_remaining = min(player_scores.values())
@@ -211,31 +435,68 @@ class Game:
         else:
             self.winner = "tie"
     
+    @ENGINE_SECONDS.timed(function='get_valid_positions')
     def get_valid_positions(self, player_num, piece_id, rotation=0, flip=False):
         """获取方块的所有有效放置位置"""
-        print(f"Game.get_valid_positions: player_num={player_num}, piece_id={piece_id}, rotation={rotation}, flip={flip}")
+        logger.debug("Game.get_valid_positions: player_num=%s, piece_id=%s, rotation=%s, flip=%s",
+                     player_num, piece_id, rotation, flip)
         valid_positions = []
         
-        piece_coords = get_transformed_piece(piece_id, rotation, flip)
-        print(f"变换后的方块坐标: {piece_coords}")
-        if piece_coords is None:
-            print("方块坐标为None，返回空列表")
+        orientation = get_orientation(piece_id, rotation, flip)
+        if orientation is None:
+            logger.debug("方块朝向为None，返回空列表")
             return valid_positions
         
-        print(f"检查棋盘大小: {self.board_size}x{self.board_size}")
-        print(f"玩家{player_num}的first_move状态: {self.players.get(player_num, {}).get('first_move', 'Unknown')}")
-        
-        for board_x in range(self.board_size):
-            for board_y in range(self.board_size):
-                valid, message = self.is_valid_position(piece_coords, board_x, board_y, player_num)
-                if valid:
-                    valid_positions.append((board_x, board_y))
-                elif board_x == 0 and board_y == 0:  # 只为(0,0)位置打印调试信息
-                    print(f"位置(0,0)无效: {message}")
+        if player_num in self.players:
+            valid_positions = sorted(MOVE_GENERATOR.iter_origins(self, player_num, orientation))
         
-        print(f"找到{len(valid_positions)}个有效位置: {valid_positions[:10]}...")  # 只显示前10个
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("找到%d个有效位置: %s...", len(valid_positions), valid_positions[:10])  # 只显示前10个
         return valid_positions
     
+    @ENGINE_SECONDS.timed(function='get_all_valid_positions')
+    def get_all_valid_positions(self, player_num, legal_moves=None):
+        """
+        一次计算玩家所有剩余方块、所有朝向的有效位置
+        返回 {piece_id: [朝向0的位置, 朝向1的位置, ...]}，位置为扁平列表[x0, y0, x1, y1, ...]
+        """
+        result = {}
+        if player_num not in self.players:
+            return result
+        
+        for piece_id in self.players[player_num].pieces:
+            result[piece_id] = [[] for _ in ORIENTATIONS[piece_id]]
+        
+        if legal_moves is None:
+            legal_moves = self.iter_legal_moves(player_num)
+        for piece_id, orientation_index, board_x, board_y in legal_moves:
+            result[piece_id][orientation_index].extend((board_x, board_y))
+        return result
+    
+    @ENGINE_SECONDS.timed(function='get_legal_move_bitmaps')
+    def get_legal_move_bitmaps(self, player_num, legal_moves=None):
+        """
+        以位图形式返回玩家的所有有效位置
+        返回 {piece_id: [朝向0的位图, ...]}，位图为十六进制字符串，
+        第 y * board_size + x 位表示原点(x, y)是否有效，没有有效位置时为空字符串
+        """
+        bitmaps = {}
+        if player_num not in self.players:
+            return bitmaps
+        
+        for piece_id in self.players[player_num].pieces:
+            bitmaps[piece_id] = [0] * len(ORIENTATIONS[piece_id])
+        
+        if legal_moves is None:
+            legal_moves = self.iter_legal_moves(player_num)
+        for piece_id, orientation_index, board_x, board_y in legal_moves:
+            bitmaps[piece_id][orientation_index] |= 1 << (board_y * self.board_size + board_x)
+        
+        return {
+            piece_id: [format(bitmap, 'x') if bitmap else '' for bitmap in orientation_bitmaps]
+            for piece_id, orientation_bitmaps in bitmaps.items()
+        }
+    
     def get_game_state(self):
         """获取当前游戏状态"""
         return {
@@ -243,28 +504,57 @@ class Game:
             'board_size': self.board_size,
             'max_players': self.max_players,
             'current_player': self.current_player,
+            'turn': self.turn,
             'players': {
                 str(player_num): {
-                    'pieces': player_data['pieces'],
-                    'placed_pieces': player_data['placed_pieces'],
-                    'score': len(player_data['placed_pieces'])
+                    'pieces': player.pieces,
+                    'placed_pieces': player.placed_pieces,
+                    'score': player.score
                 }
-                for player_num, player_data in self.players.items()
+                for player_num, player in self.players.items()
             },
             'game_over': self.game_over,
             'winner': self.winner
         }
     
+    def get_game_delta(self):
+        """
+        获取最近一次放置带来的增量更新
+        只包含新占用的格子和变化的方块列表，客户端在turn - 1版本的状态上应用
+        """
+        if self.last_move is None:
+            return None
+        
+        player_num, placed_piece = self.last_move
+        board_x, board_y = placed_piece['position']
+        cells = []
+        for dx, dy in placed_piece['coords']:
+            cells.extend((board_x + dx, board_y + dy))
+        
+        return {
+            'turn': self.turn,
+            'player': str(player_num),
+            'cells': cells,
+            'placed_piece': placed_piece,
+            'current_player': self.current_player,
+            'game_over': self.game_over,
+            'winner': self.winner
+        }
+    
     def get_scores(self):
         """获取玩家分数（剩余方块数）"""
         scores = {}
-        for player_num, player_data in self.players.items():
-            remaining_pieces = sum(PIECES[piece_id]['size'] for piece_id in player_data['pieces'])
-            scores[str(player_num)] = remaining_pieces
+        for player_num, player in self.players.items():
+            scores[str(player_num)] = player.remaining_squares()
         return scores
 
 
 class GameRoom:
+    __slots__ = (
+        'room_id', 'max_players', 'players', 'game', 'status', 'current_player', 'bots', 'move_log', 'turn_cache',
+        'last_activity', 'spectators', 'move_times'
+    )
+    
     def __init__(self, room_id, max_players=2):
         self.room_id = room_id
         self.max_players = max_players
@@ -272,24 +562,128 @@ class GameRoom:
         self.game = None
         self.status = "waiting"  # waiting, playing, finished
         self.current_player = None
+        self.bots = {}  # player_num -> Bot
+        self.move_log = None  # 本局的走法日志，游戏开始时创建
+        # 有效位置等计算结果的缓存，只在同一回合内有效：(turn, kind, player_num) -> 结果
+        self.turn_cache = {}
+        self.last_activity = time.time()  # 最后一次有玩家加入、离开或放置的时间，用于回收空闲房间
+        self.spectators = {}  # socket_id -> 观战者信息，不占用玩家位置，数量不限
+        self.move_times = []  # 每步放置的时间，与走法日志一一对应，用于延迟观战
+    
+    def touch(self):
+        self.last_activity = time.time()
         
+    def to_snapshot(self):
+        """将房间序列化为可以转换为JSON的字典（不包含缓存）"""
+        return {
+            'room_id': self.room_id,
+            'max_players': self.max_players,
+            'status': self.status,
+            'current_player': self.current_player,
+            'players': list(self.players.values()),
+            'bots': [[player_num, bot.time_budget] for player_num, bot in self.bots.items()],
+            'game': self.game.to_compact() if self.game is not None else None,
+            'moves': self.move_log.to_bytes().hex() if self.move_log is not None else None,
+            'last_activity': self.last_activity,
+            'spectators': list(self.spectators.values()),
+            'move_times': self.move_times
+        }
+    
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """从to_snapshot的结果重建房间"""
+        room = cls(snapshot['room_id'], snapshot['max_players'])
+        room.status = snapshot['status']
+        room.current_player = snapshot['current_player']
+        room.last_activity = snapshot.get('last_activity', room.last_activity)
+        room.spectators = {
+            spectator['socket_id']: dict(spectator) for spectator in snapshot.get('spectators', ())
+        }
+        room.move_times = list(snapshot.get('move_times') or ())
+        room.players = {player_data['socket_id']: dict(player_data) for player_data in snapshot['players']}
+        room.bots = {
+            player_num: Bot(player_num, time_budget=time_budget)
+            for player_num, time_budget in snapshot['bots']
+        }
+        if snapshot['game'] is not None:
+            room.game = Game.from_compact(snapshot['game'])
+            if snapshot.get('moves') is not None:
+                initial_game = Game(room.max_players)
+                for player_num, player_id, *_ in snapshot['game'][-1]:
+                    initial_game.add_player(player_id, player_num)
+                room.move_log = MoveLog(initial_game, bytes.fromhex(snapshot['moves']))
+            else:
+                # 没有走法日志的快照，从当前局面开始记录
+                room.move_log = MoveLog(room.game)
+            # 没有保存放置时间的快照（如休眠存储），之前的走法视为很久以前完成
+            missing = len(room.move_log) - len(room.move_times)
+            if missing > 0:
+                room.move_times[:0] = [0.0] * missing
+        return room
+    
     def add_player(self, socket_id, player_name):
         """添加玩家到房间"""
         if len(self.players) >= self.max_players:
             return None
         
-        player_num = len(self.players) + 1
+        # 使用最小的空闲编号，游戏进行中有玩家离开后，新加入的玩家接替空出的位置
+        taken = {player_data['player_num'] for player_data in self.players.values()}
+        player_num = min(num for num in range(1, self.max_players + 1) if num not in taken)
         self.players[socket_id] = {
             'player_num': player_num,
             'player_name': player_name,
-            'socket_id': socket_id
+            'socket_id': socket_id,
+            'is_bot': False
         }
+        if self.game is not None and player_num in self.game.players:
+            self.game.players[player_num]['id'] = socket_id
+        self.touch()
         return player_num
     
+    def add_bot(self, time_budget=1.0):
+        """添加电脑玩家填补空位，返回(bot_id, player_num)"""
+        bot_id = f"bot-{uuid.uuid4().hex[:8]}"
+        player_num = self.add_player(bot_id, f"电脑{len(self.players) + 1}")
+        if player_num is None:
+            return None, None
+        self.players[bot_id]['is_bot'] = True
+        self.bots[player_num] = Bot(player_num, time_budget=time_budget)
+        return bot_id, player_num
+    
+    def get_current_bot(self):
+        """当前行动的玩家为电脑时返回(bot_id, Bot)，否则返回(None, None)"""
+        if self.game is None or self.game.game_over:
+            return None, None
+        bot = self.bots.get(self.game.current_player)
+        if bot is None:
+            return None, None
+        return self.get_socket_id(bot.player_num), bot
+    
+    def get_human_count(self):
+        """房间内真人玩家的数量"""
+        return sum(1 for player_data in self.players.values() if not player_data['is_bot'])
+    
+    def add_spectator(self, socket_id, name, wire_format='json', delay=0):
+        """添加观战者，delay为观看延迟（秒）"""
+        self.spectators[socket_id] = {
+            'socket_id': socket_id,
+            'name': name,
+            'wire_format': wire_format,
+            'delay': delay
+        }
+    
+    def remove_spectator(self, socket_id):
+        return self.spectators.pop(socket_id, None) is not None
+    
+    def get_live_spectator_formats(self):
+        """没有延迟的观战者使用的编码格式，每种格式对应一个观战组"""
+        return sorted({spectator['wire_format'] for spectator in self.spectators.values() if not spectator['delay']})
+    
     def remove_player(self, socket_id):
         """从房间移除玩家"""
         if socket_id in self.players:
             del self.players[socket_id]
+            self.touch()
     
     def start_game(self):
         """开始游戏"""
@@ -299,11 +693,15 @@ class GameRoom:
                 self.game.add_player(socket_id, player_data['player_num'])
             self.status = "playing"
             self.current_player = 1
+            self.move_log = MoveLog(self.game)
+            self.move_times = []
+            self.touch()
     
     def can_start_game(self):
         """检查是否可以开始游戏"""
         return len(self.players) == self.max_players
     
+    @ENGINE_SECONDS.timed(function='place_piece')
     def place_piece(self, player_id, piece_id, position, rotation=0, flip=False):
         """放置方块"""
         if self.game is None:
@@ -320,9 +718,15 @@ class GameRoom:
             return {"success": False, "message": "玩家不在房间中"}
         
         board_x, board_y = position
-        result = self.game.place_piece(player_num, piece_id, board_x, board_y, rotation, flip)
+        result = self.game.place_piece(player_num, piece_id, board_x, board_y, rotation, flip, check_game_over=False)
         
         if result['success']:
+            # 结束判断在搜索中也会调用，只在请求中单独计时
+            with ENGINE_SECONDS.time(function='check_game_over'):
+                self.game.check_game_over()
+            self.move_log.append(self.game)
+            self.touch()
+            self.move_times.append(self.last_activity)
             self.current_player = self.game.current_player
             if self.game.game_over:
                 self.status = "finished"
@@ -331,26 +735,75 @@ class GameRoom:
     
     def get_valid_positions(self, player_id, piece_id, rotation=0, flip=False):
         """获取有效位置"""
-        print(f"GameRoom.get_valid_positions: player_id={player_id}, piece_id={piece_id}")
-        
         if self.game is None:
-            print("游戏未开始")
+            logger.debug("房间%s的游戏未开始", self.room_id)
             return []
         
         # 找到玩家编号
-        player_num = None
-        print(f"当前房间玩家: {self.players}")
+        if player_id not in self.players:
+            logger.debug("房间%s中未找到玩家 %s", self.room_id, player_id)
+            return []
         
-        if player_id in self.players:
-            player_num = self.players[player_id]['player_num']
-            print(f"找到玩家 {player_id}，player_num: {player_num}")
-        else:
-            print(f"未找到玩家 {player_id}")
+        player_num = self.players[player_id]['player_num']
+        return self.game.get_valid_positions(player_num, piece_id, rotation, flip)
+    
+    def get_cached(self, kind, player_num, compute):
+        """按回合缓存计算结果，有新的放置后旧回合的缓存全部失效"""
+        key = (self.game.turn, kind, player_num)
+        if key not in self.turn_cache:
+            self.turn_cache = {
+                cached_key: value for cached_key, value in self.turn_cache.items()
+                if cached_key[0] == self.game.turn
+            }
+            self.turn_cache[key] = compute()
+        return self.turn_cache[key]
+    
+    def get_legal_moves(self, player_num):
+        """获取玩家本回合的所有合法放置，按回合缓存"""
+        if self.game is None:
             return []
+        return self.get_cached('legal_moves', player_num, lambda: self.game.get_legal_moves(player_num))
+    
+    def get_all_valid_positions(self, player_num):
+        """获取玩家所有方块、所有朝向的有效位置，按回合缓存"""
+        if self.game is None:
+            return None
         
-        result = self.game.get_valid_positions(player_num, piece_id, rotation, flip)
-        print(f"游戏逻辑返回的有效位置: {result}")
-        return result
+        def compute():
+            return {
+                'turn': self.game.turn,
+                'player_num': player_num,
+                'pieces': self.game.get_all_valid_positions(player_num, self.get_legal_moves(player_num))
+            }
+        return self.get_cached('all_valid_positions', player_num, compute)
+    
+    def get_legal_move_bitmaps(self, player_num):
+        """获取玩家所有有效位置的位图，按回合缓存"""
+        if self.game is None:
+            return None
+        
+        def compute():
+            return {
+                'turn': self.game.turn,
+                'player_num': player_num,
+                'board_size': self.game.board_size,
+                'pieces': self.game.get_legal_move_bitmaps(player_num, self.get_legal_moves(player_num))
+            }
+        return self.get_cached('legal_move_bitmaps', player_num, compute)
+    
+    def get_socket_id(self, player_num):
+        """根据玩家编号获取socket_id"""
+        for socket_id, player_data in self.players.items():
+            if player_data['player_num'] == player_num:
+                return socket_id
+        return None
+    
+    def get_player_num(self, socket_id):
+        """根据socket_id获取玩家编号"""
+        player_data = self.players.get(socket_id)
+        if player_data is None:
+            return None
+        return player_data['player_num']
     
     def is_game_over(self):
         """检查游戏是否结束"""
@@ -368,6 +821,45 @@ class GameRoom:
             return self.game.get_scores()
         return {}
     
+    def get_room_info(self):
+        """获取房间信息"""
+        return {
+            'room_id': self.room_id,
+            'players_info': {
+                str(player_data['player_num']): {
+                    'name': player_data['player_name'],
+                    'socket_id': player_data['socket_id']
+                }
+                for player_data in self.players.values()
+            }
+        }
+    
+    @ENGINE_SECONDS.timed(function='get_game_state_binary')
+    def get_game_state_binary(self):
+        """获取二进制编码的游戏状态"""
+        if self.game is None:
+            return None
+        return wire.encode_game_state(self.game, self.get_room_info())
+    
+    @ENGINE_SECONDS.timed(function='get_game_delta_binary')
+    def get_game_delta_binary(self):
+        """获取二进制编码的增量更新"""
+        if self.game is None:
+            return None
+        return wire.encode_game_delta(self.game, {'room_id': self.room_id})
+    
+    @ENGINE_SECONDS.timed(function='get_game_delta')
+    def get_game_delta(self):
+        """获取最近一次放置的增量更新"""
+        if self.game is None:
+            return None
+        
+        delta = self.game.get_game_delta()
+        if delta is not None:
+            delta['room_id'] = self.room_id
+        return delta
+    
+    @ENGINE_SECONDS.timed(function='get_game_state')
     def get_game_state(self):
         """获取游戏状态"""
         if self.game is None:
@@ -375,13 +867,6 @@ class GameRoom:
         
         game_state = self.game.get_game_state()
         # 添加房间信息
-        game_state['room_id'] = self.room_id
-        game_state['players_info'] = {
-            str(player_data['player_num']): {
-                'name': player_data['player_name'],
-                'socket_id': player_data['socket_id']
-            }
-            for player_data in self.players.values()
-        }
+        game_state.update(self.get_room_info())
         
         return game_state 
\ No newline at end of file
@@ -17,7 +17,9 @@ else:
     print("Gunicorn: 证书文件不存在，使用HTTP模式")
 
 # Worker进程
-workers = 1  # 改为1个worker避免会话问题
+# 默认1个worker；多个worker时必须设置SQUARE_ROOM_STORE=redis://...和SOCKETIO_MESSAGE_QUEUE，
+# 并且客户端只使用websocket传输（或在前面使用按连接保持会话的负载均衡）
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
 worker_class = "eventlet"
 worker_connections = 1000
 timeout = 30
@@ -36,6 +38,12 @@ loglevel = "info"
 # 进程名
 proc_name = "square_game_backend"
 
+# worker退出（包括max_requests触发的重启）前把未结束的房间休眠到磁盘，玩家重连时恢复，并关闭计算进程池
+def worker_exit(server, worker):
+    from app import compute_executor, hibernate_all_rooms
+    hibernate_all_rooms()
+    compute_executor.shutdown()
+
 # 用户和组（如果需要）
 # user = "www-data"
 # group = "www-data"
@@ -0,0 +1,285 @@
+# 运行指标
+# 计数器、耗时直方图和仪表盘，通过/api/metrics以Prometheus文本格式输出
+# 指标只在当前进程内统计：多个worker时每个worker分别输出，计算进程池中的耗时不计入
+# SamplingProfiler是可选的采样分析器，按固定间隔记录主线程的调用栈，输出为火焰图使用的折叠栈格式
+
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+
+try:
+    from eventlet import patcher
+    # 采样线程必须是真正的系统线程，才能在事件循环繁忙时继续采样
+    _threading = patcher.original('threading')
+except ImportError:
+    _threading = threading
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # 标签值元组 -> 值
+
+    def label_values(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}的标签应为{self.labelnames}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.render_samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render_samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Metric):
+    """仪表盘，值可以直接设置，也可以在输出时由回调函数计算"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def render_samples(self):
+        if self.callback is not None:
+            try:
+                return [f'{self.name} {_format_value(self.callback())}']
+            except Exception:
+                return []
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """统计with语句块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """装饰器形式的time()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def render_samples(self):
+        with self.lock:
+            items = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self.values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, callback=None):
+    return REGISTRY.register(Gauge(name, documentation, callback=callback))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render():
+    return REGISTRY.render()
+
+
+def get_rss_bytes():
+    """当前进程的常驻内存"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # 没有/proc时使用峰值（Linux上单位为KB，macOS上为字节）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# 请求中调用的引擎函数的耗时，由game_logic使用
+# 不用于搜索中每个节点都会调用的函数（走法生成、结束判断），每次计时都要获取锁并更新直方图；
+# 结束判断只在GameRoom.place_piece中单独计时
+ENGINE_SECONDS = histogram(
+    'square_engine_seconds', '游戏引擎函数的耗时（秒）', ['function']
+)
+PROCESS_RSS = gauge('square_process_resident_memory_bytes', '进程常驻内存（字节）', get_rss_bytes)
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台系统线程按间隔读取主线程的当前调用栈并计数
+    eventlet下所有greenthread都运行在主线程上，采到的就是正在执行的代码
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = _StackCounter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = None
+        self.target_thread_id = _threading.main_thread().ident
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return False
+        if interval:
+            self.interval = interval
+        self.stop_event = _threading.Event()
+        self.thread = _threading.Thread(target=self.run, name='square-profiler', daemon=True)
+        self.started_at = time.time()
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        return True
+
+    def reset(self):
+        self.stacks = _StackCounter()
+        self.samples = 0
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def render(self, limit=None):
+        """折叠栈格式：每行为"调用栈 次数"，可以直接用flamegraph.pl等工具绘制"""
+        lines = [f'{stack} {count}' for stack, count in self.stacks.most_common(limit)]
+        return '\n'.join(lines) + '\n'
+
+    def get_stats(self):
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'samples': self.samples,
+            'stacks': len(self.stacks),
+            'started_at': self.started_at
+        }
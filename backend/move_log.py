@@ -0,0 +1,115 @@
+# 对局的走法日志
+# 每步放置追加一条固定大小的记录（玩家、方块编号、朝向编号、x、y），对局历史只由这些记录表示
+# 重建中间局面时从最近的检查点开始重放，检查点每CHECKPOINT_INTERVAL步一个，在重放经过时按需创建
+# （追加时不创建，进行中的房间在内存中只保留开局局面和定长记录）
+# 导出按记录逐条生成，不需要先构建完整的结果
+
+import json
+import struct
+from pieces import PIECE_IDS, PIECE_INDEX, ORIENTATIONS, get_orientation_index
+
+RECORD = struct.Struct('<BBBBB')  # 玩家、方块编号、朝向编号、x、y
+CHECKPOINT_INTERVAL = 16
+
+# 二进制导出的头部（小端）：魔数'SL'、格式版本、玩家数、棋盘大小、记录数(u16)
+MAGIC = b'SL'
+FORMAT_VERSION = 1
+EXPORT_HEADER = struct.Struct('<2sBBBH')
+EXPORT_CHUNK_RECORDS = 256
+
+
+class MoveLogError(ValueError):
+    pass
+
+
+class MoveLog:
+    __slots__ = ('max_players', 'board_size', 'initial_turn', 'records', 'checkpoint_interval', 'checkpoints')
+
+    def __init__(self, initial_game, records=b'', checkpoint_interval=CHECKPOINT_INTERVAL):
+        """
+        initial_game为日志开始时的局面（通常是开局），之后不能再修改
+        records为已有的记录（如从快照恢复），对应的检查点在重放时再创建
+        """
+        if len(records) % RECORD.size:
+            raise MoveLogError("走法记录长度不正确")
+        self.max_players = initial_game.max_players
+        self.board_size = initial_game.board_size
+        self.initial_turn = initial_game.turn
+        self.records = bytearray(records)
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints = {0: initial_game.copy()}  # 已执行的步数 -> 局面
+
+    def __len__(self):
+        return len(self.records) // RECORD.size
+
+    def __iter__(self):
+        """依次返回每条记录(player_num, piece_id, 朝向编号, x, y)"""
+        for player_num, piece_index, orientation_index, board_x, board_y in RECORD.iter_unpack(self.records):
+            yield player_num, PIECE_IDS[piece_index], orientation_index, board_x, board_y
+
+    def get_record(self, index):
+        player_num, piece_index, orientation_index, board_x, board_y = RECORD.unpack_from(
+            self.records, index * RECORD.size
+        )
+        return player_num, PIECE_IDS[piece_index], orientation_index, board_x, board_y
+
+    def append(self, game):
+        """记录game的最近一次放置，在放置成功后调用"""
+        player_num, placed_piece = game.last_move
+        piece_id = placed_piece['piece_id']
+        board_x, board_y = placed_piece['position']
+        orientation_index = get_orientation_index(piece_id, placed_piece['rotation'], placed_piece['flip'])
+        self.records += RECORD.pack(player_num, PIECE_INDEX[piece_id], orientation_index, board_x, board_y)
+
+    def get_position(self, move_count):
+        """重建执行前move_count步之后的局面，返回新的Game对象"""
+        if not 0 <= move_count <= len(self):
+            raise IndexError(f"步数超出范围: {move_count}")
+
+        start = max(count for count in self.checkpoints if count <= move_count)
+        game = self.checkpoints[start].copy()
+        for index in range(start, move_count):
+            player_num, piece_id, orientation_index, board_x, board_y = self.get_record(index)
+            result = game.play_move(player_num, (piece_id, orientation_index, board_x, board_y))
+            if not result['success']:
+                raise MoveLogError(f"第{index + 1}步无法重放: {result['message']}")
+            if (index + 1) % self.checkpoint_interval == 0 and index + 1 not in self.checkpoints:
+                self.checkpoints[index + 1] = game.copy()
+        return game
+
+    def to_bytes(self):
+        return bytes(self.records)
+
+    def export_binary(self):
+        """逐块生成二进制导出：头部之后是原始记录"""
+        yield EXPORT_HEADER.pack(MAGIC, FORMAT_VERSION, self.max_players, self.board_size, len(self))
+        chunk_size = EXPORT_CHUNK_RECORDS * RECORD.size
+        for offset in range(0, len(self.records), chunk_size):
+            yield bytes(self.records[offset:offset + chunk_size])
+
+    def export_ndjson(self, header=None, result=None):
+        """
+        逐行生成NDJSON：第一行为对局信息（附加header中的字段），之后每行一步，
+        result不为None时最后一行为对局结果
+        """
+        yield _dump_line(dict(
+            header or {}, type='game', max_players=self.max_players, board_size=self.board_size,
+            initial_turn=self.initial_turn, moves=len(self)
+        ))
+        for index, (player_num, piece_id, orientation_index, board_x, board_y) in enumerate(self):
+            orientation = ORIENTATIONS[piece_id][orientation_index]
+            yield _dump_line({
+                'type': 'move',
+                'index': index,
+                'player': player_num,
+                'piece_id': piece_id,
+                'rotation': orientation.rotation,
+                'flip': orientation.flip,
+                'position': [board_x, board_y]
+            })
+        if result is not None:
+            yield _dump_line(dict(result, type='result'))
+
+
+def _dump_line(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')) + '\n'
@@ -0,0 +1,174 @@
+# 走法生成引擎
+# anchor：从玩家的锚点出发，只尝试覆盖锚点的放置（默认，逐个位置检查）
+# bitparallel：对每个朝向用整数移位一次算出所有合法原点——方块的每个格子把"空闲"平面和"锚点"平面
+#   反向平移到原点，空闲平面取与、锚点平面取或，相当于方块掩码与棋盘平面的相关运算，纯Python实现
+# numpy：同样的相关运算用NumPy对所有剩余方块的所有朝向一次矩阵乘法完成（需要安装numpy）
+# 引擎在启动时由环境变量SQUARE_MOVEGEN选择，numpy不可用时退回bitparallel
+# 三种引擎给出的合法放置集合相同，只有枚举顺序不同
+
+import logging
+import os
+from functools import lru_cache
+from bitboard import BOARD_STRIDE, cell_index, cell_position, iter_bits
+from pieces import ORIENTATIONS
+
+logger = logging.getLogger(__name__)
+
+MAX_PIECE_EXTENT = 5  # 方块朝向的最大宽高
+
+
+class AnchorMoveGenerator:
+    name = 'anchor'
+
+    def iter_moves(self, game, player_num, piece_ids):
+        anchor_cells, blocked = game.get_move_context(player_num)
+        if not anchor_cells:
+            return
+        for piece_id in piece_ids:
+            for orientation in ORIENTATIONS[piece_id]:
+                for board_x, board_y in game.iter_orientation_moves(orientation, anchor_cells, blocked):
+                    yield piece_id, orientation.index, board_x, board_y
+
+    def iter_origins(self, game, player_num, orientation):
+        anchor_cells, blocked = game.get_move_context(player_num)
+        return game.iter_orientation_moves(orientation, anchor_cells, blocked)
+
+
+@lru_cache(maxsize=None)
+def get_origin_region(board_size, width, height):
+    """宽width、高height的朝向放在棋盘内时，所有可能原点的掩码"""
+    row = (1 << (board_size - width + 1)) - 1
+    mask = 0
+    for y in range(board_size - height + 1):
+        mask |= row << (y * BOARD_STRIDE)
+    return mask
+
+
+def get_origin_mask(orientation, board_size, free, anchors):
+    """
+    朝向的所有合法原点的掩码：每个格子都空闲、至少一个格子覆盖锚点、整个方块在棋盘内
+    free为可以覆盖的格子（棋盘外也为1，由原点区域排除），anchors为锚点
+    """
+    legal = get_origin_region(board_size, orientation.width, orientation.height)
+    touching = 0
+    for dx, dy in orientation.coords:
+        shift = cell_index(dx, dy)
+        legal &= free >> shift
+        touching |= anchors >> shift
+    return legal & touching
+
+
+class BitParallelMoveGenerator:
+    name = 'bitparallel'
+
+    def get_planes(self, game, player_num):
+        bitboard = game.bitboard
+        blocked = bitboard.occupied | bitboard.forbidden[player_num]
+        return ~blocked, bitboard.anchors[player_num]
+
+    def iter_moves(self, game, player_num, piece_ids):
+        free, anchors = self.get_planes(game, player_num)
+        if not anchors:
+            return
+        for piece_id in piece_ids:
+            for orientation in ORIENTATIONS[piece_id]:
+                for index in iter_bits(get_origin_mask(orientation, game.board_size, free, anchors)):
+                    board_x, board_y = cell_position(index)
+                    yield piece_id, orientation.index, board_x, board_y
+
+    def iter_origins(self, game, player_num, orientation):
+        free, anchors = self.get_planes(game, player_num)
+        if not anchors:
+            return ()
+        return map(cell_position, iter_bits(get_origin_mask(orientation, game.board_size, free, anchors)))
+
+
+class NumpyMoveGenerator:
+    """
+    棋盘平面为board_size x board_size的数组，不可覆盖的格子为8，锚点为1，右侧和下方用8填充MAX_PIECE_EXTENT - 1格，
+    取出每个原点处5x5的窗口后与所有朝向的5x5掩码做一次矩阵乘法，结果为8 * 覆盖的不可用格子数 + 覆盖的锚点数
+    （方块最多5格，锚点数不会进位），结果在1到7之间的(朝向, 原点)即为合法放置
+    """
+    name = 'numpy'
+    BLOCKED = 8
+
+    def __init__(self):
+        import numpy  # 只有使用该引擎时才需要安装
+        np = self.np = numpy
+        self.labels = []  # 第i个朝向 -> (piece_id, 朝向编号)
+        self.piece_columns = {}  # piece_id -> 该方块的朝向所在的行
+        masks = []
+        for piece_id, orientations in ORIENTATIONS.items():
+            self.piece_columns[piece_id] = list(range(len(self.labels), len(self.labels) + len(orientations)))
+            for orientation in orientations:
+                mask = np.zeros((MAX_PIECE_EXTENT, MAX_PIECE_EXTENT), dtype=np.float32)
+                for dx, dy in orientation.coords:
+                    mask[dy, dx] = 1
+                masks.append(mask.ravel())
+                self.labels.append((piece_id, orientation.index))
+        self.matrix = np.array(masks)  # (朝向数, 25)
+        self.shifts = np.arange(32, dtype=np.uint32)
+
+    def get_plane(self, game, player_num):
+        """玩家视角的带填充棋盘平面"""
+        np = self.np
+        bitboard = game.bitboard
+        board_size = game.board_size
+        blocked = bitboard.occupied | bitboard.forbidden[player_num]
+        plane_mask = (1 << board_size) - 1
+        rows = np.array([
+            (blocked >> (y * BOARD_STRIDE) & plane_mask, bitboard.anchors[player_num] >> (y * BOARD_STRIDE) & plane_mask)
+            for y in range(board_size)
+        ], dtype=np.uint32)
+        bits = (rows[:, :, None] >> self.shifts[:board_size]) & 1
+        size = board_size + MAX_PIECE_EXTENT - 1
+        plane = np.full((size, size), self.BLOCKED, dtype=np.float32)
+        plane[:board_size, :board_size] = bits[:, 0] * self.BLOCKED + bits[:, 1]
+        return plane
+
+    def get_legal_matrix(self, game, player_num, piece_ids):
+        """返回(columns, origins)：每个合法放置的朝向行和原点编号（y * board_size + x），按朝向、原点排序"""
+        np = self.np
+        board_size = game.board_size
+        windows = np.lib.stride_tricks.sliding_window_view(
+            self.get_plane(game, player_num), (MAX_PIECE_EXTENT, MAX_PIECE_EXTENT)
+        ).reshape(board_size * board_size, -1)
+        rows = [column for piece_id in piece_ids for column in self.piece_columns[piece_id]]
+        counts = self.matrix[rows] @ windows.T  # (朝向数, 原点数)
+        columns, origins = np.nonzero((counts > 0) & (counts < self.BLOCKED))
+        return np.array(rows)[columns], origins
+
+    def iter_moves(self, game, player_num, piece_ids):
+        piece_ids = list(piece_ids)
+        if not piece_ids or not game.bitboard.anchors[player_num]:
+            return
+        columns, origins = self.get_legal_matrix(game, player_num, piece_ids)
+        board_size = game.board_size
+        labels = self.labels
+        for column, origin in zip(columns.tolist(), origins.tolist()):
+            piece_id, orientation_index = labels[column]
+            yield piece_id, orientation_index, origin % board_size, origin // board_size
+
+    def iter_origins(self, game, player_num, orientation):
+        # 单个朝向时数组的固定开销大于直接的位运算
+        return BitParallelMoveGenerator().iter_origins(game, player_num, orientation)
+
+
+MOVE_GENERATORS = {
+    'anchor': AnchorMoveGenerator,
+    'bitparallel': BitParallelMoveGenerator,
+    'numpy': NumpyMoveGenerator,
+}
+
+
+def create_move_generator(name=None):
+    """根据名称（默认为环境变量SQUARE_MOVEGEN，未设置时为anchor）创建走法生成引擎"""
+    if name is None:
+        name = os.environ.get('SQUARE_MOVEGEN', 'anchor')
+    if name not in MOVE_GENERATORS:
+        raise ValueError(f"不支持的走法生成引擎: {name}")
+    try:
+        return MOVE_GENERATORS[name]()
+    except ImportError:
+        logger.warning("未安装numpy，走法生成改用bitparallel引擎")
+        return BitParallelMoveGenerator()
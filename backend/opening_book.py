@@ -0,0 +1,179 @@
+# 开局库
+# 开局时每个玩家必须覆盖自己的起始角落，前几步的局面是一棵很小的树，可以离线预先计算（见opening_book_builder.py）
+# 开局库文件是以Zobrist哈希为键的开放寻址哈希表，通过mmap只读映射，查找只需要计算一到两个槽位，不需要加载整个文件
+#
+# 对称：2人游戏的起始角落(0,0)和(13,13)都在主对角线上，沿主对角线转置后仍是同样两个玩家的合法局面，
+# 因此只保存两者中哈希值较小的一个（规范局面），查找时同时尝试转置后的哈希并把走法转置回来
+# 4人游戏中转置会交换玩家2和4，改变行动顺序，没有保持玩家不变的对称，按原局面保存
+#
+# 文件格式（小端）：
+#   头部：魔数'SQOB'、格式版本、最大步数、保留、槽位数(u32)
+#   槽位：Zobrist哈希(u64，0表示空槽位)、方块编号、朝向编号、x、y、评估值(i16，行动方视角，单位为0.1格)
+
+import logging
+import mmap
+import os
+import struct
+from collections import namedtuple
+from functools import lru_cache
+from bitboard import cell_index, cell_position, iter_bits
+from pieces import ORIENTATIONS, PIECE_IDS, PIECE_INDEX
+import zobrist
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SQOB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBBHI')
+ENTRY = struct.Struct('<QBBBBh')
+SCORE_SCALE = 10
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+# move为(piece_id, 朝向编号, x, y)，score为搜索得到的评估值（行动方视角）
+BookMove = namedtuple('BookMove', ['move', 'score'])
+
+
+class OpeningBookError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_transposed_orientation(piece_id, orientation_index):
+    """沿主对角线转置后的朝向编号（转置是旋转加翻转，结果一定在同一方块的朝向中）"""
+    coords = frozenset((dy, dx) for dx, dy in ORIENTATIONS[piece_id][orientation_index].coords)
+    for orientation in ORIENTATIONS[piece_id]:
+        if frozenset(orientation.coords) == coords:
+            return orientation.index
+    raise OpeningBookError(f"找不到{piece_id}转置后的朝向")
+
+
+def transpose_move(move):
+    piece_id, orientation_index, board_x, board_y = move
+    return piece_id, get_transposed_orientation(piece_id, orientation_index), board_y, board_x
+
+
+def transpose_mask(mask):
+    transposed = 0
+    for index in iter_bits(mask):
+        board_x, board_y = cell_position(index)
+        transposed |= 1 << cell_index(board_y, board_x)
+    return transposed
+
+
+def has_symmetry(game):
+    return game.max_players == 2
+
+
+def get_transposed_hash(game):
+    """转置后局面的Zobrist哈希：剩余方块和行动玩家不变，只替换每个玩家的格子"""
+    value = game.zobrist_hash
+    for player_num, mask in game.bitboard.occupancy.items():
+        value ^= zobrist.hash_cells(mask, player_num) ^ zobrist.hash_cells(transpose_mask(mask), player_num)
+    return value
+
+
+def get_canonical_key(game):
+    """返回(规范局面的哈希, 规范局面是否为转置后的局面)"""
+    if has_symmetry(game):
+        transposed = get_transposed_hash(game)
+        if transposed < game.zobrist_hash:
+            return transposed, True
+    return game.zobrist_hash, False
+
+
+def write_book(path, entries, max_plies):
+    """
+    entries为{规范局面的哈希: BookMove}，走法已经是规范局面中的走法
+    槽位数为不小于条目数两倍的2的幂，写入临时文件后替换，正在映射旧文件的进程不受影响
+    """
+    slots = 1
+    while slots < len(entries) * 2:
+        slots *= 2
+    mask = slots - 1
+    data = bytearray(HEADER.size + slots * ENTRY.size)
+    HEADER.pack_into(data, 0, MAGIC, FORMAT_VERSION, max_plies, 0, slots)
+    for key, (move, score) in entries.items():
+        if key == 0:
+            continue  # 0表示空槽位
+        slot = key & mask
+        while ENTRY.unpack_from(data, HEADER.size + slot * ENTRY.size)[0]:
+            slot = (slot + 1) & mask
+        piece_id, orientation_index, board_x, board_y = move
+        score = max(-0x8000, min(0x7FFF, round(score * SCORE_SCALE)))
+        ENTRY.pack_into(
+            data, HEADER.size + slot * ENTRY.size,
+            key, PIECE_INDEX[piece_id], orientation_index, board_x, board_y, score
+        )
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return slots
+
+
+class OpeningBook:
+    __slots__ = ('path', 'file', 'data', 'mask', 'max_plies')
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.data) < HEADER.size:
+                raise OpeningBookError("开局库文件过短")
+            magic, version, self.max_plies, _, slots = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise OpeningBookError("不支持的开局库格式")
+            if slots & (slots - 1) or len(self.data) != HEADER.size + slots * ENTRY.size:
+                raise OpeningBookError("开局库文件长度不正确")
+        except (OpeningBookError, ValueError):
+            self.file.close()
+            raise
+        self.mask = slots - 1
+
+    def __len__(self):
+        return sum(1 for key, *_ in ENTRY.iter_unpack(self.data[HEADER.size:]) if key)
+
+    def probe(self, key):
+        """按规范局面的哈希查找，返回BookMove或None"""
+        slot = key & self.mask
+        while True:
+            entry_key, piece_index, orientation_index, board_x, board_y, score = ENTRY.unpack_from(
+                self.data, HEADER.size + slot * ENTRY.size
+            )
+            if entry_key == key:
+                return BookMove((PIECE_IDS[piece_index], orientation_index, board_x, board_y), score / SCORE_SCALE)
+            if not entry_key:
+                return None
+            slot = (slot + 1) & self.mask
+
+    def lookup(self, game):
+        """查找当前局面行动方的开局走法，不在开局库中时返回None"""
+        if game.game_over or game.turn >= self.max_plies:
+            return None
+        entry = self.probe(game.zobrist_hash)
+        if entry is None and has_symmetry(game):
+            entry = self.probe(get_transposed_hash(game))
+            if entry is not None:
+                entry = entry._replace(move=transpose_move(entry.move))
+        return entry
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def load_opening_book(path=None):
+    """
+    打开开局库（默认为环境变量SQUARE_OPENING_BOOK，未设置时为backend/opening_book.bin），
+    文件不存在或格式不正确时返回None，电脑玩家照常搜索
+    """
+    if path is None:
+        path = os.environ.get('SQUARE_OPENING_BOOK', DEFAULT_PATH)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError) as e:
+        logger.warning("无法加载开局库%s: %s", path, e)
+        return None
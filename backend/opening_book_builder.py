@@ -0,0 +1,108 @@
+# 开局库生成
+# 从开局局面开始逐步展开：每个局面用电脑玩家的alpha-beta搜索按固定深度给排序后的候选走法打分，
+# 记录最佳走法，再沿得分最高的几步展开到下一步。同一步数的局面先按规范局面的哈希去重（见opening_book.py），
+# 然后在进程池中并行评估
+#
+# 在backend目录下运行（默认写入opening_book.bin，电脑玩家启动时自动加载）：
+#   python -m opening_book_builder --plies 6 --width 3 --depth 2
+#   python -m opening_book_builder --max-players 2 --plies 8 --output book.bin
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ai import Bot
+from game_logic import Game
+from opening_book import DEFAULT_PATH, BookMove, get_canonical_key, transpose_move, write_book
+
+DEFAULT_PLIES = 6
+DEFAULT_WIDTH = 3
+DEFAULT_DEPTH = 2
+
+
+def new_game(max_players):
+    game = Game(max_players)
+    for player_num in range(1, max_players + 1):
+        game.add_player(f'book{player_num}', player_num)
+    return game
+
+
+def evaluate_position(compact, depth):
+    """
+    对局面行动方的候选走法（与电脑玩家相同的排序和数量）做固定深度的完整搜索，
+    返回按得分从高到低排序的[(得分, 走法)]；根节点不剪枝，每个候选走法的得分都是准确的
+    """
+    game = Game.from_compact(compact)
+    player_num = game.current_player
+    bot = Bot(player_num, max_depth=depth)
+    bot.deadline = float('inf')
+    scored = []
+    for move in bot.get_candidate_moves(game, player_num):
+        child = game.copy()
+        child.play_move(player_num, move)
+        scored.append((bot.search(child, depth - 1, -float('inf'), float('inf')), move))
+    # 得分相同时按走法排序，保证结果可以复现
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored
+
+
+def build_book(max_players_list, plies, width, depth, executor, log=None):
+    """返回{规范局面的哈希: BookMove}"""
+    entries = {}
+    for max_players in max_players_list:
+        game = new_game(max_players)
+        frontier = {get_canonical_key(game)[0]: game}
+        for ply in range(plies):
+            start = time.perf_counter()
+            positions = list(frontier.items())
+            results = executor.map(
+                evaluate_position, [game.to_compact() for _, game in positions], [depth] * len(positions)
+            )
+            next_frontier = {}
+            for (key, game), scored in zip(positions, results):
+                if not scored:
+                    continue
+                score, move = scored[0]
+                if key != game.zobrist_hash:
+                    move = transpose_move(move)  # 保存规范局面（转置后）中的走法
+                entries[key] = BookMove(move, score)
+                if ply + 1 == plies:
+                    continue
+                for _, candidate in scored[:width]:
+                    child = game.copy()
+                    child.play_move(game.current_player, candidate)
+                    if not child.game_over:
+                        next_frontier.setdefault(get_canonical_key(child)[0], child)
+            if log is not None:
+                log(f"{max_players}人 第{ply + 1}步: {len(positions)}个局面, {time.perf_counter() - start:.1f}秒")
+            frontier = next_frontier
+    return entries
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m opening_book_builder', description='生成开局库')
+    parser.add_argument('--max-players', type=int, nargs='+', choices=(2, 4), default=[2, 4])
+    parser.add_argument('--plies', type=int, default=DEFAULT_PLIES, help='开局库覆盖的步数（双方合计）')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help='每个局面沿得分最高的几步展开')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help='评估候选走法的搜索深度')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not 0 < args.plies < 256:
+        print("--plies应在1到255之间", file=sys.stderr)
+        return 2
+    log = lambda message: print(message, file=sys.stderr)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        entries = build_book(args.max_players, args.plies, args.width, args.depth, executor, log)
+    slots = write_book(args.output, entries, args.plies)
+    log(f"{len(entries)}个局面写入{args.output}（{slots}个槽位，{os.path.getsize(args.output)}字节）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,10 @@
 # 方块形状定义
 # 每个方块用相对坐标表示，(0,0)为基准点
 
+from collections import namedtuple
+from types import MappingProxyType
+from bitboard import coords_mask
+
 PIECES = {
     # 1格方块
     'piece_1': {
@@ -194,13 +198,10 @@ def normalize_piece(piece_coords):
     min_y = min(y for x, y in piece_coords)
     return [(x - min_x, y - min_y) for x, y in piece_coords]
 
-def get_transformed_piece(piece_id, rotation=0, flip=False):
+def _transform_piece(piece_id, rotation=0, flip=False):
     """
-    获取变换后的方块坐标
+    对方块坐标依次进行翻转、旋转和规范化，仅用于构建朝向表
     """
-    if piece_id not in PIECES:
-        return None
-    
     base_coords = PIECES[piece_id]['shapes'][0].copy()
     
     # 应用翻转
@@ -225,6 +226,63 @@ def get_piece_bounds(piece_coords):
     max_y = max(y for x, y in piece_coords)
     return min_x, max_x, min_y, max_y
 
+# 方块朝向表
+# 每个方块的8种变换（4种旋转 x 是否翻转）去重后只保留不同的形状，导入时构建一次
+ROTATIONS = (0, 90, 180, 270)
+FLIPS = (False, True)
+
+# coords为规范化后的坐标元组，mask为以(0,0)为原点的位掩码，
+# rotation/flip为得到该朝向的第一种变换
+Orientation = namedtuple('Orientation', ['piece_id', 'index', 'coords', 'width', 'height', 'mask', 'rotation', 'flip'])
+
+def _build_orientation_table():
+    orientations = {}
+    orientation_index = {}
+    for piece_id in PIECES:
+        unique = []
+        seen = {}
+        for rotation in ROTATIONS:
+            for flip in FLIPS:
+                coords = tuple(_transform_piece(piece_id, rotation, flip))
+                shape = tuple(sorted(coords))
+                if shape not in seen:
+                    seen[shape] = len(unique)
+                    min_x, max_x, min_y, max_y = get_piece_bounds(coords)
+                    unique.append(Orientation(
+                        piece_id, len(unique), coords,
+                        max_x - min_x + 1, max_y - min_y + 1,
+                        coords_mask(coords), rotation, flip
+                    ))
+                orientation_index[(piece_id, rotation, flip)] = seen[shape]
+        orientations[piece_id] = tuple(unique)
+    return MappingProxyType(orientations), MappingProxyType(orientation_index)
+
+def get_orientation_index(piece_id, rotation=0, flip=False):
+    """
+    获取(piece_id, rotation, flip)对应的规范朝向编号，无效方块返回None
+    """
+    if rotation not in ROTATIONS:
+        rotation = 0  # 与rotate_piece一致，未知角度不旋转
+    return ORIENTATION_INDEX.get((piece_id, rotation, bool(flip)))
+
+def get_orientation(piece_id, rotation=0, flip=False):
+    """
+    获取变换对应的朝向，无效方块返回None
+    """
+    index = get_orientation_index(piece_id, rotation, flip)
+    if index is None:
+        return None
+    return ORIENTATIONS[piece_id][index]
+
+def get_transformed_piece(piece_id, rotation=0, flip=False):
+    """
+    获取变换后的方块坐标
+    """
+    orientation = get_orientation(piece_id, rotation, flip)
+    if orientation is None:
+        return None
+    return list(orientation.coords)
+
 # 获取所有方块ID列表
 def get_all_piece_ids():
     return list(PIECES.keys())
@@ -233,6 +291,12 @@ def get_all_piece_ids():
 def get_player_pieces():
     return get_all_piece_ids() 
 
+ORIENTATIONS, ORIENTATION_INDEX = _build_orientation_table()
+
+# 方块的数字编号（按PIECES中的顺序），用于紧凑的编码
+PIECE_IDS = tuple(PIECES)
+PIECE_INDEX = MappingProxyType({piece_id: index for index, piece_id in enumerate(PIECE_IDS)})
+
 # 测试函数
 if __name__ == "__main__":
     print("测试五格Z形方块:")
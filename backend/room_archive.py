@@ -0,0 +1,135 @@
+# 房间休眠存储
+# 空闲的房间以二进制快照（见snapshot.py）追加写入SQLite，从内存中移除；玩家重新加入时再恢复
+# 表只追加：每次休眠写入一条新记录，删除房间时写入一条data为NULL的记录，读取时以最新一条为准
+# compact()清理被覆盖的旧记录，由空闲房间回收的定期扫描调用（见app.py），本进程写入过新记录时才执行
+# 超过保存期限（最后一次休眠之后）仍未恢复的房间由同一扫描通过expire()删除
+
+import os
+import sqlite3
+import threading
+import time
+import snapshot
+
+# 休眠房间的保存期限（秒），设为0时永久保存
+ARCHIVE_RETENTION = float(os.environ.get('SQUARE_ARCHIVE_RETENTION', 7 * 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS room_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_id TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS room_snapshots_room ON room_snapshots (room_id, id);
+"""
+
+
+class RoomArchive:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        self.appended = 0  # 上次压缩之后本进程追加的记录数
+
+    def get_connection(self):
+        """
+        按进程打开数据库连接（gunicorn预加载应用后fork，连接不能跨进程使用）
+        同一个连接会在多个线程中使用，调用方需持有self.lock
+        """
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ':memory:':
+                # 多个worker进程同时读写同一个文件
+                self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.executescript(SCHEMA)
+            self.pid = os.getpid()
+        return self.connection
+
+    def append(self, room_id, data):
+        with self.lock:
+            self.get_connection().execute(
+                'INSERT INTO room_snapshots (room_id, saved_at, data) VALUES (?, ?, ?)',
+                (room_id, time.time(), data)
+            )
+            self.appended += 1
+
+    def save(self, room):
+        """追加写入房间快照，返回快照字节数"""
+        data = snapshot.encode_room(room)
+        self.append(room.room_id, data)
+        return len(data)
+
+    def delete(self, room_id):
+        """追加一条删除记录"""
+        if room_id in self:
+            self.append(room_id, None)
+
+    def load_data(self, room_id):
+        with self.lock:
+            row = self.get_connection().execute(
+                'SELECT data FROM room_snapshots WHERE room_id = ? ORDER BY id DESC LIMIT 1',
+                (room_id,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def load(self, room_id):
+        """读取房间的最新快照，不存在或已删除时返回None"""
+        data = self.load_data(room_id)
+        if data is None:
+            return None
+        return snapshot.decode_room(data)
+
+    def __contains__(self, room_id):
+        return self.load_data(room_id) is not None
+
+    def room_ids(self):
+        """所有未删除的房间号"""
+        with self.lock:
+            rows = self.get_connection().execute(
+                'SELECT room_id, data IS NOT NULL FROM room_snapshots '
+                'WHERE id IN (SELECT MAX(id) FROM room_snapshots GROUP BY room_id)'
+            ).fetchall()
+        return [room_id for room_id, alive in rows if alive]
+
+    def compact(self):
+        """删除被覆盖的旧记录和已删除房间的记录，返回删除的记录数"""
+        with self.lock:
+            cursor = self.get_connection().execute(
+                'DELETE FROM room_snapshots WHERE id NOT IN '
+                '(SELECT MAX(id) FROM room_snapshots GROUP BY room_id) OR data IS NULL'
+            )
+            self.appended = 0
+            return cursor.rowcount
+
+    def expire(self, cutoff):
+        """删除最后一次写入早于cutoff的房间的所有记录，返回删除的房间号"""
+        expired_rooms = 'SELECT room_id FROM room_snapshots GROUP BY room_id HAVING MAX(saved_at) < ?'
+        with self.lock:
+            connection = self.get_connection()
+            room_ids = [row[0] for row in connection.execute(expired_rooms, (cutoff,)).fetchall()]
+            if room_ids:
+                # 重新按条件删除：其他worker在查询之后刚休眠的房间不会被删除
+                connection.execute(f'DELETE FROM room_snapshots WHERE room_id IN ({expired_rooms})', (cutoff,))
+        return room_ids
+
+    def get_stats(self):
+        with self.lock:
+            records, size = self.get_connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM room_snapshots'
+            ).fetchone()
+        return {'path': self.path, 'records': records, 'bytes': size}
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+def create_room_archive():
+    """根据环境变量SQUARE_ARCHIVE_PATH创建休眠存储，未设置或为空字符串时不启用（房间不休眠，直接删除）"""
+    path = os.environ.get('SQUARE_ARCHIVE_PATH', '')
+    if not path:
+        return None
+    return RoomArchive(path)
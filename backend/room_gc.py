@@ -0,0 +1,141 @@
+# 空闲房间回收
+# 每个房间记录最后活动时间（GameRoom.last_activity），按房间状态有不同的存活时间：
+#   没有真人玩家的房间（创建后无人加入、只剩电脑玩家）、无人开始的等待中房间、已结束的对局
+# 到期的房间在进行中时休眠到磁盘，否则直接删除；真人玩家都在的进行中对局不会过期
+# 到期时间保存在最小堆中，活动时不修改堆：堆顶到期时再按房间当前的最后活动时间重新计算，
+# 未到期的重新放入堆中。定期扫描房间存储，把其他worker创建或恢复的房间也加入堆中，
+# 扫描之后执行应用提供的维护任务（如压缩休眠存储）
+
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+RoomTTLs = namedtuple('RoomTTLs', ['empty', 'waiting', 'finished'])
+
+SWEEP_INTERVAL = 60  # 扫描房间存储的间隔（秒），也是不会过期的房间的重新检查间隔
+MAX_SLEEP = 1.0  # 后台任务每次最多等待的时间，新加入的房间最迟在这之后被检查
+
+
+def load_ttls():
+    """
+    从环境变量读取各类房间的存活时间（秒），设为0时该类房间不过期
+    SQUARE_ROOM_TTL_EMPTY（默认300）、SQUARE_ROOM_TTL_WAITING（默认1800）、SQUARE_ROOM_TTL_FINISHED（默认600）
+    """
+    return RoomTTLs(
+        empty=float(os.environ.get('SQUARE_ROOM_TTL_EMPTY', 300)),
+        waiting=float(os.environ.get('SQUARE_ROOM_TTL_WAITING', 1800)),
+        finished=float(os.environ.get('SQUARE_ROOM_TTL_FINISHED', 600))
+    )
+
+
+def get_expiry(room, ttls):
+    """返回(到期时间, 原因)，房间当前不会过期时返回(None, None)"""
+    if room.status == 'finished':
+        reason = 'finished'
+    elif room.get_human_count() == 0:
+        reason = 'empty'
+    elif room.status == 'waiting':
+        reason = 'waiting'
+    else:
+        return None, None
+    ttl = getattr(ttls, reason)
+    if ttl <= 0:
+        return None, None
+    return room.last_activity + ttl, reason
+
+
+class ExpiryHeap:
+    """(到期时间, room_id)的最小堆，同一个房间只保留最早的一项"""
+
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}  # room_id -> 堆中的到期时间
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, room_id):
+        return room_id in self.deadlines
+
+    def schedule(self, room_id, deadline):
+        with self.lock:
+            current = self.deadlines.get(room_id)
+            if current is not None and current <= deadline:
+                return
+            # 旧的一项留在堆中，弹出时与deadlines不一致的项会被跳过
+            self.deadlines[room_id] = deadline
+            heapq.heappush(self.heap, (deadline, room_id))
+
+    def pop_due(self, now):
+        """弹出所有到期的房间号"""
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, room_id = heapq.heappop(self.heap)
+                if self.deadlines.get(room_id) == deadline:
+                    del self.deadlines[room_id]
+                    due.append(room_id)
+        return due
+
+    def next_deadline(self):
+        with self.lock:
+            return self.heap[0][0] if self.heap else None
+
+
+class RoomCollector:
+    """
+    在后台任务中循环：等待到最早的到期时间，检查到期的房间并回收
+    check(room_id, now)由应用提供，返回房间新的到期时间（已回收或房间不存在时返回None）
+    on_sweep()在每次扫描之后调用
+    """
+
+    def __init__(self, check, list_rooms, sleep=time.sleep, sweep_interval=SWEEP_INTERVAL, on_sweep=None):
+        self.check = check
+        self.list_rooms = list_rooms
+        self.sleep = sleep
+        self.sweep_interval = sweep_interval
+        self.on_sweep = on_sweep
+        self.expiry = ExpiryHeap()
+        self.last_sweep = 0
+
+    def schedule(self, room_id, deadline=None):
+        """加入房间，deadline为None时立即检查一次"""
+        self.expiry.schedule(room_id, time.time() if deadline is None else deadline)
+
+    def sweep(self):
+        """把房间存储中还没有加入堆的房间加入"""
+        for room_id in self.list_rooms():
+            if room_id not in self.expiry:
+                self.schedule(room_id)
+        self.last_sweep = time.time()
+        if self.on_sweep is not None:
+            self.on_sweep()
+
+    def run_once(self, now=None):
+        """处理到期的房间，返回处理的房间数"""
+        if now is None:
+            now = time.time()
+        if now - self.last_sweep >= self.sweep_interval:
+            self.sweep()
+        due = self.expiry.pop_due(now)
+        for room_id in due:
+            deadline = self.check(room_id, now)
+            if deadline is not None:
+                self.expiry.schedule(room_id, max(deadline, now + 1))
+        return len(due)
+
+    def run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("回收空闲房间时出错")
+            now = time.time()
+            wake = min(self.last_sweep + self.sweep_interval, self.expiry.next_deadline() or float('inf'))
+            self.sleep(min(max(wake - now, 0.01), MAX_SLEEP))
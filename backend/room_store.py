@@ -0,0 +1,337 @@
+# 房间存储
+# 单进程时房间直接保存在内存字典中（LocalRoomStore）
+# 多个gunicorn worker时房间快照保存在Redis中（SharedRoomStore），所有worker都能读写任意房间：
+# - 修改房间前获取房间锁，修改后保存快照；快照带版本号，版本不变时直接使用本地缓存的房间对象
+# - 每个房间有一个拥有者worker（带租约），电脑玩家思考、合法放置推送等后台任务只在拥有者上执行，
+#   其他worker通过拥有者的任务队列把任务转交给它
+# - 不同worker之间的Socket.IO消息通过SOCKETIO_MESSAGE_QUEUE指定的消息队列转发
+# MemoryRedis是进程内的Redis替代实现，只支持这里用到的命令，用于测试和单进程调试
+
+import fnmatch
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from game_logic import GameRoom
+
+LOCK_TIMEOUT = 10.0  # 房间锁的最长持有时间（秒），持有者异常退出后自动释放
+OWNER_LEASE = 30.0  # 拥有者租约（秒），拥有者每次执行任务时续期
+WIRE_FORMAT_TTL = 24 * 3600
+
+
+class RoomLockTimeout(Exception):
+    pass
+
+
+def get_worker_id():
+    """当前worker的标识，fork之后每个worker不同"""
+    return os.environ.get('SQUARE_WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LocalRoomStore:
+    """房间保存在当前进程的字典中，只适用于单个worker"""
+
+    shared = False
+
+    def __init__(self):
+        self.rooms = {}
+        self.wire_formats = {}
+
+    def __contains__(self, room_id):
+        return room_id in self.rooms
+
+    def __getitem__(self, room_id):
+        return self.rooms[room_id]
+
+    def __setitem__(self, room_id, room):
+        self.rooms[room_id] = room
+
+    def __delitem__(self, room_id):
+        del self.rooms[room_id]
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def get(self, room_id, default=None):
+        return self.rooms.get(room_id, default)
+
+    def keys(self):
+        return list(self.rooms.keys())
+
+    def values(self):
+        return list(self.rooms.values())
+
+    def save(self, room):
+        """保存房间修改（内存存储中房间对象本身就是最新的）"""
+
+    @contextmanager
+    def lock(self, room_id):
+        """
+        单进程时不需要真正加锁：eventlet只在I/O和等待计算任务时切换，锁内对房间的修改在让出之前已经完成，
+        计算任务都在锁外进行，完成后在锁内重新读取房间并检查回合
+        """
+        yield
+
+    def is_owner(self, room_id):
+        return True
+
+    def send_task(self, room_id, task):
+        """单进程时不会出现转交任务的情况"""
+        return False
+
+    def pop_task(self, timeout):
+        time.sleep(timeout)
+        return None
+
+    def get_wire_format(self, socket_id):
+        return self.wire_formats.get(socket_id, 'json')
+
+    def set_wire_format(self, socket_id, wire_format):
+        self.wire_formats[socket_id] = wire_format
+
+    def clear_wire_format(self, socket_id):
+        self.wire_formats.pop(socket_id, None)
+
+
+class SharedRoomStore:
+    """房间快照保存在Redis（或兼容的客户端）中，多个worker共享"""
+
+    shared = True
+
+    def __init__(self, client, prefix='square:'):
+        self.client = client
+        self.prefix = prefix
+        self.cache = {}  # room_id -> (版本号, 房间对象)
+
+    def key(self, *parts):
+        return self.prefix + ':'.join(parts)
+
+    def __contains__(self, room_id):
+        return bool(self.client.exists(self.key('version', room_id)))
+
+    def __getitem__(self, room_id):
+        room = self.get(room_id)
+        if room is None:
+            raise KeyError(room_id)
+        return room
+
+    def __setitem__(self, room_id, room):
+        self.save(room)
+        self.is_owner(room_id)
+
+    def __delitem__(self, room_id):
+        self.client.delete(
+            self.key('room', room_id), self.key('version', room_id), self.key('owner', room_id)
+        )
+        self.cache.pop(room_id, None)
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, room_id, default=None):
+        """读取房间，快照版本没有变化时返回本地缓存的对象（保留回合内的计算缓存）"""
+        version = self.client.get(self.key('version', room_id))
+        if version is None:
+            self.cache.pop(room_id, None)
+            return default
+        version = int(version)
+
+        cached = self.cache.get(room_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        data = self.client.get(self.key('room', room_id))
+        if data is None:
+            return default
+        room = GameRoom.from_snapshot(json.loads(data))
+        self.cache[room_id] = (version, room)
+        return room
+
+    def keys(self):
+        prefix = self.key('version', '')
+        return [key[len(prefix):] for key in map(_to_str, self.client.scan_iter(prefix + '*'))]
+
+    def values(self):
+        return [room for room in map(self.get, self.keys()) if room is not None]
+
+    def save(self, room):
+        """保存房间快照并增加版本号"""
+        data = json.dumps(room.to_snapshot(), ensure_ascii=False, separators=(',', ':'))
+        self.client.set(self.key('room', room.room_id), data)
+        version = self.client.incr(self.key('version', room.room_id))
+        self.cache[room.room_id] = (int(version), room)
+
+    @contextmanager
+    def lock(self, room_id):
+        """跨worker的房间锁（SET NX PX），等待期间让出事件循环"""
+        key = self.key('lock', room_id)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while not self.client.set(key, token, nx=True, px=int(LOCK_TIMEOUT * 1000)):
+            if time.monotonic() >= deadline:
+                raise RoomLockTimeout(f"房间{room_id}正忙")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            # 锁已过期并被其他worker获取时不能删除
+            if _to_str(self.client.get(key)) == token:
+                self.client.delete(key)
+
+    def is_owner(self, room_id):
+        """当前worker是否为房间的拥有者；房间没有拥有者或租约过期时由当前worker接管"""
+        key = self.key('owner', room_id)
+        worker_id = get_worker_id()
+        lease = int(OWNER_LEASE * 1000)
+        if self.client.set(key, worker_id, nx=True, px=lease):
+            return True
+        if _to_str(self.client.get(key)) == worker_id:
+            self.client.set(key, worker_id, px=lease)
+            return True
+        return False
+
+    def send_task(self, room_id, task):
+        """把房间的后台任务转交给拥有者worker，没有拥有者时返回False"""
+        owner = self.client.get(self.key('owner', room_id))
+        if owner is None:
+            return False
+        message = json.dumps({'room_id': room_id, 'task': task})
+        self.client.rpush(self.key('tasks', _to_str(owner)), message)
+        return True
+
+    def pop_task(self, timeout):
+        """等待转交给当前worker的任务，返回(room_id, task)或None"""
+        item = self.client.blpop([self.key('tasks', get_worker_id())], timeout=timeout)
+        if item is None:
+            return None
+        message = json.loads(item[1])
+        return message['room_id'], message['task']
+
+    def get_wire_format(self, socket_id):
+        return _to_str(self.client.get(self.key('wire', socket_id))) or 'json'
+
+    def set_wire_format(self, socket_id, wire_format):
+        self.client.set(self.key('wire', socket_id), wire_format, px=WIRE_FORMAT_TTL * 1000)
+
+    def clear_wire_format(self, socket_id):
+        self.client.delete(self.key('wire', socket_id))
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+class MemoryRedis:
+    """进程内的Redis替代实现，只实现SharedRoomStore用到的命令"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.RLock()
+
+    def _expire(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and time.monotonic() >= expires_at:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    def get(self, key):
+        with self.lock:
+            self._expire(key)
+            return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        with self.lock:
+            self._expire(key)
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            if px is not None:
+                self.expires[key] = time.monotonic() + px / 1000
+            else:
+                self.expires.pop(key, None)
+            return True
+
+    def incr(self, key):
+        with self.lock:
+            self._expire(key)
+            value = int(self.data.get(key, 0)) + 1
+            self.data[key] = str(value)
+            return value
+
+    def delete(self, *keys):
+        with self.lock:
+            count = 0
+            for key in keys:
+                self._expire(key)
+                if key in self.data:
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    count += 1
+            return count
+
+    def exists(self, *keys):
+        with self.lock:
+            count = 0
+            for key in keys:
+                self._expire(key)
+                count += key in self.data
+            return count
+
+    def scan_iter(self, match='*'):
+        with self.lock:
+            for key in list(self.data):
+                self._expire(key)
+            return [key for key in self.data if fnmatch.fnmatchcase(key, match)]
+
+    def rpush(self, key, *values):
+        with self.lock:
+            self._expire(key)
+            items = self.data.setdefault(key, [])
+            items.extend(values)
+            return len(items)
+
+    def lpop(self, key):
+        with self.lock:
+            self._expire(key)
+            items = self.data.get(key)
+            if not items:
+                return None
+            value = items.pop(0)
+            if not items:
+                del self.data[key]
+            return value
+
+    def blpop(self, keys, timeout=0):
+        """轮询实现的阻塞弹出，timeout为0时一直等待"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            for key in keys:
+                value = self.lpop(key)
+                if value is not None:
+                    return key, value
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+
+
+def create_room_store():
+    """
+    根据环境变量SQUARE_ROOM_STORE创建房间存储：
+    memory（默认）- 进程内字典；memory-redis - 进程内Redis替代实现；redis://... - Redis服务器
+    """
+    url = os.environ.get('SQUARE_ROOM_STORE', 'memory')
+    prefix = os.environ.get('SQUARE_ROOM_STORE_PREFIX', 'square:')
+    if url == 'memory':
+        return LocalRoomStore()
+    if url == 'memory-redis':
+        return SharedRoomStore(MemoryRedis(), prefix)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis  # 只有使用Redis时才需要安装
+        return SharedRoomStore(redis.Redis.from_url(url), prefix)
+    raise ValueError(f"不支持的房间存储: {url}")
@@ -0,0 +1,193 @@
+# 房间快照的二进制编码
+# 在GameRoom.to_snapshot()的基础上压缩为字节串，用于休眠到磁盘（见room_archive.py）
+# 棋盘占用不单独保存，恢复时由每个玩家的放置记录重新计算
+#
+# 头部（小端）：魔数'SR'、格式版本、玩家数、房间状态、当前玩家（未开始时为0）、房间内玩家数、标志位
+# 之后依次为：房间号、每个房间玩家（编号、是否电脑、思考时间、名字、socket_id）、游戏局面（如果已开始）、
+# 走法日志（u16记录数 + move_log.py格式的记录）、
+# 时间（版本2起）：最后活动时间(f64)、每步放置时间的个数(u16)和每步距最后活动时间的毫秒数(u32)
+# 字符串都以u16长度为前缀，放置记录与wire.py的格式相同
+# 观战者是当前连接，休眠前已收到room_closed并离开，不保存在快照中；版本1的快照恢复时最后活动时间为恢复时间
+
+import struct
+from bitboard import cell_index
+from game_logic import GameRoom
+from pieces import PIECE_IDS, get_orientation
+import wire
+from move_log import RECORD as MOVE_LOG_RECORD
+
+MAGIC = b'SR'
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+ROOM_STATUSES = ('waiting', 'playing', 'finished')
+
+FLAG_HAS_GAME = 1
+FLAG_HAS_MOVE_LOG = 2
+
+ROOM_HEADER = struct.Struct('<2sBBBBBB')
+ROOM_PLAYER = struct.Struct('<BBf')  # 玩家编号、是否电脑、电脑思考时间
+GAME_HEADER = struct.Struct('<BHBBBB')  # 当前玩家、回合、游戏结束、获胜者、无法行动的玩家（位掩码）、玩家数
+GAME_PLAYER = struct.Struct('<BIBB')  # 玩家编号、剩余方块掩码、first_move、放置数
+STRING_LENGTH = struct.Struct('<H')
+MOVE_LOG_LENGTH = struct.Struct('<H')
+ROOM_TIMES = struct.Struct('<dH')  # 最后活动时间、放置时间的个数
+MOVE_TIME = struct.Struct('<I')  # 距最后活动时间的毫秒数
+MAX_MOVE_AGE = 0xFFFFFFFF
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _pack_string(value):
+    data = (value or '').encode('utf-8')
+    return STRING_LENGTH.pack(len(data)) + data
+
+
+def _unpack_string(buffer, offset):
+    (length,) = STRING_LENGTH.unpack_from(buffer, offset)
+    offset += STRING_LENGTH.size
+    return bytes(buffer[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def _encode_game(compact):
+    (_, current_player, turn, game_over, winner, blocked_players, _, players) = compact
+    blocked = 0
+    for player_num in blocked_players:
+        blocked |= 1 << player_num
+    parts = [GAME_HEADER.pack(current_player, turn, game_over, winner, blocked, len(players))]
+    for player_num, player_id, remaining, first_move, moves in players:
+        parts.append(GAME_PLAYER.pack(player_num, remaining, first_move, len(moves)))
+        parts.append(_pack_string(player_id))
+        parts.extend(wire.MOVE_RECORD.pack(*move) for move in moves)
+    return b''.join(parts)
+
+
+def _decode_game(buffer, offset, max_players):
+    (current_player, turn, game_over, winner, blocked,
+     player_count) = GAME_HEADER.unpack_from(buffer, offset)
+    offset += GAME_HEADER.size
+
+    players = []
+    occupancy = []
+    for _ in range(player_count):
+        player_num, remaining, first_move, move_count = GAME_PLAYER.unpack_from(buffer, offset)
+        offset += GAME_PLAYER.size
+        player_id, offset = _unpack_string(buffer, offset)
+
+        moves = []
+        mask = 0
+        for _ in range(move_count):
+            piece_index, transform, board_x, board_y = wire.MOVE_RECORD.unpack_from(buffer, offset)
+            offset += wire.MOVE_RECORD.size
+            rotation, flip = wire.decode_transform(transform)
+            orientation = get_orientation(PIECE_IDS[piece_index], rotation, flip)
+            mask |= orientation.mask << cell_index(board_x, board_y)
+            moves.append((piece_index, transform, board_x, board_y))
+
+        players.append((player_num, player_id, remaining, bool(first_move), tuple(moves)))
+        occupancy.append((player_num, mask))
+
+    blocked_players = tuple(player_num for player_num in range(8) if blocked >> player_num & 1)
+    compact = (
+        max_players, current_player, turn, bool(game_over), winner,
+        blocked_players, tuple(sorted(occupancy)), tuple(players)
+    )
+    return compact, offset
+
+
+def encode_room(room):
+    """将房间编码为字节串"""
+    snapshot = room.to_snapshot()
+    bots = dict(snapshot['bots'])
+    flags = FLAG_HAS_GAME if snapshot['game'] is not None else 0
+    if snapshot['moves'] is not None:
+        flags |= FLAG_HAS_MOVE_LOG
+
+    parts = [
+        ROOM_HEADER.pack(
+            MAGIC, FORMAT_VERSION, snapshot['max_players'], ROOM_STATUSES.index(snapshot['status']),
+            snapshot['current_player'] or 0, len(snapshot['players']), flags
+        ),
+        _pack_string(snapshot['room_id'])
+    ]
+    for player_data in snapshot['players']:
+        player_num = player_data['player_num']
+        parts.append(ROOM_PLAYER.pack(player_num, player_data['is_bot'], bots.get(player_num, 0)))
+        parts.append(_pack_string(player_data['player_name']))
+        parts.append(_pack_string(player_data['socket_id']))
+    if snapshot['game'] is not None:
+        parts.append(_encode_game(snapshot['game']))
+    if snapshot['moves'] is not None:
+        records = room.move_log.to_bytes()
+        parts.append(MOVE_LOG_LENGTH.pack(len(records) // MOVE_LOG_RECORD.size))
+        parts.append(records)
+    last_activity = snapshot['last_activity']
+    parts.append(ROOM_TIMES.pack(last_activity, len(snapshot['move_times'])))
+    parts.extend(
+        MOVE_TIME.pack(min(max(round((last_activity - moved_at) * 1000), 0), MAX_MOVE_AGE))
+        for moved_at in snapshot['move_times']
+    )
+    return b''.join(parts)
+
+
+def decode_snapshot(buffer):
+    """解码为GameRoom.to_snapshot()格式的字典"""
+    if len(buffer) < ROOM_HEADER.size:
+        raise SnapshotError("快照长度不足")
+    (magic, version, max_players, status, current_player,
+     player_count, flags) = ROOM_HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version not in SUPPORTED_VERSIONS:
+        raise SnapshotError("不支持的快照格式")
+
+    room_id, offset = _unpack_string(buffer, ROOM_HEADER.size)
+    players = []
+    bots = []
+    for _ in range(player_count):
+        player_num, is_bot, time_budget = ROOM_PLAYER.unpack_from(buffer, offset)
+        offset += ROOM_PLAYER.size
+        player_name, offset = _unpack_string(buffer, offset)
+        socket_id, offset = _unpack_string(buffer, offset)
+        players.append({
+            'player_num': player_num,
+            'player_name': player_name,
+            'socket_id': socket_id,
+            'is_bot': bool(is_bot)
+        })
+        if is_bot:
+            bots.append([player_num, round(time_budget, 3)])
+
+    game = None
+    if flags & FLAG_HAS_GAME:
+        game, offset = _decode_game(buffer, offset, max_players)
+
+    moves = None
+    if flags & FLAG_HAS_MOVE_LOG:
+        (count,) = MOVE_LOG_LENGTH.unpack_from(buffer, offset)
+        offset += MOVE_LOG_LENGTH.size
+        moves = bytes(buffer[offset:offset + count * MOVE_LOG_RECORD.size]).hex()
+        offset += count * MOVE_LOG_RECORD.size
+
+    snapshot = {
+        'room_id': room_id,
+        'max_players': max_players,
+        'status': ROOM_STATUSES[status],
+        'current_player': current_player or None,
+        'players': players,
+        'bots': bots,
+        'game': game,
+        'moves': moves
+    }
+    if version >= 2:
+        last_activity, count = ROOM_TIMES.unpack_from(buffer, offset)
+        offset += ROOM_TIMES.size
+        ages = MOVE_TIME.iter_unpack(buffer[offset:offset + count * MOVE_TIME.size])
+        snapshot['last_activity'] = last_activity
+        snapshot['move_times'] = [last_activity - age / 1000 for (age,) in ages]
+    return snapshot
+
+
+def decode_room(buffer):
+    """从字节串恢复房间"""
+    return GameRoom.from_snapshot(decode_snapshot(buffer))
@@ -0,0 +1,91 @@
+# 观战
+# 房间可以有任意数量的只读观战者，不占用max_players的位置，也不计入真人玩家数
+# 观战者按(编码格式, 延迟)分组加入Socket.IO房间：每步的game_updated/game_over消息每组只构建一次，
+# 用一次emit发送给组内所有连接（python-socketio向房间发送不带回调的消息时只编码一次，
+# 使用消息队列时也只发布一次），每步广播的开销基本不随观战人数增长
+#
+# 延迟观战：观战者可以选择延迟若干秒。加入时从走法日志重建延迟时刻的局面，之后由每个worker的后台任务
+# 按房间记录的每步时间（GameRoom.move_times），把到期的走法在组内的局面副本上重放后发送。
+# 延迟组只包含本worker的连接，由本worker发送，房间名中带有进程号，避免多个worker重复发送
+
+import bisect
+import os
+
+# 观战者可以选择的最大延迟（秒）
+MAX_DELAY = int(os.environ.get('SQUARE_SPECTATOR_MAX_DELAY', 300))
+FEED_INTERVAL = 0.5  # 后台任务检查延迟组的间隔（秒）
+
+
+def normalize_delay(value):
+    """把请求中的延迟转换为0到MAX_DELAY之间的整数秒，格式不正确时抛出ValueError"""
+    delay = int(value or 0)
+    if not 0 <= delay <= MAX_DELAY:
+        raise ValueError(f"延迟应在0到{MAX_DELAY}秒之间")
+    return delay
+
+
+def get_group_name(room_id, wire_format, delay=0):
+    """观战组对应的Socket.IO房间名"""
+    if delay:
+        return f'{room_id}:watch:{wire_format}:{delay}:{os.getpid()}'
+    return f'{room_id}:watch:{wire_format}'
+
+
+def get_delayed_turn(move_times, delay, now):
+    """延迟观战者此刻应该看到的步数：在now - delay之前完成的走法数"""
+    return bisect.bisect_right(move_times, now - delay)
+
+
+class DelayedGroup:
+    __slots__ = ('room_id', 'wire_format', 'delay', 'name', 'members', 'game', 'sent')
+
+    def __init__(self, room_id, wire_format, delay):
+        self.room_id = room_id
+        self.wire_format = wire_format
+        self.delay = delay
+        self.name = get_group_name(room_id, wire_format, delay)
+        self.members = set()
+        self.game = None  # 组内观战者当前看到的局面，游戏开始前为None
+        self.sent = 0  # 已发送的走法数
+
+
+class DelayedFeeds:
+    """本worker上的延迟观战组，键为(room_id, 编码格式, 延迟)"""
+
+    def __init__(self):
+        self.groups = {}
+        self.members = {}  # socket_id -> 组的键
+
+    def __len__(self):
+        return len(self.groups)
+
+    def add(self, socket_id, room_id, wire_format, delay):
+        """加入延迟组，返回(组, 是否为新建的组)"""
+        key = (room_id, wire_format, delay)
+        group = self.groups.get(key)
+        created = group is None
+        if created:
+            group = self.groups[key] = DelayedGroup(room_id, wire_format, delay)
+        group.members.add(socket_id)
+        self.members[socket_id] = key
+        return group, created
+
+    def remove(self, socket_id):
+        """离开延迟组，组内没有连接时删除该组，返回离开的组（不在延迟组中时返回None）"""
+        key = self.members.pop(socket_id, None)
+        if key is None:
+            return None
+        group = self.groups[key]
+        group.members.discard(socket_id)
+        if not group.members:
+            del self.groups[key]
+        return group
+
+    def drop(self, group):
+        """删除整个组（房间已关闭）"""
+        for socket_id in group.members:
+            self.members.pop(socket_id, None)
+        self.groups.pop((group.room_id, group.wire_format, group.delay), None)
+
+    def values(self):
+        return list(self.groups.values())
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import textwrap
+import random
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from game_logic import GameRoom
+from pieces import ORIENTATIONS
+
+
+def make_room(max_players=2, moves=0, seed=0, room_id='room'):
+    """
+    创建已开始游戏的房间，所有玩家按固定种子随机走moves步（游戏结束时提前停止），
+    返回(房间, 每步之后的局面列表，第一个为开局)
+    """
+    room = GameRoom(room_id, max_players)
+    for player_num in range(1, max_players + 1):
+        room.add_player(f'sid{player_num}', f'玩家{player_num}')
+    room.start_game()
+    rng = random.Random(seed)
+    positions = [room.game.copy()]
+    while len(positions) <= moves and not room.game.game_over:
+        player_num = room.game.current_player
+        piece_id, orientation_index, board_x, board_y = rng.choice(sorted(room.game.get_legal_moves(player_num)))
+        orientation = ORIENTATIONS[piece_id][orientation_index]
+        result = room.place_piece(
+            room.get_socket_id(player_num), piece_id, [board_x, board_y], orientation.rotation, orientation.flip
+        )
+        assert result['success'], result
+        positions.append(room.game.copy())
+    return room, positions
+
+
+@pytest.fixture
+def run_script():
+    """
+    在新的解释器中运行脚本并返回标准输出，脚本以非零状态退出时测试失败
+    eventlet.monkey_patch()和导入app.py都会修改整个进程，这类测试在子进程中进行，不影响其他测试
+    """
+    def run(source, timeout=120, **env):
+        result = subprocess.run(
+            [sys.executable, '-c', textwrap.dedent(source)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout,
+            env=dict(os.environ, SQUARE_ARCHIVE_PATH='', SQUARE_LOG_LEVEL='WARNING', **env)
+        )
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+    return run
@@ -0,0 +1,43 @@
+import pytest
+from analysis import analyze_position, get_player_coverage, get_territory
+from conftest import make_room
+from pieces import ORIENTATIONS
+
+
+def count_coverage(game, player_num):
+    """逐个合法放置累加覆盖的格子"""
+    heatmap = [[0] * game.board_size for _ in range(game.board_size)]
+    moves = [] if game.game_over else game.get_legal_moves(player_num)
+    for piece_id, orientation_index, board_x, board_y in moves:
+        for dx, dy in ORIENTATIONS[piece_id][orientation_index].coords:
+            heatmap[board_y + dy][board_x + dx] += 1
+    return len(moves), heatmap
+
+
+@pytest.mark.parametrize('max_players,seed', [(2, 0), (4, 1)])
+def test_coverage_matches_legal_moves(max_players, seed):
+    _, positions = make_room(max_players, moves=400, seed=seed)
+    for game in positions[::2] + [positions[-1]]:
+        territory = get_territory(game)
+        for player_num in game.players:
+            move_count, heatmap = count_coverage(game, player_num)
+            assert get_player_coverage(game, player_num) == (move_count, heatmap)
+            player = territory[str(player_num)]
+            assert player['mobility'] == move_count
+            assert player['reachable'] == sum(1 for row in heatmap for count in row if count)
+            assert player['remaining'] == game.players[player_num].remaining_squares()
+            assert (player['anchors'] > 0) == (move_count > 0)
+
+
+def test_candidates_only_for_player_to_move():
+    _, positions = make_room(2, moves=10, seed=2)
+    game = positions[-1]
+    assert not game.game_over
+    legal_moves = game.get_legal_moves(game.current_player)
+    analysis = analyze_position(game, limit=3, time_budget=0.5)
+    assert analysis['turn'] == game.turn
+    assert 0 < len(analysis['candidates']) <= 3
+    for candidate in analysis['candidates']:
+        assert (candidate['piece_id'], candidate['orientation'], *candidate['position']) in legal_moves
+    other = 2 if game.current_player == 1 else 1
+    assert analyze_position(game, other)['candidates'] == []
@@ -0,0 +1,108 @@
+import pytest
+
+
+def test_connect_records_no_errors(run_script):
+    """Flask-SocketIO 5.x调用connect处理函数时会传入auth，正常连接不应计为出错"""
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import app
+        import metrics
+
+        client = app.socketio.test_client(app.app, auth={'token': 'x'})
+        assert client.is_connected()
+        client.disconnect()
+        for line in metrics.render().splitlines():
+            if 'event="connect"' in line and line.startswith('square_socket_event'):
+                print(line)
+    ''', SQUARE_COMPUTE_WORKERS='0')
+    lines = output.splitlines()
+    assert 'square_socket_events_total{event="connect"} 1' in lines
+    assert not any(line.startswith('square_socket_event_errors_total') and not line.endswith(' 0') for line in lines)
+
+
+def test_concurrent_legal_move_requests_share_one_task(run_script):
+    """回合开始时的后台推送还在计算时，玩家自己的请求等待同一个结果，而不是因同一房间已有任务被拒绝"""
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import eventlet
+        import app
+        from game_logic import GameRoom
+
+        room = GameRoom('room', 2)
+        room.add_player('a', 'A')
+        room.add_player('b', 'B')
+        room.start_game()
+        try:
+            workers = [eventlet.spawn(app.prepare_legal_moves, room, 1) for _ in range(3)]
+            results = [worker.wait() for worker in workers]
+        finally:
+            app.compute_executor.shutdown()
+        assert all(sorted(moves) == sorted(room.game.get_legal_moves(1)) for moves in results)
+        assert not app.legal_moves_pending
+        print('ok')
+    ''', SQUARE_COMPUTE_WORKERS='1')
+    assert output.split()[-1] == 'ok'
+
+
+
+def test_bot_searches_while_endgame_analysis_runs(run_script):
+    """同一房间的残局分析正在进行时，电脑玩家仍然搜索，而不是因任务键被占用退回快速走法"""
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import ai
+        import app
+        import game_logic
+
+        room = game_logic.GameRoom('room', 2)
+        room.add_bot(0.2)
+        room.add_player('a', 'A')
+        room.start_game()
+        app.rooms['room'] = room
+
+        def quick_move(self, game):
+            raise AssertionError('电脑玩家没有搜索')
+
+        def endgame_analysis_task(compact, moves):
+            # 在残局分析任务执行期间（任务键被占用）轮到电脑玩家
+            game_logic.GameRoom.is_game_over = is_game_over
+            app.run_bot_turn('room')
+            return []
+
+        ai.Bot.choose_quick_move = quick_move
+        app.endgame_analysis_task = endgame_analysis_task
+        is_game_over = game_logic.GameRoom.is_game_over
+        game_logic.GameRoom.is_game_over = lambda self: True
+        response = app.app.test_client().get('/api/room/room/endgame')
+        assert response.status_code == 200, response.get_json()
+        assert room.game.turn == 1
+        print('ok')
+    ''', SQUARE_COMPUTE_WORKERS='0')
+    assert output.split()[-1] == 'ok'
+
+
+def test_add_bot_rejects_invalid_time_budget(run_script):
+    """思考时间不是有限的数字时REST接口返回400，Socket事件返回error，房间不变"""
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import app
+        from game_logic import GameRoom
+
+        app.rooms['room'] = room = GameRoom('room', 2)
+        http = app.app.test_client()
+        for time_budget in ('abc', [1], {'s': 1}, 'nan'):
+            response = http.post('/api/room/room/add-bot', json={'time_budget': time_budget})
+            assert response.status_code == 400, (time_budget, response.get_json())
+        assert not room.players
+
+        client = app.socketio.test_client(app.app)
+        client.emit('join_room', {'room_id': 'room', 'player_name': 'A'})
+        client.get_received()
+        client.emit('add_bot', {'time_budget': 'abc'})
+        assert [message['name'] for message in client.get_received()] == ['error']
+        assert len(room.players) == 1
+
+        response = http.post('/api/room/room/add-bot', json={'time_budget': '0.5'})
+        assert response.status_code == 200 and response.get_json()['time_budget'] == 0.5
+        print('ok')
+    ''', SQUARE_COMPUTE_WORKERS='0')
+    assert output.split()[-1] == 'ok'
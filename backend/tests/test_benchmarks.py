@@ -0,0 +1,92 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在free_port端口上运行app.py，与开发环境相同使用eventlet，计算在进程池中进行
+SERVER_SCRIPT = '''
+import sys
+import app
+
+try:
+    app.socketio.run(app.app, host='127.0.0.1', port=int(sys.argv[1]), log_output=False)
+finally:
+    app.compute_executor.shutdown()
+'''
+
+
+def run_module(args, timeout=300):
+    result = subprocess.run(
+        [sys.executable, '-m', *args], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=timeout,
+        env=dict(os.environ, SQUARE_ARCHIVE_PATH='', SQUARE_LOG_LEVEL='WARNING')
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_benchmark_suites_run(tmp_path):
+    """每组基准测试只测一轮，只检查能正常运行并写出结果"""
+    pytest.importorskip('flask_socketio')
+    output = tmp_path / 'results.json'
+    run_module(['benchmarks', '--suite', 'engine', 'e2e', '--repeat', '1', '--games', '1', '--output', str(output)])
+    results = json.loads(output.read_text(encoding='utf-8'))['results']
+    assert any(name.startswith('engine.') for name in results)
+    for max_players in (2, 4):
+        assert results[f'e2e.place_piece.{max_players}p']['repeat'] > 0
+
+
+@pytest.fixture
+def server_url():
+    pytest.importorskip('flask_socketio')
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-c', SERVER_SCRIPT, str(port)], cwd=BACKEND_DIR,
+        env=dict(os.environ, SQUARE_ARCHIVE_PATH='', SQUARE_LOG_LEVEL='WARNING', SQUARE_COMPUTE_WORKERS='1')
+    )
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f'{url}/api/health', timeout=1).close()
+                break
+            except OSError:
+                assert server.poll() is None and time.monotonic() < deadline, '服务器未能启动'
+                time.sleep(0.2)
+        yield url
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+@pytest.mark.parametrize('valid_positions', ['all', 'legacy'])
+def test_loadtest_plays_games(server_url, tmp_path, valid_positions):
+    """少量房间的负载测试：所有对局都应下完，并且没有出错的请求"""
+    pytest.importorskip('aiohttp')
+    pytest.importorskip('socketio')
+    output = tmp_path / 'loadtest.json'
+    run_module([
+        'benchmarks.loadtest', '--url', server_url, '--rooms', '2', '--duration', '60',
+        '--valid-positions', valid_positions, '--output', str(output)
+    ])
+    step, = json.loads(output.read_text(encoding='utf-8'))['steps']
+    assert step['finished_rooms'] == 2
+    assert step['moves'] > 0
+    assert step['errors'] == 0
@@ -0,0 +1,83 @@
+import pytest
+from compute import ComputeBusy, ComputeExecutor, ComputeFailed, InlineExecutor, legal_moves_task
+from game_logic import Game
+
+
+def new_game():
+    game = Game(2)
+    game.add_player('a', 1)
+    game.add_player('b', 2)
+    return game
+
+
+@pytest.fixture(scope='module')
+def pool_executor():
+    executor = ComputeExecutor(max_workers=1, default_timeout=60)
+    yield executor
+    executor.shutdown()
+
+
+def test_pool_matches_inline(pool_executor):
+    game = new_game()
+    moves = pool_executor.run(legal_moves_task, game.to_compact(), 1)
+    assert sorted(moves) == sorted(InlineExecutor().run(legal_moves_task, game.to_compact(), 1))
+
+
+@pytest.mark.parametrize('executor_class', [InlineExecutor, ComputeExecutor])
+def test_task_error_is_compute_failed(executor_class):
+    executor = executor_class(1, default_timeout=60)
+    try:
+        with pytest.raises(ComputeFailed):
+            executor.run(legal_moves_task, None, 1, key='room')
+        # 出错后释放房间的任务名额
+        assert executor.pending == 0
+        assert executor.run(legal_moves_task, new_game().to_compact(), 1, key='room')
+    finally:
+        executor.shutdown()
+
+
+def test_unpicklable_argument_is_compute_failed(pool_executor):
+    with pytest.raises(ComputeFailed):
+        pool_executor.run(legal_moves_task, lambda: None, 1)
+
+
+def test_one_task_per_key():
+    executor = InlineExecutor(1)
+    executor.acquire('room')
+    with pytest.raises(ComputeBusy):
+        executor.run(legal_moves_task, new_game().to_compact(), 1, key='room')
+
+
+def test_bot_move_in_process_pool_under_eventlet(run_script):
+    """与app.py相同先monkey_patch，再用真正的进程池（而不是SQUARE_COMPUTE_WORKERS=0）执行计算任务"""
+    pytest.importorskip('eventlet')
+    output = run_script('''
+        import eventlet
+        eventlet.monkey_patch()
+        from compute import ComputeExecutor, bot_move_task, legal_moves_task
+        from game_logic import Game
+
+        game = Game(2)
+        game.add_player('a', 1)
+        game.add_player('b', 2)
+        ticks = []
+
+        def tick():
+            while True:
+                eventlet.sleep(0.01)
+                ticks.append(1)
+
+        eventlet.spawn(tick)
+        executor = ComputeExecutor(max_workers=2, default_timeout=60)
+        try:
+            move = executor.run(bot_move_task, game.to_compact(), 1, 0.2, key='room')
+            assert move in game.get_legal_moves(1), move
+            moves = executor.run(legal_moves_task, game.to_compact(), 1, key='room')
+            assert sorted(moves) == sorted(game.get_legal_moves(1))
+        finally:
+            executor.shutdown()
+        # 等待子进程时事件循环仍在运行
+        assert ticks
+        print('ok')
+    ''')
+    assert output.split()[-1] == 'ok'
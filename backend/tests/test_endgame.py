@@ -0,0 +1,67 @@
+import pytest
+from conftest import make_room
+from endgame import EndgameSolver, analyze_endgame, count_legal_moves, get_margin, solve_endgame
+
+
+def minimax(game):
+    """不剪枝、不查置换表的完整搜索，返回行动方在完美对局下领先的格数"""
+    player_num = game.current_player
+    moves = [] if game.game_over else game.get_legal_moves(player_num)
+    if not moves:
+        return get_margin(game, player_num)
+    return max(play(game, move) for move in moves)
+
+
+def play(game, move):
+    """行动方走move之后，完美对局下行动方领先的格数"""
+    player_num = game.current_player
+    child = game.copy()
+    child.play_move(player_num, move)
+    value = minimax(child)
+    return value if child.current_player == player_num else -value
+
+
+def endgame_positions(seed, threshold=12):
+    """随机对局中双方合法放置数之和不超过threshold的所有未结束局面"""
+    _, positions = make_room(2, moves=400, seed=seed)
+    return [game for game in positions if not game.game_over and count_legal_moves(game) <= threshold]
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_solver_matches_minimax(seed):
+    positions = endgame_positions(seed)
+    assert positions
+    for game in positions:
+        result = EndgameSolver(max_nodes=10 ** 6).solve(game)
+        expected = minimax(game)
+        assert result.score == expected
+        assert result.player_num == game.current_player
+        assert play(game, result.move) == expected
+        if expected == 0:
+            assert result.winner == 'tie'
+        else:
+            assert (result.winner == game.current_player) == (expected > 0)
+
+
+def test_solver_gives_up_past_node_limit():
+    game = endgame_positions(0, threshold=40)[0]
+    assert EndgameSolver(max_nodes=1).solve(game) is None
+
+
+def test_solve_endgame_only_in_endgames():
+    _, positions = make_room(2, moves=400, seed=1)
+    assert solve_endgame(positions[0], threshold=24) is None
+    _, positions = make_room(4, moves=400, seed=1)
+    assert all(solve_endgame(game, threshold=10 ** 6) is None for game in positions)
+
+
+def test_analysis_loss_matches_minimax():
+    room, positions = make_room(2, moves=400, seed=2)
+    moves = list(room.move_log)
+    analysis = analyze_endgame(positions[0], moves, threshold=12, max_nodes=10 ** 6)
+    assert analysis
+    for entry in analysis:
+        game = positions[entry['move'] - 1]
+        assert entry['best_score'] == minimax(game)
+        assert entry['played_score'] == play(game, tuple(entry['played']))
+        assert entry['loss'] == entry['best_score'] - entry['played_score'] >= 0
@@ -0,0 +1,81 @@
+import pytest
+import metrics
+from conftest import make_room
+from pieces import ORIENTATIONS
+
+# 固定种子的随机对局：走的步数、每个局面当前玩家的合法放置数、最终分数和获胜者
+# 这些值与改用位棋盘之前逐格检查的列表棋盘引擎给出的结果相同
+GOLDEN_GAMES = [
+    (2, 11, 28, [
+        58, 58, 182, 243, 382, 317, 310, 405, 276, 399, 208, 255, 194, 180, 72, 134, 30, 93, 45, 72, 30, 27,
+        8, 14, 1, 10, 4, 2, 0
+    ], {'1': 37, '2': 28}, 2),
+    (4, 12, 55, [
+        58, 58, 58, 58, 114, 219, 219, 186, 297, 287, 284, 379, 411, 445, 276, 289, 457, 550, 262, 317, 359, 604,
+        317, 355, 270, 530, 241, 326, 255, 359, 99, 165, 178, 194, 93, 93, 96, 153, 41, 49, 74, 88, 7, 27, 41, 37,
+        1, 21, 21, 33, 16, 4, 7, 7, 1, 0
+    ], {'1': 28, '2': 34, '3': 41, '4': 30}, 1),
+]
+
+
+@pytest.mark.parametrize('max_players,seed,moves,legal_move_counts,scores,winner', GOLDEN_GAMES)
+def test_random_game_matches_known_values(max_players, seed, moves, legal_move_counts, scores, winner):
+    room, positions = make_room(max_players, moves=400, seed=seed)
+    assert len(positions) == moves + 1
+    assert [len(game.get_legal_moves(game.current_player)) for game in positions] == legal_move_counts
+    assert all(not game.game_over for game in positions[:-1])
+    game = positions[-1]
+    assert game.game_over
+    assert game.get_scores() == scores
+    assert game.winner == winner
+
+
+def brute_force_legal_moves(game, player_num):
+    """在棋盘的每个位置尝试每个剩余方块的每个朝向"""
+    return sorted(
+        (piece_id, orientation.index, board_x, board_y)
+        for piece_id in game.players[player_num].pieces
+        for orientation in ORIENTATIONS[piece_id]
+        for board_x in range(game.board_size)
+        for board_y in range(game.board_size)
+        if game.is_valid_position(orientation.coords, board_x, board_y, player_num)[0]
+    )
+
+
+@pytest.mark.parametrize('max_players,seed', [(2, 3), (4, 4)])
+def test_anchor_moves_match_brute_force(max_players, seed):
+    """从锚点出发生成的合法放置与逐个位置检查的结果相同"""
+    _, positions = make_room(max_players, moves=400, seed=seed)
+    for game in positions[::3]:
+        for player_num in game.players:
+            assert sorted(game.get_legal_moves(player_num)) == brute_force_legal_moves(game, player_num)
+
+
+@pytest.mark.parametrize('max_players,seed', [(2, 5), (4, 6)])
+def test_mobility_tracking_matches_legal_moves(max_players, seed):
+    """增量维护的行动能力与重新枚举合法放置的结果一致，游戏只在所有玩家都无法行动时结束"""
+    _, positions = make_room(max_players, moves=400, seed=seed)
+    for game in positions:
+        can_move = {player_num: bool(game.get_legal_moves(player_num)) for player_num in game.players}
+        for player_num in game.players:
+            assert game.can_player_place_any_piece(player_num) == can_move[player_num]
+            assert (player_num in game.blocked_players) <= (not can_move[player_num])
+        assert game.game_over == (not any(can_move.values()))
+        if not game.game_over:
+            assert can_move[game.current_player]
+
+
+def test_room_times_game_over_check_separately():
+    """房间放置方块时结束判断单独计时，搜索中的放置不计时"""
+    count = 'square_engine_seconds_count{function="check_game_over"} '
+
+    def timed_checks():
+        lines = [line for line in metrics.render().splitlines() if line.startswith(count)]
+        return int(lines[0].split()[-1]) if lines else 0
+
+    before = timed_checks()
+    room, positions = make_room(2, moves=5, seed=0)
+    assert timed_checks() == before + 5
+    game = positions[-1].copy()
+    game.play_move(game.current_player, game.get_legal_moves(game.current_player)[0])
+    assert timed_checks() == before + 5
@@ -0,0 +1,76 @@
+import json
+import pytest
+from conftest import make_room
+from move_log import EXPORT_HEADER, MAGIC, RECORD, MoveLog, MoveLogError
+
+
+@pytest.mark.parametrize('max_players', [2, 4])
+def test_every_position_replays(max_players):
+    room, positions = make_room(max_players, moves=200, seed=max_players)
+    assert room.game.game_over
+    move_log = MoveLog(room.move_log.get_position(0), room.move_log.to_bytes(), checkpoint_interval=4)
+    assert len(move_log) == len(positions) - 1
+    for move_count, game in enumerate(positions):
+        replayed = move_log.get_position(move_count)
+        assert replayed.to_compact() == game.to_compact()
+        assert replayed.zobrist_hash == game.zobrist_hash
+
+
+def test_checkpoints_are_created_while_replaying():
+    room, positions = make_room(2, moves=20, seed=1)
+    move_log = MoveLog(positions[0], room.move_log.to_bytes(), checkpoint_interval=8)
+    # 追加和从快照恢复时只有开局局面
+    assert set(move_log.checkpoints) == {0}
+    move_log.get_position(20)
+    assert set(move_log.checkpoints) == {0, 8, 16}
+    # 之后的重放从最近的检查点开始，结果不受检查点影响
+    assert move_log.get_position(10).to_compact() == positions[10].to_compact()
+    assert move_log.get_position(16).to_compact() == positions[16].to_compact()
+
+
+def test_checkpoints_are_not_shared_with_callers():
+    room, positions = make_room(2, moves=8, seed=2)
+    move_log = MoveLog(positions[0], room.move_log.to_bytes(), checkpoint_interval=4)
+    game = move_log.get_position(4)
+    game.play_move(game.current_player, sorted(game.get_legal_moves(game.current_player))[0])
+    assert move_log.get_position(4).to_compact() == positions[4].to_compact()
+
+
+def test_records():
+    room, positions = make_room(2, moves=6, seed=3)
+    move_log = room.move_log
+    records = list(move_log)
+    assert len(records) == len(move_log) == 6
+    assert [move_log.get_record(index) for index in range(6)] == records
+    for index, (player_num, piece_id, orientation_index, board_x, board_y) in enumerate(records):
+        assert positions[index].current_player == player_num
+        assert positions[index + 1].last_move[1]['piece_id'] == piece_id
+        assert list(positions[index + 1].last_move[1]['position']) == [board_x, board_y]
+
+
+def test_invalid_input():
+    room, positions = make_room(2, moves=4, seed=4)
+    with pytest.raises(MoveLogError):
+        MoveLog(positions[0], room.move_log.to_bytes()[:-1])
+    with pytest.raises(IndexError):
+        room.move_log.get_position(5)
+    with pytest.raises(IndexError):
+        room.move_log.get_position(-1)
+    # 记录与局面不符时重放失败
+    records = bytearray(room.move_log.to_bytes())
+    records[RECORD.size:RECORD.size * 2] = records[:RECORD.size]
+    with pytest.raises(MoveLogError):
+        MoveLog(positions[0], records).get_position(2)
+
+
+def test_exports():
+    room, positions = make_room(2, moves=10, seed=5)
+    move_log = room.move_log
+    data = b''.join(move_log.export_binary())
+    assert EXPORT_HEADER.unpack_from(data) == (MAGIC, 1, 2, positions[0].board_size, 10)
+    assert data[EXPORT_HEADER.size:] == move_log.to_bytes()
+
+    lines = [json.loads(line) for line in move_log.export_ndjson({'room_id': 'room'}, {'winner': None})]
+    assert lines[0]['type'] == 'game' and lines[0]['room_id'] == 'room' and lines[0]['moves'] == 10
+    assert [line['index'] for line in lines[1:-1]] == list(range(10))
+    assert lines[-1] == {'type': 'result', 'winner': None}
@@ -0,0 +1,37 @@
+import pytest
+from conftest import make_room
+from movegen import MOVE_GENERATORS, AnchorMoveGenerator
+from pieces import ORIENTATIONS
+
+
+def create_generator(name):
+    if name == 'numpy':
+        pytest.importorskip('numpy')
+    return MOVE_GENERATORS[name]()
+
+
+@pytest.mark.parametrize('name', ['bitparallel', 'numpy'])
+@pytest.mark.parametrize('max_players,seed', [(2, 0), (2, 1), (4, 2), (4, 3)])
+def test_generators_agree_with_anchor(name, max_players, seed):
+    """随机对局的每个局面中，每个玩家由各引擎生成的合法放置与anchor引擎相同（只有顺序不同）"""
+    generator = create_generator(name)
+    anchor = AnchorMoveGenerator()
+    room, positions = make_room(max_players, moves=200, seed=seed)
+    assert room.game.game_over
+    for game in positions:
+        for player_num, player in game.players.items():
+            expected = sorted(anchor.iter_moves(game, player_num, player.pieces))
+            assert sorted(generator.iter_moves(game, player_num, player.pieces)) == expected
+
+
+@pytest.mark.parametrize('name', ['bitparallel', 'numpy'])
+def test_generators_agree_on_single_orientation(name):
+    generator = create_generator(name)
+    anchor = AnchorMoveGenerator()
+    _, positions = make_room(2, moves=12, seed=5)
+    for game in positions:
+        for player_num in game.players:
+            for orientations in ORIENTATIONS.values():
+                for orientation in orientations:
+                    assert sorted(generator.iter_origins(game, player_num, orientation)) == \
+                        sorted(anchor.iter_origins(game, player_num, orientation))
@@ -0,0 +1,105 @@
+import pytest
+from opening_book import (
+    BookMove, get_canonical_key, get_transposed_hash, load_opening_book, transpose_move, write_book
+)
+from opening_book_builder import build_book, new_game
+
+
+class SerialExecutor:
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+def play(game, move):
+    child = game.copy()
+    assert child.play_move(child.current_player, move)['success']
+    return child
+
+
+def write_single_entry(path, game, move, score=1.5, max_plies=4):
+    """按生成器的方式保存game中的走法：规范局面是转置后的局面时保存转置后的走法"""
+    key, transposed = get_canonical_key(game)
+    write_book(path, {key: BookMove(transpose_move(move) if transposed else move, score)}, max_plies)
+    return load_opening_book(str(path))
+
+
+def test_lookup_round_trip(tmp_path):
+    game = new_game(4)
+    move = sorted(game.get_legal_moves(1))[-1]
+    book = write_single_entry(tmp_path / 'book.bin', game, move, score=-2.4)
+    try:
+        assert book.lookup(game) == (move, -2.4)
+        assert book.lookup(play(game, move)) is None
+    finally:
+        book.close()
+
+
+def test_transposed_positions_share_an_entry(tmp_path):
+    """沿主对角线转置的两个2人局面共用一个条目，查找转置后的局面时走法也被转置"""
+    start = new_game(2)
+    first = next(move for move in sorted(start.get_legal_moves(1)) if transpose_move(move) != move)
+    game = play(start, first)
+    transposed = play(start, transpose_move(first))
+    assert transposed.zobrist_hash == get_transposed_hash(game) != game.zobrist_hash
+    assert get_canonical_key(game)[0] == get_canonical_key(transposed)[0]
+
+    reply = sorted(game.get_legal_moves(2))[0]
+    book = write_single_entry(tmp_path / 'book.bin', game, reply)
+    try:
+        assert book.lookup(game).move == reply
+        assert book.lookup(transposed).move == transpose_move(reply)
+        assert transpose_move(reply) in transposed.get_legal_moves(2)
+    finally:
+        book.close()
+
+
+def test_lookup_stops_after_max_plies(tmp_path):
+    game = new_game(2)
+    book = write_single_entry(tmp_path / 'book.bin', game, sorted(game.get_legal_moves(1))[0], max_plies=1)
+    try:
+        assert book.lookup(game) is not None
+        game.turn = 1
+        assert book.lookup(game) is None
+    finally:
+        book.close()
+
+
+@pytest.mark.parametrize('max_players', [2, 4])
+def test_built_book_moves_are_legal(tmp_path, max_players):
+    entries = build_book([max_players], plies=2, width=2, depth=1, executor=SerialExecutor())
+    path = tmp_path / 'book.bin'
+    write_book(path, entries, 2)
+    book = load_opening_book(str(path))
+    try:
+        assert len(book) == len(entries)
+        game = new_game(max_players)
+        for _ in range(2):
+            entry = book.lookup(game)
+            assert entry.move in game.get_legal_moves(game.current_player)
+            game = play(game, entry.move)
+        assert book.lookup(game) is None
+    finally:
+        book.close()
+
+
+@pytest.mark.parametrize('max_players', [2, 4])
+def test_shipped_book_follows_legal_moves(max_players):
+    book = load_opening_book()
+    if book is None:
+        pytest.skip('没有开局库文件')
+    try:
+        game = new_game(max_players)
+        while (entry := book.lookup(game)) is not None:
+            assert entry.move in game.get_legal_moves(game.current_player)
+            game = play(game, entry.move)
+        assert game.turn > 0
+    finally:
+        book.close()
+
+
+def test_invalid_book_is_ignored(tmp_path):
+    path = tmp_path / 'book.bin'
+    assert load_opening_book(str(path)) is None
+    path.write_bytes(b'not a book')
+    assert load_opening_book(str(path)) is None
+    assert load_opening_book('') is None
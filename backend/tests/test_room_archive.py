@@ -0,0 +1,109 @@
+import pytest
+from conftest import make_room
+import room_archive
+from room_archive import RoomArchive
+from room_gc import RoomCollector
+
+
+def test_archive_compact():
+    archive = RoomArchive(':memory:')
+    first, _ = make_room(2, moves=2, room_id='a')
+    second, _ = make_room(2, moves=4, room_id='b')
+    for room in (first, second, first):
+        archive.save(room)
+    archive.delete('b')
+    assert archive.appended == 4
+    assert archive.get_stats()['records'] == 4
+    assert archive.room_ids() == ['a']
+
+    assert archive.compact() == 3
+    assert archive.appended == 0
+    assert archive.get_stats()['records'] == 1
+    assert archive.room_ids() == ['a'] and 'b' not in archive
+    assert archive.load('a').to_snapshot()['moves'] == first.to_snapshot()['moves']
+
+
+def test_collector_sweep_runs_maintenance():
+    calls = []
+    collector = RoomCollector(lambda room_id, now: None, lambda: ['a'], on_sweep=lambda: calls.append(1))
+    collector.run_once(now=1000.0)
+    collector.run_once(now=1001.0)
+    # 只有扫描之后才执行，两次扫描之间不重复
+    assert calls == [1]
+
+
+def test_hibernated_room_info(run_script):
+    """查询休眠中的房间返回快照中的信息，不恢复房间"""
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import app
+        from game_logic import GameRoom
+        from room_archive import RoomArchive
+
+        app.room_archive = RoomArchive(':memory:')
+        room = GameRoom('room', 2)
+        room.add_player('a', 'A')
+        room.add_player('b', 'B')
+        room.start_game()
+        app.rooms['room'] = room
+        app.hibernate_room(room)
+        http = app.app.test_client()
+        info = http.get('/api/room/room').get_json()
+        assert info['hibernated'] and info['status'] == 'playing' and info['players'] == 0, info
+        assert 'room' not in app.rooms
+        assert http.get('/api/room/other').status_code == 404
+
+        app.load_room('room')
+        info = http.get('/api/room/room').get_json()
+        assert not info['hibernated'] and info['status'] == 'playing', info
+        print('ok')
+    ''', SQUARE_COMPUTE_WORKERS='0')
+    assert output.split()[-1] == 'ok'
+
+
+def test_archive_expire(monkeypatch):
+    archive = RoomArchive(':memory:')
+    first, _ = make_room(2, moves=2, room_id='a')
+    second, _ = make_room(2, moves=4, room_id='b')
+    monkeypatch.setattr(room_archive.time, 'time', lambda: 1000.0)
+    archive.save(first)
+    archive.save(second)
+    # 再次休眠的房间按最后一次写入计算
+    monkeypatch.setattr(room_archive.time, 'time', lambda: 2000.0)
+    archive.save(second)
+
+    assert archive.expire(1000.0) == []
+    assert archive.expire(1500.0) == ['a']
+    assert archive.room_ids() == ['b'] and archive.load('a') is None
+    assert archive.get_stats()['records'] == 2
+    assert archive.expire(3000.0) == ['b']
+    assert archive.get_stats()['records'] == 0
+
+
+def test_sweep_deletes_rooms_past_retention(run_script):
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import time
+        import app
+        import metrics
+        from game_logic import GameRoom
+        from room_archive import RoomArchive
+
+        app.room_archive = RoomArchive(':memory:')
+        for room_id in ('old', 'new'):
+            room = GameRoom(room_id, 2)
+            room.add_player('a', 'A')
+            room.add_player('b', 'B')
+            room.start_game()
+            app.rooms[room_id] = room
+            app.hibernate_room(room)
+        app.room_archive.get_connection().execute(
+            "UPDATE room_snapshots SET saved_at = ? WHERE room_id = 'old'", (time.time() - 120,)
+        )
+        app.maintain_room_archive()
+        assert app.room_archive.room_ids() == ['new']
+        assert app.room_archive.appended == 0
+        assert 'square_rooms_expired_total{reason="archived",action="evict"} 1' in metrics.render().splitlines()
+        print('ok')
+    ''', SQUARE_COMPUTE_WORKERS='0', SQUARE_ARCHIVE_RETENTION='60')
+    assert output.split()[-1] == 'ok'
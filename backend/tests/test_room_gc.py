@@ -0,0 +1,120 @@
+import room_gc
+from conftest import make_room
+from game_logic import GameRoom
+from room_gc import ExpiryHeap, RoomCollector, RoomTTLs, get_expiry
+
+TTLS = RoomTTLs(empty=10, waiting=20, finished=30)
+
+
+def test_expiry_by_room_state():
+    room = GameRoom('room', 2)
+    room.last_activity = 100
+    assert get_expiry(room, TTLS) == (110, 'empty')
+    # 加入、离开和放置都会更新最后活动时间
+    room.add_player('a', 'A')
+    assert room.last_activity > 100
+    room.last_activity = 100
+    assert get_expiry(room, TTLS) == (120, 'waiting')
+    room.add_player('b', 'B')
+    room.start_game()
+    room.last_activity = 100
+    # 真人玩家都在的进行中对局不会过期
+    assert get_expiry(room, TTLS) == (None, None)
+    room.remove_player('a')
+    room.remove_player('b')
+    room.last_activity = 100
+    assert get_expiry(room, TTLS) == (110, 'empty')
+
+
+def test_expiry_of_finished_and_bot_rooms():
+    room, _ = make_room(2, moves=400, seed=0)
+    assert room.status == 'finished'
+    room.last_activity = 100
+    assert get_expiry(room, TTLS) == (130, 'finished')
+    assert get_expiry(room, TTLS._replace(finished=0)) == (None, None)
+
+    bots = GameRoom('bots', 2)
+    bots.add_bot(0.1)
+    bots.add_bot(0.1)
+    bots.start_game()
+    bots.last_activity = 100
+    assert get_expiry(bots, TTLS) == (110, 'empty')
+
+
+def test_expiry_heap_keeps_earliest_deadline():
+    heap = ExpiryHeap()
+    heap.schedule('a', 20)
+    heap.schedule('a', 10)
+    heap.schedule('a', 30)
+    heap.schedule('b', 15)
+    assert len(heap) == 2 and heap.next_deadline() == 10
+    assert heap.pop_due(9) == []
+    assert heap.pop_due(15) == ['a', 'b']
+    # 被更早的到期时间替换的旧项不会再次弹出
+    assert heap.pop_due(100) == []
+    assert 'a' not in heap
+
+
+class FakeRooms:
+    def __init__(self, deadlines):
+        self.deadlines = deadlines
+        self.checked = []
+        self.sweeps = 0
+
+    def check(self, room_id, now):
+        self.checked.append((room_id, now))
+        return self.deadlines.get(room_id)
+
+    def on_sweep(self):
+        self.sweeps += 1
+
+
+def make_collector(monkeypatch, rooms, list_rooms):
+    """时钟由run(now)推进，扫描时间和到期时间使用同一个时钟"""
+    clock = [0]
+    monkeypatch.setattr(room_gc.time, 'time', lambda: clock[0])
+    collector = RoomCollector(rooms.check, list_rooms, sweep_interval=60, on_sweep=rooms.on_sweep)
+
+    def run(now):
+        clock[0] = now
+        return collector.run_once(now)
+    return collector, run
+
+
+def test_collector_reschedules_until_expired(monkeypatch):
+    rooms = FakeRooms({'a': 1050})
+    collector, run = make_collector(monkeypatch, rooms, lambda: list(rooms.deadlines))
+    # 第一次运行时扫描房间存储，新发现的房间立即检查一次
+    assert run(1000) == 1
+    assert rooms.sweeps == 1 and rooms.checked == [('a', 1000)]
+    assert collector.expiry.next_deadline() == 1050
+
+    # 活动后到期时间推后：堆顶到期时按新的时间重新放入
+    rooms.deadlines['a'] = 1080
+    assert run(1040) == 0
+    assert run(1050) == 1
+    assert collector.expiry.next_deadline() == 1080
+
+    # 已经过去的到期时间至少推迟一秒，避免同一时刻反复检查
+    rooms.deadlines['a'] = 1070
+    run(1080)
+    assert collector.expiry.next_deadline() == 1081
+
+    # 已回收的房间离开堆
+    del rooms.deadlines['a']
+    assert run(1081) == 1
+    assert 'a' not in collector.expiry
+    assert rooms.sweeps == 2
+
+
+def test_sweep_adds_rooms_from_other_workers(monkeypatch):
+    room_ids = []
+    rooms = FakeRooms({})
+    collector, run = make_collector(monkeypatch, rooms, lambda: room_ids)
+    run(1000)
+    room_ids.append('b')
+    # 扫描间隔内不会发现新房间
+    run(1030)
+    assert 'b' not in collector.expiry
+    run(1060)
+    assert rooms.checked == [('b', 1060)]
@@ -0,0 +1,127 @@
+import pytest
+from conftest import make_room
+import room_store
+from room_store import LocalRoomStore, MemoryRedis, RoomLockTimeout, SharedRoomStore
+
+
+@pytest.fixture
+def client():
+    return MemoryRedis()
+
+
+def as_worker(monkeypatch, worker_id):
+    monkeypatch.setenv('SQUARE_WORKER_ID', worker_id)
+
+
+@pytest.mark.parametrize('make_store', [LocalRoomStore, lambda: SharedRoomStore(MemoryRedis())])
+def test_mapping(make_store):
+    store = make_store()
+    room, _ = make_room(2, moves=3)
+    assert 'room' not in store and store.get('room') is None and len(store) == 0
+    store['room'] = room
+    assert 'room' in store and len(store) == 1 and store.keys() == ['room']
+    assert store['room'].to_snapshot() == room.to_snapshot()
+    assert [r.room_id for r in store.values()] == ['room']
+    del store['room']
+    assert 'room' not in store and store.get('room') is None
+    with pytest.raises(KeyError):
+        store['room']
+
+
+@pytest.mark.parametrize('make_store', [LocalRoomStore, lambda: SharedRoomStore(MemoryRedis())])
+def test_wire_formats(make_store):
+    store = make_store()
+    assert store.get_wire_format('sid') == 'json'
+    store.set_wire_format('sid', 'binary')
+    assert store.get_wire_format('sid') == 'binary'
+    store.clear_wire_format('sid')
+    assert store.get_wire_format('sid') == 'json'
+
+
+def test_shared_snapshot_round_trip(client):
+    store = SharedRoomStore(client)
+    room, positions = make_room(4, moves=30, seed=3)
+    room.add_spectator('watcher', '观众', 'binary', 5)
+    store.save(room)
+    # 另一个worker读到的是从快照重建的房间
+    restored = SharedRoomStore(client).get('room')
+    assert restored is not room
+    assert restored.to_snapshot() == room.to_snapshot()
+    assert restored.game.to_compact() == positions[-1].to_compact()
+    assert restored.move_log.get_position(10).to_compact() == positions[10].to_compact()
+
+
+def test_shared_cache_follows_version(client):
+    worker_a, worker_b = SharedRoomStore(client), SharedRoomStore(client)
+    room, _ = make_room(2, moves=2)
+    worker_a.save(room)
+    cached = worker_b.get('room')
+    # 版本不变时使用本地缓存的对象
+    assert worker_b.get('room') is cached
+
+    room.game.play_move(room.game.current_player, sorted(room.game.get_legal_moves(room.game.current_player))[0])
+    worker_a.save(room)
+    updated = worker_b.get('room')
+    assert updated is not cached
+    assert updated.game.turn == room.game.turn
+
+    del worker_a['room']
+    assert worker_b.get('room') is None and 'room' not in worker_b.cache
+
+
+def test_shared_lock(client, monkeypatch):
+    worker_a, worker_b = SharedRoomStore(client), SharedRoomStore(client)
+    with worker_a.lock('room'):
+        # 只缩短等待时间，worker_a持有的锁仍按默认时间过期
+        monkeypatch.setattr(room_store, 'LOCK_TIMEOUT', 0.05)
+        with pytest.raises(RoomLockTimeout):
+            with worker_b.lock('room'):
+                pass
+        # 其他房间不受影响
+        with worker_b.lock('other'):
+            pass
+    with worker_b.lock('room'):
+        pass
+
+
+def test_expired_lock_is_not_released_by_old_holder(client, monkeypatch):
+    monkeypatch.setattr(room_store, 'LOCK_TIMEOUT', 0.05)
+    worker_a, worker_b = SharedRoomStore(client), SharedRoomStore(client)
+    key = worker_a.key('lock', 'room')
+    with worker_a.lock('room'):
+        # 持有时间超过LOCK_TIMEOUT后锁自动释放，由其他worker获取
+        client.expires[key] = 0
+        client.set(key, 'worker-b', nx=True)
+    assert client.get(key) == 'worker-b'
+
+
+def test_owner_and_task_handoff(client, monkeypatch):
+    store = SharedRoomStore(client)
+    as_worker(monkeypatch, 'a')
+    assert store.send_task('room', 'start_turn') is False  # 没有拥有者
+    assert store.is_owner('room')
+    as_worker(monkeypatch, 'b')
+    assert not store.is_owner('room')
+    assert store.send_task('room', 'start_turn') is True
+    assert store.pop_task(0.01) is None
+    as_worker(monkeypatch, 'a')
+    assert store.pop_task(0.01) == ('room', 'start_turn')
+
+
+def test_owner_lease_expires(client, monkeypatch):
+    store = SharedRoomStore(client)
+    as_worker(monkeypatch, 'a')
+    assert store.is_owner('room')
+    client.expires[store.key('owner', 'room')] = 0
+    as_worker(monkeypatch, 'b')
+    assert store.is_owner('room')
+
+
+def test_create_room_store(monkeypatch):
+    monkeypatch.setenv('SQUARE_ROOM_STORE', 'memory')
+    assert isinstance(room_store.create_room_store(), LocalRoomStore)
+    monkeypatch.setenv('SQUARE_ROOM_STORE', 'memory-redis')
+    assert isinstance(room_store.create_room_store(), SharedRoomStore)
+    monkeypatch.setenv('SQUARE_ROOM_STORE', 'sqlite://x')
+    with pytest.raises(ValueError):
+        room_store.create_room_store()
@@ -0,0 +1,67 @@
+import pytest
+from conftest import make_room
+from game_logic import GameRoom
+import snapshot
+
+
+def assert_same_room(restored, room, tolerance=0.001):
+    expected = room.to_snapshot()
+    actual = restored.to_snapshot()
+    assert actual['last_activity'] == pytest.approx(expected['last_activity'], abs=tolerance)
+    assert actual['move_times'] == pytest.approx(expected['move_times'], abs=tolerance)
+    for key in ('last_activity', 'move_times', 'spectators'):
+        del expected[key], actual[key]
+    assert actual == expected
+
+
+@pytest.mark.parametrize('max_players,moves', [(2, 0), (2, 7), (4, 200)])
+def test_round_trip(max_players, moves):
+    room, positions = make_room(max_players, moves=moves, seed=moves)
+    restored = snapshot.decode_room(snapshot.encode_room(room))
+    assert_same_room(restored, room)
+    assert restored.game.to_compact() == positions[-1].to_compact()
+    assert len(restored.move_times) == len(restored.move_log) == len(positions) - 1
+
+
+def test_waiting_room():
+    room = GameRoom('room', 4)
+    room.add_player('sid1', '玩家1')
+    assert_same_room(snapshot.decode_room(snapshot.encode_room(room)), room)
+
+
+def test_times_are_preserved():
+    room, _ = make_room(2, moves=3)
+    room.last_activity = 1_700_000_000.25
+    room.move_times = [1_699_999_000.0, 1_699_999_500.5, 1_700_000_000.25]
+    restored = snapshot.decode_room(snapshot.encode_room(room))
+    # 休眠前后的空闲回收和延迟观战计时相同
+    assert restored.last_activity == room.last_activity
+    assert restored.move_times == pytest.approx(room.move_times, abs=0.001)
+
+
+def test_spectators_are_not_saved():
+    room, _ = make_room(2, moves=2)
+    room.add_spectator('watcher', '观众', 'json', 10)
+    assert snapshot.decode_room(snapshot.encode_room(room)).spectators == {}
+
+
+def test_version_1_snapshot():
+    """版本1没有时间字段：最后活动时间为恢复时间，之前的走法视为很久以前完成"""
+    room, _ = make_room(2, moves=4)
+    room.last_activity = 1.0
+    data = bytearray(snapshot.encode_room(room))
+    data[2] = 1
+    data = data[:-(snapshot.ROOM_TIMES.size + 4 * snapshot.MOVE_TIME.size)]
+    restored = snapshot.decode_room(bytes(data))
+    assert restored.last_activity > 1.0
+    assert restored.move_times == [0.0] * 4
+    assert restored.game.to_compact() == room.game.to_compact()
+
+
+def test_invalid_snapshot():
+    room, _ = make_room(2)
+    data = snapshot.encode_room(room)
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.decode_snapshot(data[:3])
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.decode_snapshot(b'SR\x09' + data[3:])
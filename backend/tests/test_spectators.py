@@ -0,0 +1,123 @@
+import pytest
+import spectators
+from conftest import make_room
+from game_logic import GameRoom
+from spectators import DelayedFeeds, get_delayed_turn, get_group_name, normalize_delay
+
+
+def test_normalize_delay():
+    assert normalize_delay(None) == 0
+    assert normalize_delay('30') == 30
+    assert normalize_delay(spectators.MAX_DELAY) == spectators.MAX_DELAY
+    for value in (-1, spectators.MAX_DELAY + 1, 'soon'):
+        with pytest.raises(ValueError):
+            normalize_delay(value)
+
+
+def test_group_names():
+    assert get_group_name('room', 'json') == 'room:watch:json'
+    assert get_group_name('room', 'binary') != get_group_name('room', 'json')
+    # 延迟组只属于当前worker
+    assert get_group_name('room', 'json', 30).startswith('room:watch:json:30:')
+
+
+def test_delayed_turn():
+    move_times = [10.0, 20.0, 30.0]
+    assert get_delayed_turn(move_times, 5, 14) == 0
+    assert get_delayed_turn(move_times, 5, 15) == 1
+    assert get_delayed_turn(move_times, 5, 100) == 3
+    assert get_delayed_turn(move_times, 0, 25) == 2
+
+
+def test_delayed_feeds_share_groups():
+    feeds = DelayedFeeds()
+    group, created = feeds.add('a', 'room', 'json', 30)
+    assert created
+    assert feeds.add('b', 'room', 'json', 30) == (group, False)
+    other, created = feeds.add('c', 'room', 'binary', 30)
+    assert created and other is not group
+    assert len(feeds) == 2
+
+    assert feeds.remove('a') is group and len(feeds) == 2
+    assert feeds.remove('b') is group and len(feeds) == 1
+    assert feeds.remove('b') is None
+    feeds.drop(other)
+    assert len(feeds) == 0 and not feeds.members
+
+
+def test_spectators_do_not_take_player_seats():
+    room = GameRoom('room', 2)
+    room.add_player('a', 'A')
+    room.add_spectator('s1', 'S1')
+    room.add_spectator('s2', 'S2', 'binary')
+    room.add_spectator('s3', 'S3', 'binary', delay=30)
+    assert len(room.players) == 1 and room.get_human_count() == 1
+    assert not room.can_start_game()
+    # 每种编码格式一个实时观战组，延迟观战者不在其中
+    assert room.get_live_spectator_formats() == ['binary', 'json']
+    assert room.remove_spectator('s2')
+    assert not room.remove_spectator('s2')
+    assert room.get_live_spectator_formats() == ['json']
+
+
+def test_spectators_and_move_times_survive_snapshots():
+    room, _ = make_room(2, moves=6, seed=0)
+    room.add_spectator('s1', 'S1', 'binary', delay=30)
+    assert len(room.move_times) == len(room.move_log) == 6
+    restored = GameRoom.from_snapshot(room.to_snapshot())
+    assert restored.spectators == room.spectators
+    assert restored.move_times == room.move_times
+
+
+def test_live_and_delayed_groups(run_script):
+    pytest.importorskip('flask_socketio')
+    output = run_script('''
+        import time
+        import app
+        from game_logic import GameRoom
+        from pieces import ORIENTATIONS
+
+        def received(client, event):
+            return [message['args'][0] for message in client.get_received() if message['name'] == event]
+
+        app.rooms['room'] = GameRoom('room', 2)
+        live, binary, delayed, a, b = (app.socketio.test_client(app.app) for _ in range(5))
+        live.emit('watch_room', {'room_id': 'room', 'name': 'L'})
+        binary.emit('set_wire_format', {'format': 'binary'})
+        binary.emit('watch_room', {'room_id': 'room'})
+        delayed.emit('watch_room', {'room_id': 'room', 'delay': 60})
+        a.emit('join_room', {'room_id': 'room', 'player_name': 'A'})
+        b.emit('join_room', {'room_id': 'room', 'player_name': 'B'})
+        room = app.rooms['room']
+        assert room.status == 'playing' and len(room.spectators) == 3
+
+        # 玩家不能同时观战
+        a.get_received()
+        a.emit('watch_room', {'room_id': 'room'})
+        assert received(a, 'error')
+
+        assert received(live, 'game_started') and received(binary, 'game_started')
+        assert not received(delayed, 'game_started')
+        piece_id, orientation_index, board_x, board_y = room.game.get_legal_moves(1)[0]
+        orientation = ORIENTATIONS[piece_id][orientation_index]
+        a.emit('place_piece', {
+            'piece_id': piece_id, 'position': [board_x, board_y],
+            'rotation': orientation.rotation, 'flip': orientation.flip
+        })
+        assert room.game.turn == 1, '放置失败'
+        assert isinstance(received(live, 'game_updated')[0]['delta'], dict)
+        assert isinstance(received(binary, 'game_updated')[0]['delta'], bytes)
+
+        # 延迟组在延迟时间到达之前只有开局局面
+        group, = app.delayed_feeds.values()
+        app.feed_delayed_group(group, time.time())
+        assert received(delayed, 'game_started') and not received(delayed, 'game_updated')
+        app.feed_delayed_group(group, time.time() + 61)
+        update, = received(delayed, 'game_updated')
+        assert update['last_move']['piece_id'] == piece_id and group.sent == 1
+
+        delayed.emit('unwatch_room')
+        assert len(app.delayed_feeds) == 0 and len(room.spectators) == 2
+        print('ok')
+    ''', SQUARE_COMPUTE_WORKERS='0')
+    assert output.split()[-1] == 'ok'
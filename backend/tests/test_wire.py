@@ -0,0 +1,58 @@
+import json
+import pytest
+from conftest import make_room
+import wire
+
+
+def normalize(value):
+    """元组和列表在JSON中相同"""
+    return json.loads(json.dumps(value))
+
+
+@pytest.mark.parametrize('max_players', [2, 4])
+def test_game_state_round_trip(max_players):
+    room, positions = make_room(max_players, moves=200, seed=max_players)
+    room_info = room.get_room_info()
+    for game in positions:
+        decoded = wire.decode_game_state(wire.encode_game_state(game, room_info))
+        expected = dict(game.get_game_state(), **room_info)
+        assert normalize(decoded) == normalize(expected)
+    assert decoded['game_over']
+
+
+@pytest.mark.parametrize('max_players', [2, 4])
+def test_game_delta_round_trip(max_players):
+    room, positions = make_room(max_players, moves=200, seed=max_players + 1)
+    for game in positions[1:]:
+        decoded = wire.decode_game_delta(wire.encode_game_delta(game, {'room_id': 'room'}))
+        assert normalize(decoded) == normalize(dict(game.get_game_delta(), room_id='room'))
+
+
+def test_room_payloads_match_json():
+    room, _ = make_room(2, moves=5, seed=7)
+    assert normalize(wire.decode_game_state(room.get_game_state_binary())) == normalize(room.get_game_state())
+    assert normalize(wire.decode_game_delta(room.get_game_delta_binary())) == normalize(room.get_game_delta())
+
+
+def test_no_delta_before_first_move():
+    _, positions = make_room(2)
+    assert wire.encode_game_delta(positions[0]) is None
+
+
+def test_invalid_buffers():
+    room, positions = make_room(2, moves=3, seed=8)
+    state = wire.encode_game_state(room.game)
+    delta = wire.encode_game_delta(room.game)
+    with pytest.raises(wire.WireFormatError):
+        wire.decode_game_state(state[:wire.HEADER.size - 1])
+    with pytest.raises(wire.WireFormatError):
+        wire.decode_game_state(b'XX' + state[2:])
+    with pytest.raises(wire.WireFormatError):
+        wire.decode_game_state(delta)
+    with pytest.raises(wire.WireFormatError):
+        wire.decode_game_delta(state)
+
+
+@pytest.mark.parametrize('winner', [None, 'tie', 1, 4])
+def test_winner_encoding(winner):
+    assert wire.decode_winner(wire.encode_winner(winner)) == winner
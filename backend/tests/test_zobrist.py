@@ -0,0 +1,34 @@
+import pytest
+import zobrist
+from conftest import make_room
+from game_logic import Game
+
+
+@pytest.mark.parametrize('max_players,seed', [(2, 7), (4, 8)])
+def test_incremental_hash_matches_full_hash(max_players, seed):
+    """每一步之后增量更新的哈希与重新计算的哈希相同，复制和紧凑格式往返后也相同"""
+    _, positions = make_room(max_players, moves=400, seed=seed)
+    for game in positions:
+        assert zobrist.compute_hash(game) == game.zobrist_hash
+        clone = game.copy()
+        assert clone.zobrist_hash == game.zobrist_hash
+        restored = Game.from_compact(game.to_compact())
+        assert restored.zobrist_hash == game.zobrist_hash
+
+
+def test_copy_hash_is_independent():
+    """在副本上走棋不影响原局面的哈希"""
+    _, positions = make_room(2, moves=10, seed=9)
+    game = positions[-1]
+    expected = game.zobrist_hash
+    clone = game.copy()
+    clone.play_move(clone.current_player, clone.get_legal_moves(clone.current_player)[0])
+    assert clone.zobrist_hash != expected
+    assert zobrist.compute_hash(clone) == clone.zobrist_hash
+    assert game.zobrist_hash == expected == zobrist.compute_hash(game)
+
+
+def test_positions_have_distinct_hashes():
+    """同一局对局中不同的局面哈希不同"""
+    _, positions = make_room(4, moves=400, seed=10)
+    assert len({game.zobrist_hash for game in positions}) == len(positions)
@@ -0,0 +1,62 @@
+# 置换表
+# 以局面的Zobrist哈希为键缓存代价较高的分析结果（合法放置、行动能力、AI评估等），
+# 不同的落子顺序到达同一局面时可以直接复用
+# 容量有限，超出时淘汰最久未使用的条目
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class TranspositionCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """查找条目，命中时将其标记为最近使用"""
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """写入条目，超出容量时淘汰最久未使用的条目"""
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """获取缓存统计信息"""
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# 进程内共享的置换表，容量可通过环境变量SQUARE_TT_SIZE配置
+TRANSPOSITION_CACHE = TranspositionCache(int(os.environ.get('SQUARE_TT_SIZE', 4096)))
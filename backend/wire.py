@@ -0,0 +1,234 @@
+# 游戏状态的二进制编码
+# 与前端 frontend/src/utils/wire.js 保持一致，客户端通过 set_wire_format 事件按连接选择
+#
+# 头部（小端）：魔数'SQ'、格式版本、类型、棋盘大小、玩家数、当前玩家、标志位、获胜者、回合(u16)
+# 完整状态：打包的棋盘（2人/3人每格2位，4人每格4位）+ 每个玩家的剩余方块位掩码和放置记录
+# 增量更新：一条放置记录
+# 两者最后都带一段长度前缀的UTF-8 JSON，存放房间信息等不常变化的字段
+
+import json
+import struct
+from bitboard import cell_position, iter_bits
+from pieces import PIECE_IDS, PIECE_INDEX, ROTATIONS, get_transformed_piece
+
+MAGIC = b'SQ'
+FORMAT_VERSION = 1
+
+KIND_GAME_STATE = 1
+KIND_GAME_DELTA = 2
+
+FLAG_GAME_OVER = 1
+
+WINNER_NONE = 0
+WINNER_TIE = 255
+
+HEADER = struct.Struct('<2sBBBBBBBH')
+PLAYER_HEADER = struct.Struct('<BIB')
+MOVE_RECORD = struct.Struct('<BBBB')  # 方块编号、变换、x、y
+EXTRA_LENGTH = struct.Struct('<H')
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def get_bits_per_cell(max_players):
+    """每个格子占用的位数"""
+    return 2 if max_players <= 3 else 4
+
+
+def encode_transform(rotation, flip):
+    """旋转和翻转编码为一个字节：低2位为旋转/90，第3位为翻转"""
+    rotation_index = ROTATIONS.index(rotation) if rotation in ROTATIONS else 0
+    return rotation_index | (4 if flip else 0)
+
+
+def decode_transform(value):
+    return ROTATIONS[value & 3], bool(value & 4)
+
+
+def encode_winner(winner):
+    if winner is None:
+        return WINNER_NONE
+    if winner == 'tie':
+        return WINNER_TIE
+    return winner
+
+
+def decode_winner(value):
+    if value == WINNER_NONE:
+        return None
+    if value == WINNER_TIE:
+        return 'tie'
+    return value
+
+
+def _encode_header(game, kind):
+    flags = FLAG_GAME_OVER if game.game_over else 0
+    return HEADER.pack(
+        MAGIC, FORMAT_VERSION, kind, game.board_size, game.max_players,
+        game.current_player, flags, encode_winner(game.winner), game.turn
+    )
+
+
+def _encode_move(placed_piece):
+    board_x, board_y = placed_piece['position']
+    return MOVE_RECORD.pack(
+        PIECE_INDEX[placed_piece['piece_id']],
+        encode_transform(placed_piece['rotation'], placed_piece['flip']),
+        board_x, board_y
+    )
+
+
+def _decode_move(buffer, offset):
+    piece_index, transform, board_x, board_y = MOVE_RECORD.unpack_from(buffer, offset)
+    piece_id = PIECE_IDS[piece_index]
+    rotation, flip = decode_transform(transform)
+    return {
+        'piece_id': piece_id,
+        'position': (board_x, board_y),
+        'rotation': rotation,
+        'flip': flip,
+        'coords': get_transformed_piece(piece_id, rotation, flip)
+    }
+
+
+def _encode_extra(extra):
+    data = json.dumps(extra or {}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return EXTRA_LENGTH.pack(len(data)) + data
+
+
+def _decode_extra(buffer, offset):
+    (length,) = EXTRA_LENGTH.unpack_from(buffer, offset)
+    offset += EXTRA_LENGTH.size
+    return json.loads(bytes(buffer[offset:offset + length]).decode('utf-8'))
+
+
+def pack_board(game):
+    """直接从位棋盘打包棋盘格子"""
+    bits_per_cell = get_bits_per_cell(game.max_players)
+    size = game.board_size
+    packed = bytearray((size * size * bits_per_cell + 7) // 8)
+    for player_num, mask in game.bitboard.occupancy.items():
+        for index in iter_bits(mask):
+            x, y = cell_position(index)
+            bit = (y * size + x) * bits_per_cell
+            packed[bit >> 3] |= player_num << (bit & 7)
+    return packed
+
+
+def unpack_board(buffer, offset, board_size, max_players):
+    bits_per_cell = get_bits_per_cell(max_players)
+    cell_mask = (1 << bits_per_cell) - 1
+    board = []
+    for y in range(board_size):
+        row = []
+        for x in range(board_size):
+            bit = (y * board_size + x) * bits_per_cell
+            row.append((buffer[offset + (bit >> 3)] >> (bit & 7)) & cell_mask)
+        board.append(row)
+    return board, offset + (board_size * board_size * bits_per_cell + 7) // 8
+
+
+def encode_game_state(game, extra=None):
+    """编码完整游戏状态，extra为附带的JSON字段（房间信息等）"""
+    parts = [_encode_header(game, KIND_GAME_STATE), pack_board(game), bytes([len(game.players)])]
+    for player_num, player in game.players.items():
+        # 玩家的放置记录与MOVE_RECORD格式相同，直接写入
+        parts.append(PLAYER_HEADER.pack(player_num, player.remaining, player.score))
+        parts.append(bytes(player.moves))
+    parts.append(_encode_extra(extra))
+    return b''.join(parts)
+
+
+def encode_game_delta(game, extra=None):
+    """编码最近一次放置的增量更新"""
+    if game.last_move is None:
+        return None
+    player_num, placed_piece = game.last_move
+    return b''.join((
+        _encode_header(game, KIND_GAME_DELTA),
+        bytes([player_num]),
+        _encode_move(placed_piece),
+        _encode_extra(extra)
+    ))
+
+
+def _decode_header(buffer, kind):
+    if len(buffer) < HEADER.size:
+        raise WireFormatError("数据长度不足")
+    (magic, version, actual_kind, board_size, max_players,
+     current_player, flags, winner, turn) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise WireFormatError("不支持的数据格式")
+    if actual_kind != kind:
+        raise WireFormatError("数据类型不匹配")
+    return {
+        'board_size': board_size,
+        'max_players': max_players,
+        'current_player': current_player,
+        'turn': turn,
+        'game_over': bool(flags & FLAG_GAME_OVER),
+        'winner': decode_winner(winner)
+    }
+
+
+def decode_game_state(buffer):
+    """解码完整游戏状态，结果与GameRoom.get_game_state()的格式相同"""
+    header = _decode_header(buffer, KIND_GAME_STATE)
+    board, offset = unpack_board(buffer, HEADER.size, header['board_size'], header['max_players'])
+
+    players = {}
+    player_count = buffer[offset]
+    offset += 1
+    for _ in range(player_count):
+        player_num, remaining, placed_count = PLAYER_HEADER.unpack_from(buffer, offset)
+        offset += PLAYER_HEADER.size
+        placed_pieces = []
+        for _ in range(placed_count):
+            placed_pieces.append(_decode_move(buffer, offset))
+            offset += MOVE_RECORD.size
+        players[str(player_num)] = {
+            'pieces': [piece_id for index, piece_id in enumerate(PIECE_IDS) if remaining >> index & 1],
+            'placed_pieces': placed_pieces,
+            'score': placed_count
+        }
+
+    state = {
+        'board': board,
+        'board_size': header['board_size'],
+        'max_players': header['max_players'],
+        'current_player': header['current_player'],
+        'turn': header['turn'],
+        'players': players,
+        'game_over': header['game_over'],
+        'winner': header['winner']
+    }
+    state.update(_decode_extra(buffer, offset))
+    return state
+
+
+def decode_game_delta(buffer):
+    """解码增量更新，结果与GameRoom.get_game_delta()的格式相同"""
+    header = _decode_header(buffer, KIND_GAME_DELTA)
+    offset = HEADER.size
+    player_num = buffer[offset]
+    placed_piece = _decode_move(buffer, offset + 1)
+    offset += 1 + MOVE_RECORD.size
+
+    board_x, board_y = placed_piece['position']
+    cells = []
+    for dx, dy in placed_piece['coords']:
+        cells.extend((board_x + dx, board_y + dy))
+
+    delta = {
+        'turn': header['turn'],
+        'player': str(player_num),
+        'cells': cells,
+        'placed_piece': placed_piece,
+        'current_player': header['current_player'],
+        'game_over': header['game_over'],
+        'winner': header['winner']
+    }
+    delta.update(_decode_extra(buffer, offset))
+    return delta
@@ -0,0 +1,64 @@
+# Zobrist哈希
+# 局面的哈希值为棋盘格子、每个玩家剩余方块和当前行动玩家对应随机数的异或，
+# 放置方块时只需异或变化的部分即可增量更新
+# 随机数使用固定种子生成，不同进程（进程池、开局库）得到的哈希值一致
+
+import random
+from bitboard import BOARD_STRIDE, iter_bits
+from pieces import PIECE_IDS, PIECE_INDEX
+
+ZOBRIST_SEED = 0x5E0A2E
+MAX_BOARD_SIZE = 20
+MAX_PLAYERS = 4
+
+_rng = random.Random(ZOBRIST_SEED)
+
+
+def _random_key():
+    return _rng.getrandbits(64)
+
+
+# CELL_KEYS[player_num][位索引]
+CELL_KEYS = tuple(
+    tuple(_random_key() for _ in range(MAX_BOARD_SIZE * BOARD_STRIDE))
+    for _ in range(MAX_PLAYERS + 1)
+)
+# PIECE_KEYS[player_num][方块编号]
+PIECE_KEYS = tuple(
+    tuple(_random_key() for _ in PIECE_IDS)
+    for _ in range(MAX_PLAYERS + 1)
+)
+# SIDE_KEYS[player_num]：当前行动的玩家
+SIDE_KEYS = tuple(_random_key() for _ in range(MAX_PLAYERS + 1))
+# BOARD_KEYS[board_size]：区分不同大小的棋盘
+BOARD_KEYS = tuple(_random_key() for _ in range(MAX_BOARD_SIZE + 1))
+
+
+def hash_cells(mask, player_num):
+    """格子掩码对应的哈希值"""
+    keys = CELL_KEYS[player_num]
+    value = 0
+    for index in iter_bits(mask):
+        value ^= keys[index]
+    return value
+
+
+def hash_piece(player_num, piece_id):
+    """玩家持有某个方块对应的哈希值"""
+    return PIECE_KEYS[player_num][PIECE_INDEX[piece_id]]
+
+
+def hash_side(player_num):
+    """当前行动玩家对应的哈希值"""
+    return SIDE_KEYS[player_num]
+
+
+def compute_hash(game):
+    """从头计算局面的哈希值，用于校验增量更新"""
+    value = BOARD_KEYS[game.board_size] ^ hash_side(game.current_player)
+    for player_num, mask in game.bitboard.occupancy.items():
+        value ^= hash_cells(mask, player_num)
+    for player_num, player in game.players.items():
+        for piece_id in player.pieces:
+            value ^= hash_piece(player_num, piece_id)
+    return value
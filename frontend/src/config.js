@@ -20,6 +20,9 @@ export const config = {
   // 后端服务器配置
   server: getEnvConfig(),
   
+  // 游戏状态编码格式：'json'（默认）或 'binary'（紧凑二进制，见utils/wire.js）
+  wireFormat: import.meta.env.VITE_WIRE_FORMAT === 'binary' ? 'binary' : 'json',
+  
   // 获取完整的服务器URL
   getServerUrl() {
     const protocol = this.server.useSSL ? 'https' : 'http';
@@ -0,0 +1,19 @@
+// 合法放置位图解码 - 与后端Game.get_legal_move_bitmaps的格式一致
+// 位图为十六进制字符串，第 y * boardSize + x 位表示原点(x, y)是否有效
+
+// 将位图解码为位置列表[[x, y], ...]
+export function decodePositionBitmap(hex, boardSize) {
+  const positions = []
+  if (!hex) return positions
+
+  let bits = BigInt('0x' + hex)
+  let index = 0
+  while (bits > 0n) {
+    if (bits & 1n) {
+      positions.push([index % boardSize, Math.floor(index / boardSize)])
+    }
+    bits >>= 1n
+    index++
+  }
+  return positions
+}
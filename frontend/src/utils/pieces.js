@@ -147,4 +147,40 @@ export function getPieceBounds(coords) {
     width: maxX - minX + 1,
     height: maxY - minY + 1
   }
-} 
\ No newline at end of file
+} 
+// 方块朝向表 - 与后端pieces.py的ORIENTATIONS编号一致
+// 按旋转(0, 90, 180, 270) x 翻转(false, true)的顺序去重，第一次出现的形状获得下一个编号
+const ROTATIONS = [0, 90, 180, 270]
+const FLIPS = [false, true]
+
+const buildOrientationIndex = () => {
+  const table = {}
+  Object.keys(PIECES).forEach(pieceId => {
+    const seen = {}
+    const indices = {}
+    let count = 0
+    ROTATIONS.forEach(rotation => {
+      FLIPS.forEach(flip => {
+        const shape = getTransformedPiece(pieceId, rotation, flip)
+          .map(([x, y]) => `${x},${y}`)
+          .sort()
+          .join(';')
+        if (!(shape in seen)) {
+          seen[shape] = count++
+        }
+        indices[`${rotation}-${flip}`] = seen[shape]
+      })
+    })
+    table[pieceId] = indices
+  })
+  return table
+}
+
+const ORIENTATION_INDEX = buildOrientationIndex()
+
+// 获取(pieceId, rotation, flip)对应的规范朝向编号
+export function getOrientationIndex(pieceId, rotation = 0, flip = false) {
+  const indices = ORIENTATION_INDEX[pieceId]
+  if (!indices) return null
+  return indices[`${rotation}-${!!flip}`] ?? null
+}
@@ -0,0 +1,150 @@
+// 游戏状态的二进制解码 - 与后端wire.py保持一致
+// 头部（小端）：魔数'SQ'、格式版本、类型、棋盘大小、玩家数、当前玩家、标志位、获胜者、回合(u16)
+import { PIECES, getTransformedPiece } from './pieces.js'
+
+const FORMAT_VERSION = 1
+const KIND_GAME_STATE = 1
+const KIND_GAME_DELTA = 2
+const FLAG_GAME_OVER = 1
+const WINNER_NONE = 0
+const WINNER_TIE = 255
+const HEADER_SIZE = 11
+const MOVE_RECORD_SIZE = 4
+const ROTATIONS = [0, 90, 180, 270]
+
+// 方块的数字编号（按PIECES中的顺序）
+export const PIECE_IDS = Object.keys(PIECES)
+
+const textDecoder = new TextDecoder('utf-8')
+
+// 统一转换为DataView（Socket.IO在浏览器中传来ArrayBuffer）
+const toDataView = (buffer) => {
+  if (buffer instanceof ArrayBuffer) return new DataView(buffer)
+  return new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+}
+
+// 判断收到的数据是否为二进制
+export function isBinaryPayload(value) {
+  return value instanceof ArrayBuffer || ArrayBuffer.isView(value)
+}
+
+const getBitsPerCell = (maxPlayers) => (maxPlayers <= 3 ? 2 : 4)
+
+const decodeWinner = (value) => {
+  if (value === WINNER_NONE) return null
+  if (value === WINNER_TIE) return 'tie'
+  return value
+}
+
+const decodeHeader = (view, kind) => {
+  if (view.byteLength < HEADER_SIZE) throw new Error('数据长度不足')
+  if (view.getUint8(0) !== 0x53 || view.getUint8(1) !== 0x51 || view.getUint8(2) !== FORMAT_VERSION) {
+    throw new Error('不支持的数据格式')
+  }
+  if (view.getUint8(3) !== kind) throw new Error('数据类型不匹配')
+  return {
+    board_size: view.getUint8(4),
+    max_players: view.getUint8(5),
+    current_player: view.getUint8(6),
+    game_over: (view.getUint8(7) & FLAG_GAME_OVER) !== 0,
+    winner: decodeWinner(view.getUint8(8)),
+    turn: view.getUint16(9, true)
+  }
+}
+
+const decodeMove = (view, offset) => {
+  const pieceId = PIECE_IDS[view.getUint8(offset)]
+  const transform = view.getUint8(offset + 1)
+  const rotation = ROTATIONS[transform & 3]
+  const flip = (transform & 4) !== 0
+  return {
+    piece_id: pieceId,
+    position: [view.getUint8(offset + 2), view.getUint8(offset + 3)],
+    rotation,
+    flip,
+    coords: getTransformedPiece(pieceId, rotation, flip)
+  }
+}
+
+const decodeExtra = (view, offset) => {
+  const length = view.getUint16(offset, true)
+  const bytes = new Uint8Array(view.buffer, view.byteOffset + offset + 2, length)
+  return JSON.parse(textDecoder.decode(bytes))
+}
+
+// 解码完整游戏状态，结果与JSON格式的game_state相同
+export function decodeGameState(buffer) {
+  const view = toDataView(buffer)
+  const header = decodeHeader(view, KIND_GAME_STATE)
+  const size = header.board_size
+  const bitsPerCell = getBitsPerCell(header.max_players)
+  const cellMask = (1 << bitsPerCell) - 1
+
+  const board = []
+  for (let y = 0; y < size; y++) {
+    const row = []
+    for (let x = 0; x < size; x++) {
+      const bit = (y * size + x) * bitsPerCell
+      row.push((view.getUint8(HEADER_SIZE + (bit >> 3)) >> (bit & 7)) & cellMask)
+    }
+    board.push(row)
+  }
+  let offset = HEADER_SIZE + Math.ceil((size * size * bitsPerCell) / 8)
+
+  const players = {}
+  const playerCount = view.getUint8(offset)
+  offset += 1
+  for (let i = 0; i < playerCount; i++) {
+    const playerNum = view.getUint8(offset)
+    const remaining = view.getUint32(offset + 1, true)
+    const placedCount = view.getUint8(offset + 5)
+    offset += 6
+    const placedPieces = []
+    for (let j = 0; j < placedCount; j++) {
+      placedPieces.push(decodeMove(view, offset))
+      offset += MOVE_RECORD_SIZE
+    }
+    players[String(playerNum)] = {
+      pieces: PIECE_IDS.filter((_, index) => (remaining >>> index) & 1),
+      placed_pieces: placedPieces,
+      score: placedCount
+    }
+  }
+
+  return {
+    board,
+    board_size: size,
+    max_players: header.max_players,
+    current_player: header.current_player,
+    turn: header.turn,
+    players,
+    game_over: header.game_over,
+    winner: header.winner,
+    ...decodeExtra(view, offset)
+  }
+}
+
+// 解码增量更新，结果与JSON格式的delta相同
+export function decodeGameDelta(buffer) {
+  const view = toDataView(buffer)
+  const header = decodeHeader(view, KIND_GAME_DELTA)
+  const player = view.getUint8(HEADER_SIZE)
+  const placedPiece = decodeMove(view, HEADER_SIZE + 1)
+
+  const [boardX, boardY] = placedPiece.position
+  const cells = []
+  placedPiece.coords.forEach(([dx, dy]) => {
+    cells.push(boardX + dx, boardY + dy)
+  })
+
+  return {
+    turn: header.turn,
+    player: String(player),
+    cells,
+    placed_piece: placedPiece,
+    current_player: header.current_player,
+    game_over: header.game_over,
+    winner: header.winner,
+    ...decodeExtra(view, HEADER_SIZE + 1 + MOVE_RECORD_SIZE)
+  }
+}